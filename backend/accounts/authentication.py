@@ -0,0 +1,125 @@
+"""
+Authentication from access token claims, without the per-request user query.
+
+Tokens issued by LoginView and RegisterView (PrincipalRefreshToken) carry the
+user's `role` and `is_active`, and refreshed access tokens copy them.
+ClaimsJWTAuthentication turns such a token into a User that has only `id`,
+`role` and `is_active` loaded. The permission classes and the ride views read
+nothing else. Any other field is fetched from the database when it is first read, so
+a view that needs the whole row (ProfileView) should authenticate with
+JWTAuthentication. Tokens without the claims are looked up as before.
+
+Claims go stale. The refresh endpoint already rejects inactive users, so the
+only gap is access tokens issued before a user was deactivated or deleted.
+Those users are written to RevokedAccess (accounts.signals) with the time of
+the revocation, and every request is checked against a map each worker reloads
+every JWT_REVOCATION_REFRESH_SECONDS. Only tokens issued before the revocation
+are rejected, so a reactivated user's new tokens work on a worker whose copy is
+stale. The async ride views and the WebSocket handshake (ride_project) check it
+too. Rows older than the access token lifetime are dropped, because every token
+they covered has expired.
+"""
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import DEFERRED
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import RevokedAccess, User
+
+PRINCIPAL_CLAIMS = ("role", "is_active")
+
+
+class PrincipalRefreshToken(RefreshToken):
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim in PRINCIPAL_CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
+
+
+def token_principal(user_id, claims):
+    """A User with only id, role and is_active loaded; reading another field queries for it."""
+    loaded = {"id": User._meta.pk.to_python(user_id), **{claim: claims[claim] for claim in PRINCIPAL_CLAIMS}}
+    return User.from_db("default", list(loaded), [loaded.get(f.attname, DEFERRED) for f in User._meta.concrete_fields])
+
+
+class RevocationList:
+    def __init__(self):
+        self.revoked_at = {}  # user id -> revocation time (epoch seconds)
+        self.loaded_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def stale(self):
+        loaded_at = self.loaded_at
+        return loaded_at is None or time.monotonic() - loaded_at >= settings.JWT_REVOCATION_REFRESH_SECONDS
+
+    def is_revoked(self, user_id, issued_at=None):
+        """Whether a token for `user_id` issued at `issued_at` (its iat claim) was revoked.
+        Reloads a stale copy, so async callers reload first (ais_revoked)."""
+        if self.stale:
+            self.reload()
+        return self.check(user_id, issued_at)
+
+    async def ais_revoked(self, user_id, issued_at=None):
+        if self.stale:
+            await sync_to_async(self.reload)()
+        return self.check(user_id, issued_at)
+
+    def check(self, user_id, issued_at):
+        revoked_at = self.revoked_at.get(str(user_id))
+        # iat has whole seconds, so a token from the second of the revocation is rejected too
+        return revoked_at is not None and (issued_at is None or issued_at <= revoked_at)
+
+    def reload(self):
+        rows = RevokedAccess.objects.filter(revoked_at__gte=self.cutoff()).values_list("user_id", "revoked_at")
+        revoked_at = {str(user_id): at.timestamp() for user_id, at in rows}
+        with self._lock:
+            self.revoked_at = revoked_at
+            self.loaded_at = time.monotonic()
+
+    def revoke(self, user_id):
+        row, _ = RevokedAccess.objects.update_or_create(user_id=user_id)
+        RevokedAccess.objects.filter(revoked_at__lt=self.cutoff()).delete()
+        with self._lock:
+            self.revoked_at = {**self.revoked_at, str(user_id): row.revoked_at.timestamp()}
+
+    def restore(self, user_id):
+        RevokedAccess.objects.filter(user_id=user_id).delete()
+        with self._lock:
+            self.revoked_at = {k: v for k, v in self.revoked_at.items() if k != str(user_id)}
+
+    def clear(self):
+        with self._lock:
+            self.revoked_at = {}
+            self.loaded_at = None
+
+    @staticmethod
+    def cutoff():
+        return timezone.now() - settings.SIMPLE_JWT["ACCESS_TOKEN_LIFETIME"]
+
+
+revocations = RevocationList()
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if not settings.JWT_CLAIMS_AUTH or any(claim not in validated_token for claim in PRINCIPAL_CLAIMS):
+            return super().get_user(validated_token)
+
+        user_id = validated_token.get(jwt_settings.USER_ID_CLAIM)
+        if user_id is None:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        if not validated_token["is_active"] or revocations.is_revoked(user_id, validated_token.get("iat")):
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return token_principal(user_id, validated_token)
@@ -0,0 +1,66 @@
+"""
+Driver "cards": the driver fields that offer and ride-history payloads repeat on
+every row and every WebSocket push (user, vehicle, rating, total rides), built
+once per driver and cached per worker.
+
+Cards are dropped when the User or DriverProfile is saved (accounts.signals) and
+by the views that change a rating or ride count with a queryset update, on this
+worker; other workers see the change within DRIVER_CARD_CACHE_TTL_SECONDS. The
+user's is_online changes far more often (accounts.presence), so the cached value
+is never served: card_user() puts in the one from the row being serialized.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from ride_project.caching import TTLLRUCache
+
+driver_card_cache = TTLLRUCache(
+    maxsize=settings.DRIVER_CARD_CACHE_SIZE,
+    ttl=settings.DRIVER_CARD_CACHE_TTL_SECONDS,
+)
+
+
+PROFILE_CARD_FIELDS = ("vehicle_color", "vehicle_year", "vehicle_make", "vehicle_model", "rating", "total_rides")
+
+
+def make_driver_card(user_data, profile):
+    """A card from serialized user data and a mapping of PROFILE_CARD_FIELDS (None without a profile)."""
+    vehicle = ""
+    if profile:
+        parts = [profile["vehicle_color"], str(profile["vehicle_year"] or ""), profile["vehicle_make"], profile["vehicle_model"]]
+        vehicle = " ".join(p for p in parts if p).strip()
+    return {
+        "user": dict(user_data),
+        "vehicle": vehicle,
+        "rating": float(profile["rating"]) if profile else 5.0,
+        "total_rides": profile["total_rides"] if profile else 0,
+    }
+
+
+def card_user(card, is_online):
+    """The card's user with the live is_online from the serialized row."""
+    return {**card["user"], "is_online": is_online}
+
+
+def build_driver_card(driver):
+    from .serializers import UserSerializer
+
+    profile = getattr(driver, "driver_profile", None)
+    fields = {name: getattr(profile, name) for name in PROFILE_CARD_FIELDS} if profile else None
+    return make_driver_card(UserSerializer(driver).data, fields)
+
+
+def driver_card(driver):
+    """The card for a driver User (with driver_profile loaded on a miss)."""
+    return driver_card_cache.get_or_load(str(driver.pk), lambda: build_driver_card(driver))
+
+
+def cached_driver_card(user_id, build):
+    """The card for `user_id`, calling `build()` on a miss (the list fast path builds from its row)."""
+    return driver_card_cache.get_or_load(str(user_id), build)
+
+
+def forget_driver_card(user_id):
+    """Drop the card now and again once the current transaction commits."""
+    driver_card_cache.invalidate(str(user_id))
+    transaction.on_commit(lambda: driver_card_cache.invalidate(str(user_id)))
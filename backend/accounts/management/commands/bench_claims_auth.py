@@ -0,0 +1,63 @@
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.authentication import PrincipalRefreshToken, revocations
+from accounts.models import User, RevokedAccess, RiderProfile
+from ride_project.benchmarking import percentile
+from rides.views import ActiveRideView, RideHistoryView
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare REST authentication from a token without claims (user query per request) with a "
+        "claims token (accounts.authentication) on the active-ride and history endpoints. "
+        "Runs against the configured database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        rider = User.objects.create(email=f"rider@claims-{tag}.invalid", full_name="Rider", role="rider")
+        refresh = PrincipalRefreshToken.for_user(rider)
+        try:
+            RiderProfile.objects.create(user=rider)
+            tokens = {
+                "user query": str(AccessToken.for_user(rider)),
+                "claims": str(refresh.access_token),
+            }
+            revocations.reload()
+            endpoints = [
+                ("active", ActiveRideView.as_view(), "/api/rides/active/"),
+                ("history", RideHistoryView.as_view(), "/api/rides/history/"),
+            ]
+            factory = APIRequestFactory()
+            for label, view, path in endpoints:
+                for mode, token in tokens.items():
+                    timings, queries = [], []
+                    with connection.execute_wrapper(lambda execute, *args: queries.append(1) or execute(*args)):
+                        for _ in range(options["requests"]):
+                            started = time.perf_counter()
+                            response = view(factory.get(path, HTTP_AUTHORIZATION=f"Bearer {token}"))
+                            if hasattr(response, "render"):
+                                response.render()
+                            timings.append((time.perf_counter() - started) * 1_000_000)
+                    timings.sort()
+                    self.stdout.write(
+                        f"{label:>7} {mode:>10}: p50={statistics.median(timings):7.1f}us "
+                        f"p95={percentile(timings, 0.95):7.1f}us "
+                        f"queries/request={len(queries) / options['requests']:.2f}"
+                    )
+        finally:
+            User.objects.filter(email__endswith=f"@claims-{tag}.invalid").delete()
+            RevokedAccess.objects.filter(user_id=rider.id).delete()  # written by the delete above
+            OutstandingToken.objects.filter(jti=refresh["jti"]).delete()
+            revocations.clear()
@@ -0,0 +1,88 @@
+import asyncio
+import statistics
+import time
+import uuid
+
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import User, DriverProfile
+from accounts.principals import principal_cache
+from ride_project.benchmarking import percentile
+from ride_project.middleware import JWTWebSocketMiddleware
+from rides.routing import websocket_urlpatterns
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate a driver reconnect storm (every driver reconnecting after a deploy) through "
+        "JWTWebSocketMiddleware and DriverConsumer, with and without the principal cache. "
+        "Runs against the configured database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--drivers", type=int, default=200)
+        parser.add_argument("--reconnects", type=int, default=5, help="Handshakes per driver")
+        parser.add_argument("--concurrency", type=int, default=50)
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        drivers = User.objects.bulk_create(
+            [
+                User(email=f"driver{i}@storm-{tag}.invalid", full_name=f"Storm Driver {i}", role="driver")
+                for i in range(options["drivers"])
+            ]
+        )
+        DriverProfile.objects.bulk_create([DriverProfile(user=d) for d in drivers])
+        tokens = [str(AccessToken.for_user(d)) for d in drivers] * options["reconnects"]
+        application = JWTWebSocketMiddleware(URLRouter(websocket_urlpatterns))
+
+        previous_maxsize = principal_cache.maxsize
+        try:
+            principal_cache.maxsize = 0
+            principal_cache.clear()
+            self.report("cache off", *self.storm(application, tokens, options["concurrency"]))
+
+            principal_cache.maxsize = previous_maxsize
+            principal_cache.clear()
+            self.report("cache on", *self.storm(application, tokens, options["concurrency"]))
+        finally:
+            principal_cache.maxsize = previous_maxsize
+            principal_cache.clear()
+            User.objects.filter(email__endswith=f"@storm-{tag}.invalid").delete()
+
+    def storm(self, application, tokens, concurrency):
+        latencies = []
+
+        async def handshake(token):
+            started = time.perf_counter()
+            communicator = WebsocketCommunicator(application, f"/ws/rides/driver/?token={token}")
+            connected, _ = await communicator.connect()
+            latencies.append(time.perf_counter() - started)
+            assert connected, "driver handshake was rejected"
+            await communicator.disconnect()
+
+        async def run():
+            for start in range(0, len(tokens), concurrency):
+                await asyncio.gather(*(handshake(t) for t in tokens[start : start + concurrency]))
+
+        # Database work runs on this thread (database_sync_to_async is thread-sensitive)
+        with CaptureQueriesContext(connection) as queries:
+            began = time.perf_counter()
+            async_to_sync(run)()
+            elapsed = time.perf_counter() - began
+        return sorted(latencies), len(queries), elapsed, principal_cache.stats()
+
+    def report(self, label, latencies, queries, elapsed, stats):
+        self.stdout.write(
+            f"{label:>9}: {len(latencies)} handshakes in {elapsed:.2f}s ({len(latencies) / elapsed:.0f}/s), "
+            f"{queries / len(latencies):.2f} queries per connect+disconnect, "
+            f"p50={statistics.median(latencies) * 1000:.1f}ms "
+            f"p95={percentile(latencies, 0.95) * 1000:.1f}ms, "
+            f"hit rate {stats['hit_rate']}"
+        )
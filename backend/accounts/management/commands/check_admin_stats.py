@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from accounts.presence import presence
+from accounts.stats import ACTIVE_RIDE_STATUSES, compute_admin_stats
+from rides.models import RideRequest
+
+
+class Command(BaseCommand):
+    help = "Recompute the admin dashboard statistics with one exact COUNT each and compare them"
+
+    def handle(self, *args, **options):
+        exact = {
+            "total_users": User.objects.count(),
+            "total_drivers": User.objects.filter(role="driver").count(),
+            "total_riders": User.objects.filter(role="rider").count(),
+            "online_users": User.objects.filter(presence.online_q()).count(),
+            "active_rides": RideRequest.objects.filter(status__in=ACTIVE_RIDE_STATUSES).count(),
+            "completed_rides": RideRequest.objects.filter(status="completed").count(),
+        }
+        aggregated = compute_admin_stats()
+
+        mismatches = 0
+        for name, value in exact.items():
+            ok = aggregated.get(name) == value
+            mismatches += not ok
+            self.stdout.write(f"{name:>16}: {value}" + ("" if ok else f" (aggregate query gave {aggregated.get(name)})"))
+        if mismatches:
+            raise CommandError(f"{mismatches} statistics differ from the exact counts")
+        self.stdout.write(self.style.SUCCESS("Admin statistics match the exact counts"))
@@ -0,0 +1,46 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from accounts.models import DriverProfile, RiderProfile
+from rides.models import CompletedRide
+
+
+class Command(BaseCommand):
+    help = "Recompute driver and rider rating aggregates from ride history and fix any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report mismatches without fixing them")
+
+    def handle(self, *args, **options):
+        for profile_model, user_field, rating_field in (
+            (DriverProfile, "driver", "driver_rating"),
+            (RiderProfile, "rider", "rider_rating"),
+        ):
+            totals = {
+                row[user_field]: (row["total"], row["count"])
+                for row in CompletedRide.objects.filter(**{f"{rating_field}__isnull": False})
+                .values(user_field)
+                .annotate(total=Sum(rating_field), count=Count("id"))
+            }
+
+            fixed = 0
+            with transaction.atomic():
+                for profile in profile_model.objects.select_for_update():
+                    total, count = totals.get(profile.user_id, (0, 0))
+                    rating = profile_model.average(total, count) if count else Decimal("5.00")
+                    if (profile.rating_sum, profile.rating_count, profile.rating) == (total, count, rating):
+                        continue
+                    fixed += 1
+                    self.stdout.write(
+                        f"{profile}: sum {profile.rating_sum}->{total}, count {profile.rating_count}->{count}, "
+                        f"rating {profile.rating}->{rating}"
+                    )
+                    if not options["dry_run"]:
+                        profile.rating_sum, profile.rating_count, profile.rating = total, count, rating
+                        profile.save(update_fields=["rating_sum", "rating_count", "rating"])
+
+            verb = "would fix" if options["dry_run"] else "fixed"
+            self.stdout.write(self.style.SUCCESS(f"{profile_model.__name__}: {verb} {fixed} profiles"))
@@ -0,0 +1,52 @@
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    CompletedRide = apps.get_model("rides", "CompletedRide")
+    for profile_model, user_field, rating_field in (
+        ("DriverProfile", "driver", "driver_rating"),
+        ("RiderProfile", "rider", "rider_rating"),
+    ):
+        Profile = apps.get_model("accounts", profile_model)
+        totals = (
+            CompletedRide.objects.filter(**{f"{rating_field}__isnull": False})
+            .values(user_field)
+            .annotate(total=Sum(rating_field), count=Count("id"))
+        )
+        for row in totals:
+            Profile.objects.filter(user_id=row[user_field]).update(
+                rating_sum=row["total"], rating_count=row["count"]
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_keyset_pagination_indexes"),
+        ("rides", "0005_ride_state_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="driverprofile",
+            name="rating_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="driverprofile",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="riderprofile",
+            name="rating_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="riderprofile",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
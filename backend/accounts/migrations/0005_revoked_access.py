@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0004_profile_rating_aggregates"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RevokedAccess",
+            fields=[
+                ("user_id", models.UUIDField(primary_key=True, serialize=False)),
+                ("revoked_at", models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+            options={
+                "db_table": "revoked_access",
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0005_revoked_access"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PresenceSocket",
+            fields=[
+                ("key", models.CharField(max_length=200, primary_key=True, serialize=False)),
+                ("user_id", models.UUIDField(db_index=True)),
+                ("kind", models.CharField(max_length=10)),
+                ("seen_at", models.DateTimeField(db_index=True)),
+            ],
+            options={
+                "db_table": "presence_sockets",
+            },
+        ),
+    ]
@@ -1,6 +1,10 @@
 import uuid
+from decimal import Decimal
+
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.db import models
+from django.db.models import DecimalField, F, FloatField
+from django.db.models.functions import Cast, Floor
 from .managers import CustomUserManager
 
 
@@ -29,12 +33,55 @@ class User(AbstractBaseUser, PermissionsMixin):
     class Meta:
         db_table = "users"
         ordering = ["-created_at"]
+        indexes = [
+            # Keyset pagination (ride_project.pagination.KeysetPagination)
+            models.Index(fields=["-created_at", "-id"], name="users_created_idx"),
+            models.Index(
+                fields=["-created_at", "-id"],
+                name="users_online_created_idx",
+                condition=models.Q(is_online=True),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.full_name} ({self.role})"
 
 
-class DriverProfile(models.Model):
+class RatedProfile(models.Model):
+    """Keeps a running rating sum and count so the average never rescans history."""
+
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    @staticmethod
+    def average(rating_sum, rating_count):
+        """Mean rating rounded half up to the stored two places. Works on ints and on F()
+        expressions, so record_rating and reconcile_ratings round the same way.
+
+        Hundredths are floor((200 * sum + count) / (2 * count)). The float division is
+        exact enough for the floor at these sizes, unlike rounding a float mean, which
+        turns 4.625 into 4.62.
+        """
+        if isinstance(rating_sum, int) and isinstance(rating_count, int):
+            return Decimal((rating_sum * 200 + rating_count) // (rating_count * 2)) / 100
+        hundredths = Floor(Cast(rating_sum * 200 + rating_count, FloatField()) / (rating_count * 2))
+        return Cast(hundredths, DecimalField(max_digits=5, decimal_places=0)) / 100
+
+    @classmethod
+    def record_rating(cls, user_id, rating):
+        # A single UPDATE: the right-hand side sees the pre-update row, so
+        # concurrent ratings for the same user cannot lose each other.
+        return cls.objects.filter(user_id=user_id).update(
+            rating_sum=F("rating_sum") + rating,
+            rating_count=F("rating_count") + 1,
+            rating=cls.average(F("rating_sum") + rating, F("rating_count") + 1),
+        )
+
+
+class DriverProfile(RatedProfile):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="driver_profile")
     vehicle_make = models.CharField(max_length=50, blank=True)
     vehicle_model = models.CharField(max_length=50, blank=True)
@@ -65,7 +112,7 @@ class FavouriteDriver(models.Model):
         return f"{self.rider.full_name} → {self.driver.full_name}"
 
 
-class RiderProfile(models.Model):
+class RiderProfile(RatedProfile):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="rider_profile")
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=5.00)
     total_rides = models.PositiveIntegerField(default=0)
@@ -75,3 +122,39 @@ class RiderProfile(models.Model):
 
     def __str__(self):
         return f"Rider: {self.user.full_name}"
+
+
+class RevokedAccess(models.Model):
+    """A user whose access tokens stop working before they expire (accounts.authentication).
+
+    Not a foreign key, so a deleted user stays revoked.
+    """
+
+    user_id = models.UUIDField(primary_key=True)
+    revoked_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        db_table = "revoked_access"
+
+    def __str__(self):
+        return f"Revoked: {self.user_id}"
+
+
+class PresenceSocket(models.Model):
+    """An open WebSocket or login session, shared by every worker (accounts.presence).
+
+    A user is online while they have any row and a driver is available while they
+    have a "driver" one. Each worker refreshes seen_at on its sockets' rows; socket
+    rows of a worker that died stop being refreshed and are removed by the others.
+    """
+
+    key = models.CharField(max_length=200, primary_key=True)  # channel name, or session:<user id>
+    user_id = models.UUIDField(db_index=True)
+    kind = models.CharField(max_length=10)  # "session" or the consumer's presence_kind
+    seen_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        db_table = "presence_sockets"
+
+    def __str__(self):
+        return f"{self.kind}: {self.user_id}"
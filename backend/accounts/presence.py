@@ -0,0 +1,303 @@
+"""
+Presence registry for users and drivers, shared by every worker.
+
+WebSocket consumers register each socket with the user it belongs to, and LoginView
+and LogoutView record sessions. Each socket and session is a PresenceSocket row,
+so the counts are the same on every worker. A user is online while they have any
+row: a login, or an open socket on any worker. A driver is available while any
+driver socket is open, so closing one of two tabs changes nothing, even when the
+tabs are on different workers. Sockets that stop sending (the frontend pings
+every 30 seconds) are dropped after PRESENCE_SOCKET_TTL_SECONDS, and come back
+with their next message.
+
+Transitions are not written one by one. A flusher on the ASGI event loop writes
+the rows and recomputes the users whose state changed every
+PRESENCE_FLUSH_SECONDS. Readers see users who came online through `online_q()`
+before the write. A user going offline is only known once the rows are written.
+Processes without a running flusher (tests, WSGI, management commands) write each
+change straight away.
+
+Each flush also refreshes seen_at on this worker's socket rows, at most every
+third of the TTL. Socket rows that have not been refreshed for the TTL belong to
+a worker that died, and the next flush on any worker removes them. stop()
+writes whatever is pending, and at process exit the worker also drops its own
+sockets first.
+"""
+import asyncio
+import atexit
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+def session_key(user_id):
+    return f"session:{user_id}"
+
+
+class PresenceRegistry:
+    def __init__(self):
+        self._sockets = {}  # user_id -> {channel_name: [kind, last_seen]} on this worker
+        self._writes = {}  # PresenceSocket key -> (user_id, kind) not yet written
+        self._removals = {}  # PresenceSocket key -> user_id not yet deleted
+        self._online = {}  # user_id -> True if online on this worker, False to recheck
+        self._available = {}  # user_id -> the same for DriverProfile.is_available
+        self._lock = threading.Lock()
+        self._refreshed_at = None
+        self._exit_hook = False
+        self.loop = None
+        self._task = None
+        self.flushed_total = 0
+        self.expired_total = 0
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    # Transitions
+
+    def connect(self, user_id, channel_name, kind):
+        with self._lock:
+            sockets = self._sockets.setdefault(user_id, {})
+            self._online[user_id] = True
+            if kind == "driver":
+                self._available[user_id] = True
+            sockets[channel_name] = [kind, time.monotonic()]
+            self._write(channel_name, user_id, kind)
+        self._changed()
+
+    def heartbeat(self, user_id, channel_name, kind):
+        with self._lock:
+            socket = self._sockets.get(user_id, {}).get(channel_name)
+            if socket is not None:
+                socket[1] = time.monotonic()
+                return
+        # Expired while the client was throttled (a background tab) but still open
+        self.connect(user_id, channel_name, kind)
+
+    def disconnect(self, user_id, channel_name):
+        with self._lock:
+            self._drop(user_id, channel_name)
+        self._changed()
+
+    def login(self, user_id):
+        with self._lock:
+            self._online[user_id] = True
+            self._write(session_key(user_id), user_id, "session")
+        self._changed()
+
+    def logout(self, user_id):
+        with self._lock:
+            self._online[user_id] = bool(self._sockets.get(user_id))
+            self._remove(session_key(user_id), user_id)
+        self._changed()
+
+    def expire(self):
+        """Drop sockets that have not sent anything for PRESENCE_SOCKET_TTL_SECONDS."""
+        cutoff = time.monotonic() - settings.PRESENCE_SOCKET_TTL_SECONDS
+        with self._lock:
+            stale = [
+                (user_id, channel_name)
+                for user_id, sockets in self._sockets.items()
+                for channel_name, (_, last_seen) in sockets.items()
+                if last_seen < cutoff
+            ]
+            for user_id, channel_name in stale:
+                self._drop(user_id, channel_name)
+            self.expired_total += len(stale)
+        return len(stale)
+
+    def _drop(self, user_id, channel_name):
+        sockets = self._sockets.get(user_id)
+        if not sockets or (socket := sockets.pop(channel_name, None)) is None:
+            return
+        if socket[0] == "driver":
+            self._available[user_id] = self._has_driver_socket(sockets)
+        self._online[user_id] = bool(sockets)
+        if not sockets:
+            del self._sockets[user_id]
+        self._remove(channel_name, user_id)
+
+    @staticmethod
+    def _has_driver_socket(sockets):
+        return any(kind == "driver" for kind, _ in sockets.values())
+
+    def _write(self, key, user_id, kind):
+        self._removals.pop(key, None)
+        self._writes[key] = (user_id, kind)
+
+    def _remove(self, key, user_id):
+        # A row that was never written needs no delete
+        if self._writes.pop(key, None) is None:
+            self._removals[key] = user_id
+
+    def _changed(self):
+        if self.running:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+        else:
+            loop.create_task(self.drain())
+
+    def clear(self):
+        with self._lock:
+            self._sockets.clear()
+            self._writes.clear()
+            self._removals.clear()
+            self._online.clear()
+            self._available.clear()
+            self._refreshed_at = None
+
+    # Persistence
+
+    def flush(self):
+        """Write pending changes; returns how many users were updated."""
+        from .models import DriverProfile, PresenceSocket, User
+
+        now = timezone.now()
+        refresh = self._refreshed_at is None or (
+            time.monotonic() - self._refreshed_at >= settings.PRESENCE_SOCKET_TTL_SECONDS / 3
+        )
+        with self._lock:
+            writes, removals = self._writes, self._removals
+            online, available = self._online, self._available
+            self._writes, self._removals, self._online, self._available = {}, {}, {}, {}
+            if refresh:
+                # This worker is alive: keep its socket rows from looking abandoned
+                live = {
+                    channel_name: (user_id, kind)
+                    for user_id, sockets in self._sockets.items()
+                    for channel_name, (kind, _) in sockets.items()
+                }
+                rows = {**live, **writes}
+            else:
+                rows = writes
+        try:
+            if removals:
+                PresenceSocket.objects.filter(key__in=removals).delete()
+            if rows:
+                PresenceSocket.objects.bulk_create(
+                    [PresenceSocket(key=key, user_id=user_id, kind=kind, seen_at=now) for key, (user_id, kind) in rows.items()],
+                    update_conflicts=True,
+                    unique_fields=["key"],
+                    update_fields=["user_id", "kind", "seen_at"],
+                )
+            if refresh:
+                cutoff = now - timedelta(seconds=settings.PRESENCE_SOCKET_TTL_SECONDS)
+                abandoned = list(
+                    PresenceSocket.objects.filter(seen_at__lt=cutoff).exclude(kind="session").values_list("key", "user_id", "kind")
+                )
+                if abandoned:
+                    PresenceSocket.objects.filter(key__in=[key for key, _, _ in abandoned]).delete()
+                    for _, user_id, kind in abandoned:
+                        online.setdefault(user_id, False)
+                        if kind == "driver":
+                            available.setdefault(user_id, False)
+
+            if online or available:
+                held = set(
+                    PresenceSocket.objects.filter(user_id__in=online.keys() | available.keys()).values_list("user_id", "kind")
+                )
+                online_now = {user_id for user_id, _ in held}
+                available_now = {user_id for user_id, kind in held if kind == "driver"}
+                for value in (True, False):
+                    users = [user_id for user_id in online if (user_id in online_now) is value]
+                    if users:
+                        User.objects.filter(pk__in=users).update(is_online=value)
+                    drivers = [user_id for user_id in available if (user_id in available_now) is value]
+                    if drivers:
+                        DriverProfile.objects.filter(user_id__in=drivers).update(is_available=value)
+        except Exception:
+            with self._lock:
+                # Keep anything that changed again while the write failed
+                for key, user_id in removals.items():
+                    if key not in self._writes:
+                        self._removals.setdefault(key, user_id)
+                for key, row in writes.items():
+                    if key not in self._removals:
+                        self._writes.setdefault(key, row)
+                self._online = {**online, **self._online}
+                self._available = {**available, **self._available}
+            raise
+        if refresh:
+            self._refreshed_at = time.monotonic()
+        self.flushed_total += len(online) + len(available)
+        return len(online) + len(available)
+
+    def online_q(self):
+        """Filter for online users: the stored flag, plus users online here but not yet written."""
+        with self._lock:
+            went_online = [user_id for user_id, state in self._online.items() if state]
+        q = Q(is_online=True)
+        if went_online:
+            q |= Q(pk__in=went_online)
+        return q
+
+    # Background flusher
+
+    def start(self):
+        """Run the flusher as a task on the current event loop."""
+        if self.running:
+            return
+        if not self._exit_hook:
+            atexit.register(self.shutdown)
+            self._exit_hook = True
+        self.loop = asyncio.get_running_loop()
+        self._task = self.loop.create_task(self.run())
+
+    def stop(self):
+        """Stop the flusher and write the changes it had not written yet."""
+        if self.running and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._task.cancel)
+        self._task = None
+        self.loop = None
+        with self._lock:
+            pending = self._writes or self._removals or self._online or self._available
+        if not pending:
+            return
+        try:
+            self._changed()
+        except Exception:
+            logger.exception("Presence flush failed; pending changes were not written")
+
+    def shutdown(self):
+        """Drop this worker's sockets, which close with the process, then stop."""
+        with self._lock:
+            for user_id, sockets in list(self._sockets.items()):
+                for channel_name in list(sockets):
+                    self._drop(user_id, channel_name)
+        self.stop()
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(settings.PRESENCE_FLUSH_SECONDS)
+            self.expire()
+            await self.drain()
+
+    async def drain(self):
+        try:
+            await database_sync_to_async(self.flush)()
+        except Exception:
+            logger.exception("Presence flush failed; retrying on the next flush")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "users_connected": len(self._sockets),
+                "sockets": sum(len(sockets) for sockets in self._sockets.values()),
+                "pending_writes": len(self._writes) + len(self._removals) + len(self._online) + len(self._available),
+                "flushed_total": self.flushed_total,
+                "expired_total": self.expired_total,
+            }
+
+
+presence = PresenceRegistry()
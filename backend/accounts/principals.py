@@ -0,0 +1,31 @@
+"""
+Users resolved for WebSocket handshakes (ride_project.middleware.JWTWebSocketMiddleware)
+and for the async ride endpoints (ride_project.async_views.AsyncAPIView).
+
+Reconnect storms (every client at once after a deploy) would otherwise cost a user
+query per handshake. Entries are dropped by the post_save/post_delete receivers in
+accounts.signals; other workers see a change once their entry is
+WS_PRINCIPAL_CACHE_TTL_SECONDS old.
+"""
+from django.conf import settings
+
+from ride_project.caching import TTLLRUCache
+from .models import User
+
+principal_cache = TTLLRUCache(
+    maxsize=settings.WS_PRINCIPAL_CACHE_SIZE,
+    ttl=settings.WS_PRINCIPAL_CACHE_TTL_SECONDS,
+)
+
+
+def load_principal(user_id):
+    """Fetch the user with both profiles, as consumers read them."""
+    return User.objects.select_related("driver_profile", "rider_profile").get(id=user_id)
+
+
+def cached_principal(user_id):
+    return principal_cache.get(str(user_id))
+
+
+def get_principal(user_id):
+    return principal_cache.load(str(user_id), lambda: load_principal(user_id))
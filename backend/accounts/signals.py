@@ -0,0 +1,35 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import revocations
+from .models import User, DriverProfile, RiderProfile
+from .cards import driver_card_cache
+from .principals import principal_cache
+
+
+@receiver([post_save, post_delete], sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    principal_cache.invalidate(str(instance.pk))
+    driver_card_cache.invalidate(str(instance.pk))
+
+
+@receiver(post_save, sender=User)
+def revoke_inactive_user(sender, instance, created, update_fields=None, **kwargs):
+    # Access tokens carry is_active (accounts.authentication); outstanding ones must stop working
+    if not instance.is_active:
+        revocations.revoke(instance.pk)
+    elif not created and (update_fields is None or "is_active" in update_fields):
+        # Unconditionally: this worker's copy may not know the user was revoked elsewhere
+        revocations.restore(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def revoke_deleted_user(sender, instance, **kwargs):
+    revocations.revoke(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=DriverProfile)
+@receiver([post_save, post_delete], sender=RiderProfile)
+def forget_cached_profile_owner(sender, instance, **kwargs):
+    principal_cache.invalidate(str(instance.user_id))
+    driver_card_cache.invalidate(str(instance.user_id))
@@ -0,0 +1,39 @@
+"""
+Platform totals for the admin dashboard (accounts.views.AdminStatsView).
+
+Each table is read once with conditional aggregates, and the result is cached per
+worker for ADMIN_STATS_CACHE_TTL_SECONDS, so dashboard refreshes cost nothing
+between recomputes however large the tables grow. `manage.py check_admin_stats`
+compares the figures with exact per-statistic counts.
+"""
+from django.conf import settings
+from django.db.models import Count, Q
+
+from ride_project.caching import TTLLRUCache
+from .models import User
+from .presence import presence
+
+ACTIVE_RIDE_STATUSES = ["pending", "offered", "accepted", "in_progress"]
+
+stats_cache = TTLLRUCache(maxsize=1, ttl=settings.ADMIN_STATS_CACHE_TTL_SECONDS)
+
+
+def compute_admin_stats():
+    from rides.models import RideRequest
+
+    return {
+        **User.objects.aggregate(
+            total_users=Count("pk"),
+            total_drivers=Count("pk", filter=Q(role="driver")),
+            total_riders=Count("pk", filter=Q(role="rider")),
+            online_users=Count("pk", filter=presence.online_q()),
+        ),
+        **RideRequest.objects.aggregate(
+            active_rides=Count("pk", filter=Q(status__in=ACTIVE_RIDE_STATUSES)),
+            completed_rides=Count("pk", filter=Q(status="completed")),
+        ),
+    }
+
+
+def get_admin_stats():
+    return stats_cache.get_or_load("stats", compute_admin_stats)
@@ -1,3 +1,449 @@
-from django.test import TestCase
+import tempfile
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ride_project.caching import TTLLRUCache
+from ride_project.metrics import Histogram, metrics
+from ride_project.profiling import ProfileStore, profile_store
+from ride_project.middleware import JWTWebSocketMiddleware
+from .authentication import PrincipalRefreshToken, revocations
+from .models import User, DriverProfile, PresenceSocket, RevokedAccess
+from .presence import PresenceRegistry, presence
+from .principals import get_principal, principal_cache
+from .stats import stats_cache
+
+
+class TTLLRUCacheTests(SimpleTestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TTLLRUCache(maxsize=2, ttl=60)
+        cache.load("a", lambda: 1)
+        cache.load("b", lambda: 2)
+        cache.get("a")
+        cache.load("c", lambda: 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_entries_expire(self):
+        cache = TTLLRUCache(maxsize=10, ttl=60)
+        with mock.patch("ride_project.caching.time.monotonic", return_value=1000):
+            cache.load("a", lambda: 1)
+        with mock.patch("ride_project.caching.time.monotonic", return_value=1061):
+            self.assertIsNone(cache.get("a"))
+
+    def test_value_loaded_across_an_invalidation_is_not_stored(self):
+        cache = TTLLRUCache(maxsize=10, ttl=60)
+
+        def load_while_invalidated():
+            cache.invalidate("a")
+            return "stale"
+
+        self.assertEqual(cache.get_or_load("a", load_while_invalidated), "stale")
+        self.assertIsNone(cache.get("a"))
+
+    def test_hit_rate(self):
+        cache = TTLLRUCache(maxsize=10, ttl=60)
+        cache.get_or_load("a", lambda: 1)
+        cache.get_or_load("a", lambda: 1)
+        cache.get_or_load("a", lambda: 1)
+        self.assertEqual(cache.stats()["hit_rate"], round(2 / 3, 4))
+
+
+class PrincipalCacheTests(TestCase):
+    def setUp(self):
+        principal_cache.clear()
+        self.addCleanup(principal_cache.clear)
+        self.driver = User.objects.create_user("driver@example.com", "Driver", "555-0100", "driver")
+        DriverProfile.objects.create(user=self.driver, vehicle_make="Honda")
+
+    def connect(self, user):
+        scopes = []
+
+        async def app(scope, receive, send):
+            scopes.append(scope)
+
+        token = AccessToken.for_user(user)
+        scope = {"type": "websocket", "query_string": f"token={token}".encode()}
+        async_to_sync(JWTWebSocketMiddleware(app))(scope, None, None)
+        return scopes[0]["user"]
+
+    def test_user_and_profile_load_in_one_query(self):
+        with self.assertNumQueries(1):
+            user = get_principal(self.driver.pk)
+            self.assertEqual(user.driver_profile.vehicle_make, "Honda")
+
+    def test_handshake_hits_the_cache(self):
+        get_principal(self.driver.pk)
+        revocations.reload()
+        self.addCleanup(revocations.clear)
+
+        with self.assertNumQueries(0):
+            user = self.connect(self.driver)
+
+        self.assertEqual(user.pk, self.driver.pk)
+        self.assertEqual(principal_cache.stats()["hits"], 1)
+
+    def test_handshake_rejects_a_revoked_user_from_the_cache(self):
+        get_principal(self.driver.pk)
+        # Deactivated on another worker: this one's cached principal is still active
+        RevokedAccess.objects.create(user_id=self.driver.pk)
+        revocations.clear()
+        self.addCleanup(revocations.clear)
+
+        self.assertTrue(self.connect(self.driver).is_anonymous)
+
+    def test_saving_the_user_or_profile_evicts_it(self):
+        get_principal(self.driver.pk)
+        self.driver.full_name = "Renamed"
+        self.driver.save()
+        self.assertEqual(get_principal(self.driver.pk).full_name, "Renamed")
+
+        DriverProfile.objects.filter(user=self.driver).first().save()
+        self.assertEqual(principal_cache.stats()["size"], 0)
+
+
+class PresenceTests(TestCase):
+    def setUp(self):
+        presence.clear()
+        self.addCleanup(presence.clear)
+        self.driver = User.objects.create_user("driver@example.com", "Driver", "555-0100", "driver")
+        DriverProfile.objects.create(user=self.driver)
+        self.admin = User.objects.create_user("admin@example.com", "Admin", "555-0101", "admin")
+
+    def state(self):
+        self.driver.refresh_from_db()
+        return self.driver.is_online, self.driver.driver_profile.is_available
+
+    def test_driver_stays_available_until_the_last_tab_closes(self):
+        presence.connect(self.driver.id, "tab-1", "driver")
+        presence.connect(self.driver.id, "tab-2", "driver")
+        presence.disconnect(self.driver.id, "tab-1")
+        self.assertEqual(self.state(), (True, True))
+
+        presence.disconnect(self.driver.id, "tab-2")
+        self.assertEqual(self.state(), (False, False))
+
+    def test_logged_in_user_stays_online_without_sockets(self):
+        presence.login(self.driver.id)
+        presence.connect(self.driver.id, "tab-1", "driver")
+        presence.disconnect(self.driver.id, "tab-1")
+        self.assertEqual(self.state(), (True, False))
+
+        presence.logout(self.driver.id)
+        self.assertEqual(self.state(), (False, False))
+
+    def test_silent_sockets_expire(self):
+        with mock.patch("accounts.presence.time.monotonic", return_value=1000):
+            presence.connect(self.driver.id, "tab-1", "driver")
+        with mock.patch("accounts.presence.time.monotonic", return_value=1000 + 91):
+            self.assertEqual(presence.expire(), 1)
+        presence.flush()
+        self.assertEqual(self.state(), (False, False))
+
+        # The socket was only throttled: its next message brings the driver back
+        presence.heartbeat(self.driver.id, "tab-1", "driver")
+        self.assertEqual(self.state(), (True, True))
+        presence.heartbeat(self.driver.id, "tab-1", "driver")
+        self.assertEqual(presence.stats()["sockets"], 1)
+
+    def test_changes_are_batched_while_the_flusher_runs(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+
+        with mock.patch.object(PresenceRegistry, "running", new_callable=mock.PropertyMock, return_value=True):
+            with self.assertNumQueries(0):
+                for n in range(10):
+                    presence.connect(self.driver.id, f"tab-{n}", "driver")
+                    presence.disconnect(self.driver.id, f"tab-{n}")
+                presence.connect(self.driver.id, "tab", "driver")
+            # Readers see the change before it is written
+            self.assertEqual([u["email"] for u in client.get("/api/admin/online-users/").data["results"]], ["driver@example.com"])
+            self.assertEqual(self.state(), (False, False))
+
+            with self.assertNumQueries(5):
+                self.assertEqual(presence.flush(), 2)
+        self.assertEqual(self.state(), (True, True))
+
+    def test_tabs_on_different_workers_share_the_count(self):
+        other_worker = PresenceRegistry()
+        presence.connect(self.driver.id, "worker-a-tab", "driver")
+        other_worker.connect(self.driver.id, "worker-b-tab", "driver")
+
+        presence.disconnect(self.driver.id, "worker-a-tab")
+        self.assertEqual(self.state(), (True, True))
+        other_worker.disconnect(self.driver.id, "worker-b-tab")
+        self.assertEqual(self.state(), (False, False))
+
+        other_worker.login(self.driver.id)
+        presence.connect(self.driver.id, "worker-a-tab", "driver")
+        presence.disconnect(self.driver.id, "worker-a-tab")
+        self.assertEqual(self.state(), (True, False))
+
+    def test_sockets_of_a_dead_worker_are_dropped(self):
+        PresenceRegistry().connect(self.driver.id, "dead-worker-tab", "driver")
+        presence.connect(self.driver.id, "tab-1", "driver")
+        PresenceSocket.objects.update(seen_at=timezone.now() - timedelta(seconds=91))
+
+        # This worker refreshes its own socket and drops the dead worker's
+        presence.clear()
+        presence.connect(self.driver.id, "tab-1", "driver")
+        self.assertEqual(set(PresenceSocket.objects.values_list("key", flat=True)), {"tab-1"})
+        self.assertEqual(self.state(), (True, True))
+
+        presence.disconnect(self.driver.id, "tab-1")
+        PresenceRegistry().connect(self.driver.id, "dead-worker-tab", "driver")
+        PresenceSocket.objects.update(seen_at=timezone.now() - timedelta(seconds=91))
+        presence.clear()
+        presence.flush()
+        self.assertEqual(self.state(), (False, False))
+
+    def test_stop_writes_pending_changes(self):
+        with mock.patch.object(PresenceRegistry, "running", new_callable=mock.PropertyMock, return_value=True):
+            presence.connect(self.driver.id, "tab-1", "driver")
+        self.assertEqual(self.state(), (False, False))
+
+        presence.stop()
+        self.assertEqual(self.state(), (True, True))
+
+        with mock.patch.object(PresenceRegistry, "running", new_callable=mock.PropertyMock, return_value=True):
+            presence.connect(self.driver.id, "tab-2", "driver")
+        # At exit the worker's own sockets go too
+        presence.shutdown()
+        self.assertEqual(self.state(), (False, False))
+        self.assertFalse(PresenceSocket.objects.exists())
+
+    def test_login_and_logout_views(self):
+        self.driver.set_password("pw")
+        self.driver.save()
+        client = APIClient()
+        response = client.post("/api/auth/login/", {"email": "driver@example.com", "password": "pw"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.state()[0], True)
+
+        client.force_authenticate(self.driver)
+        client.post("/api/auth/logout/", {})
+        self.assertEqual(self.state()[0], False)
+
+
+class AdminStatsTests(TestCase):
+    def setUp(self):
+        from rides.models import RideRequest
+
+        stats_cache.clear()
+        self.addCleanup(stats_cache.clear)
+        admin = User.objects.create_user("admin@example.com", "Admin", "555-0100", "admin")
+        rider = User.objects.create_user("rider@example.com", "Rider", "555-0101", "rider", is_online=True)
+        User.objects.create_user("driver@example.com", "Driver", "555-0102", "driver")
+        ride = {
+            "pickup_city": "A", "pickup_state": "CA", "pickup_lat": 0, "pickup_lng": 0,
+            "dropoff_city": "B", "dropoff_state": "CA", "dropoff_lat": 0, "dropoff_lng": 0,
+            "distance_miles": 1, "suggested_price": 3,
+        }
+        for status in ("pending", "accepted", "completed", "cancelled"):
+            RideRequest.objects.create(rider=rider, status=status, **ride)
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+    def test_one_query_per_table_then_cached(self):
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/admin/stats/")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/api/admin/stats/").data, response.data)
+
+        self.assertEqual(
+            response.data,
+            {"total_users": 3, "total_drivers": 1, "total_riders": 1, "online_users": 1, "active_rides": 2, "completed_rides": 1},
+        )
+
+    def test_consistency_check(self):
+        out = StringIO()
+        call_command("check_admin_stats", stdout=out)
+        self.assertIn("match the exact counts", out.getvalue())
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        stats_cache.clear()
+        metrics.clear()
+        self.addCleanup(stats_cache.clear)
+        self.addCleanup(metrics.clear)
+        self.admin = User.objects.create_user("admin@example.com", "Admin", "555-0100", "admin")
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_histogram_text(self):
+        histogram = Histogram("latency_seconds", "Latency.", ("view",), buckets=(0.1, 1))
+        histogram.observe("a", value=0.05)
+        histogram.observe("a", value=0.5)
+        histogram.observe("a", value=5)
+        self.assertEqual(
+            histogram.render(),
+            [
+                "# HELP latency_seconds Latency.",
+                "# TYPE latency_seconds histogram",
+                'latency_seconds_bucket{view="a",le="0.1"} 1',
+                'latency_seconds_bucket{view="a",le="1"} 2',
+                'latency_seconds_bucket{view="a",le="+Inf"} 3',
+                'latency_seconds_sum{view="a"} 5.55',
+                'latency_seconds_count{view="a"} 3',
+            ],
+        )
+
+    def test_admin_endpoint_reports_views_and_caches(self):
+        self.client.get("/api/admin/stats/")
+        response = self.client.get("/api/admin/metrics/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        body = response.content.decode()
+        self.assertIn('campusride_http_request_duration_seconds_count{view="admin_stats",method="GET"} 1', body)
+        # One aggregate per table on a cold stats cache
+        self.assertIn('campusride_http_request_queries_sum{view="admin_stats",method="GET"} 2', body)
+        self.assertIn('campusride_http_responses_total{view="admin_stats",method="GET",status="200"} 1', body)
+        self.assertIn('campusride_cache_misses_total{cache="admin_stats"} 1', body)
+        self.assertIn("# TYPE campusride_presence_sockets gauge", body)
+
+    def test_admin_only(self):
+        rider = User.objects.create_user("rider@example.com", "Rider", "555-0101", "rider")
+        self.client.force_authenticate(rider)
+        self.assertEqual(self.client.get("/api/admin/metrics/").status_code, 403)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        stats_cache.clear()
+        self.addCleanup(stats_cache.clear)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch.object(profile_store, "directory", directory.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.admin = User.objects.create_user("admin@example.com", "Admin", "555-0100", "admin")
+        self.client = APIClient()
+
+    def get(self, path, user, **headers):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+        return self.client.get(path, **headers)
+
+    def test_flagged_admin_request_is_profiled(self):
+        response = self.get("/api/admin/stats/", self.admin, HTTP_X_PROFILE="1")
+        self.assertEqual(response.status_code, 200)
+        profile_id = response["X-Profile-Id"]
+
+        [profile] = self.get("/api/admin/profiles/", self.admin).data
+        self.assertEqual(profile["id"], profile_id)
+        self.assertEqual((profile["method"], profile["view"], profile["status"]), ("GET", "admin_stats", 200))
+
+        download = self.get(f"/api/admin/profiles/{profile_id}/", self.admin)
+        self.assertEqual(download.status_code, 200)
+        self.assertIn(f'filename="profile-{profile_id}.folded"', download["Content-Disposition"])
+        for line in download.content.decode().splitlines():
+            self.assertRegex(line, r"^\S.* \d+$")
+
+    def test_only_flagged_admin_requests_are_profiled(self):
+        rider = User.objects.create_user("rider@example.com", "Rider", "555-0101", "rider")
+        self.assertNotIn("X-Profile-Id", self.get("/api/admin/stats/", self.admin))
+        self.assertNotIn("X-Profile-Id", self.get("/api/rides/active/?profile=1", rider))
+        self.assertEqual(self.get("/api/admin/profiles/", self.admin).data, [])
+        self.assertEqual(self.get("/api/admin/profiles/", rider).status_code, 403)
+
+    def test_keeps_the_newest_profiles(self):
+        store = ProfileStore(profile_store.directory, keep=2)
+        ids = [store.save({"n": n}, "a;b 1\n") for n in range(3)]
+        self.assertEqual([p["n"] for p in store.list()], [2, 1])
+        self.assertIsNone(store.collapsed(ids[0]))
+        self.assertEqual(store.collapsed(ids[2]), "a;b 1\n")
+        self.assertIsNone(store.collapsed("../../etc/passwd"))
+
+
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        self.rider = User.objects.create_user("rider@example.com", "Rider", "555-0101", "rider")
+        self.admin = User.objects.create_user("admin@example.com", "Admin", "555-0100", "admin")
+        revocations.reload()
+        self.addCleanup(revocations.clear)
+
+    def get(self, path, token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        return client.get(path)
+
+    def claims_token(self, user):
+        return PrincipalRefreshToken.for_user(user).access_token
+
+    def test_claims_skip_the_user_query(self):
+        claims_token, plain_token = self.claims_token(self.rider), AccessToken.for_user(self.rider)
+        with CaptureQueriesContext(connection) as claims:
+            self.assertEqual(self.get("/api/rides/active/", claims_token).status_code, 200)
+        with CaptureQueriesContext(connection) as lookup:
+            self.assertEqual(self.get("/api/rides/active/", plain_token).status_code, 200)
+        self.assertEqual(len(lookup) - len(claims), 1)
+
+    def test_profile_reads_the_whole_user(self):
+        response = self.get("/api/auth/profile/", self.claims_token(self.rider))
+        self.assertEqual((response.data["full_name"], response.data["phone_number"]), ("Rider", "555-0101"))
+
+    def test_deactivation_revokes_outstanding_tokens(self):
+        token = self.claims_token(self.rider)
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        client.delete(f"/api/admin/users/{self.rider.id}/")
+        self.assertEqual(self.get("/api/rides/active/", token).status_code, 401)
+
+        # Another worker picks it up from the table
+        revocations.clear()
+        self.assertEqual(self.get("/api/rides/active/", token).status_code, 401)
+
+        self.rider.is_active = True
+        self.rider.save()
+        self.assertFalse(RevokedAccess.objects.exists())
+        self.assertEqual(self.get("/api/rides/active/", token).status_code, 200)
+
+    def test_reactivation_elsewhere_clears_the_revocation(self):
+        self.rider.is_active = False
+        self.rider.save()
+        # This worker never loaded the revocation
+        revocations.clear()
+        self.rider.is_active = True
+        self.rider.save(update_fields=["is_active"])
+        self.assertFalse(RevokedAccess.objects.exists())
+
+    def test_only_tokens_issued_before_the_revocation_are_rejected(self):
+        old_token = self.claims_token(self.rider)
+        RevokedAccess.objects.create(user_id=self.rider.pk)
+        RevokedAccess.objects.update(revoked_at=timezone.now() - timedelta(minutes=1))
+        revocations.clear()
+        self.assertEqual(self.get("/api/rides/active/", old_token).status_code, 200)
+
+        RevokedAccess.objects.update(revoked_at=timezone.now() + timedelta(minutes=1))
+        revocations.clear()
+        self.assertEqual(self.get("/api/rides/active/", old_token).status_code, 401)
+
+    def test_async_views_check_revocations_before_the_cached_principal(self):
+        token = AccessToken.for_user(self.rider)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        path = f"/api/rides/request/{uuid.uuid4()}/update/"
+        self.assertEqual(client.patch(path, {"status": "cancelled"}, format="json").status_code, 404)
+
+        RevokedAccess.objects.create(user_id=self.rider.pk)
+        revocations.clear()
+        self.assertEqual(client.patch(path, {"status": "cancelled"}, format="json").status_code, 401)
+
+    def test_deleted_user_stays_revoked(self):
+        token = self.claims_token(self.rider)
+        self.rider.delete()
+        revocations.clear()
+        self.assertEqual(self.get("/api/rides/active/", token).status_code, 401)
@@ -1,14 +1,22 @@
+from django.http import HttpResponse
 from rest_framework import status
 from rest_framework.generics import CreateAPIView, RetrieveUpdateAPIView, ListAPIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenRefreshView as BaseTokenRefreshView
 
+from .authentication import PrincipalRefreshToken
 from .models import User, DriverProfile, FavouriteDriver
 from .serializers import RegisterSerializer, UserSerializer, UpdateProfileSerializer, DriverProfileSerializer
 from .permissions import IsAdmin, IsRider
+from .presence import presence
+from .stats import get_admin_stats
+from ride_project.metrics import metrics
+from ride_project.profiling import profile_store
+from ride_project.pagination import KeysetPagination
 
 
 class RegisterView(CreateAPIView):
@@ -19,7 +27,7 @@ class RegisterView(CreateAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
-        refresh = RefreshToken.for_user(user)
+        refresh = PrincipalRefreshToken.for_user(user)
         return Response(
             {
                 "user": UserSerializer(user).data,
@@ -59,10 +67,9 @@ class LoginView(APIView):
                 status=status.HTTP_403_FORBIDDEN,
             )
 
-        user.is_online = True
-        user.save(update_fields=["is_online"])
+        presence.login(user.id)
 
-        refresh = RefreshToken.for_user(user)
+        refresh = PrincipalRefreshToken.for_user(user)
         return Response(
             {
                 "user": UserSerializer(user).data,
@@ -84,12 +91,14 @@ class LogoutView(APIView):
         except Exception:
             pass
 
-        request.user.is_online = False
-        request.user.save(update_fields=["is_online"])
+        presence.logout(request.user.id)
         return Response({"message": "Logged out"}, status=status.HTTP_200_OK)
 
 
 class ProfileView(RetrieveUpdateAPIView):
+    # Serializes and updates the whole user row, so load it rather than a token principal
+    authentication_classes = [JWTAuthentication]
+
     def get_serializer_class(self):
         if self.request.method in ("PUT", "PATCH"):
             return UpdateProfileSerializer
@@ -114,6 +123,7 @@ class TokenRefreshView(BaseTokenRefreshView):
 class AdminUserListView(ListAPIView):
     permission_classes = [IsAdmin]
     serializer_class = UserSerializer
+    pagination_class = KeysetPagination
     queryset = User.objects.all()
 
 
@@ -143,29 +153,43 @@ class AdminDeleteUserView(APIView):
 class AdminOnlineUsersView(ListAPIView):
     permission_classes = [IsAdmin]
     serializer_class = UserSerializer
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        return User.objects.filter(is_online=True)
+        return User.objects.filter(presence.online_q())
 
 
 class AdminStatsView(APIView):
     permission_classes = [IsAdmin]
 
     def get(self, request):
-        from rides.models import RideRequest
+        return Response(get_admin_stats())
 
-        return Response(
-            {
-                "total_users": User.objects.count(),
-                "total_drivers": User.objects.filter(role="driver").count(),
-                "total_riders": User.objects.filter(role="rider").count(),
-                "online_users": User.objects.filter(is_online=True).count(),
-                "active_rides": RideRequest.objects.filter(
-                    status__in=["pending", "offered", "accepted", "in_progress"]
-                ).count(),
-                "completed_rides": RideRequest.objects.filter(status="completed").count(),
-            }
-        )
+
+class AdminMetricsView(APIView):
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+class AdminProfileListView(APIView):
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return Response(profile_store.list())
+
+
+class AdminProfileDownloadView(APIView):
+    permission_classes = [IsAdmin]
+
+    def get(self, request, profile_id):
+        collapsed = profile_store.collapsed(profile_id)
+        if collapsed is None:
+            return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+        response = HttpResponse(collapsed, content_type="text/plain; charset=utf-8")
+        response["Content-Disposition"] = f'attachment; filename="profile-{profile_id}.folded"'
+        return response
 
 
 class FavouriteDriverView(APIView):
@@ -0,0 +1,219 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count, Max
+
+from rides.utils import haversine_miles_batch
+
+
+class CityPrefixIndex:
+    """Population-ranked prefix index over serialized US cities.
+
+    Cities are kept in an array sorted by lower-cased name so a prefix maps to a
+    contiguous slice found with bisect. Results for the short prefixes typed on
+    the first keystrokes are precomputed, since those slices are the largest.
+    """
+
+    PRECOMPUTED_PREFIX_LENGTH = 3
+
+    def __init__(self, cities, limit=10):
+        self.limit = limit
+        # Most populous first within the same name so ties need no re-sorting
+        self._entries = sorted(cities, key=lambda c: (c["city"].lower(), -c["population"], c["state"]))
+        self._keys = [c["city"].lower() for c in self._entries]
+        self._top = {}
+        for length in range(1, self.PRECOMPUTED_PREFIX_LENGTH + 1):
+            for prefix in {key[:length] for key in self._keys if len(key) >= length}:
+                self._top[prefix] = self._rank(self._slice(prefix))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _slice(self, prefix):
+        lo = bisect_left(self._keys, prefix)
+        hi = bisect_left(self._keys, prefix + "\uffff", lo)
+        return self._entries[lo:hi]
+
+    def _rank(self, candidates):
+        return heapq.nsmallest(
+            self.limit, candidates, key=lambda c: (-c["population"], c["city"], c["state"])
+        )
+
+    def search(self, query):
+        """Top matches for "City" or "City, ST" prefixes, most populous first."""
+        city_part, _, state_part = query.partition(",")
+        prefix = city_part.strip().lower()
+        state = state_part.strip().upper()
+        if not prefix:
+            return []
+
+        if not state and prefix in self._top:
+            return list(self._top[prefix])
+
+        candidates = self._slice(prefix)
+        if state:
+            candidates = [c for c in candidates if c["state"].startswith(state)]
+        return self._rank(candidates)
+
+
+class CitySpatialIndex:
+    """Nearest-city lookups over serialized US cities.
+
+    Cities are bucketed into a lat/lng grid of CELL_DEGREES cells and stored
+    sorted by cell, so the cells around a point map to slices found with
+    searchsorted. Distances are computed for those candidates only, with the
+    same haversine as the rest of the app.
+    """
+
+    CELL_DEGREES = 1.0
+    MAX_RADIUS_MILES = 12451  # Half the Earth's circumference
+
+    def __init__(self, cities):
+        self._columns = int(round(360 / self.CELL_DEGREES))
+        cities = list(cities)
+        lat = np.array([float(c["latitude"]) for c in cities], dtype=np.float64)
+        lng = np.array([float(c["longitude"]) for c in cities], dtype=np.float64)
+        keys = self._row(lat) * self._columns + self._column(lng)
+        order = np.argsort(keys, kind="stable")
+        self._entries = [cities[i] for i in order]
+        self._keys, self._lat, self._lng = keys[order], lat[order], lng[order]
+        self._by_name = {(c["city"].lower(), c["state"]): c for c in self._entries}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _row(self, lat):
+        return np.minimum(np.floor((np.asarray(lat) + 90) / self.CELL_DEGREES), 180 / self.CELL_DEGREES - 1).astype(np.int64)
+
+    def _column(self, lng):
+        return np.floor((np.asarray(lng) + 180) / self.CELL_DEGREES).astype(np.int64) % self._columns
+
+    def _candidates(self, lat, lng, radius_miles):
+        # One degree of latitude is ~69 miles; longitude shrinks with cos(lat).
+        dlat = radius_miles / 69.0
+        cos_lat = max(np.cos(np.radians(min(abs(lat) + dlat, 89.9))), 0.01)
+        dlng = radius_miles / (69.0 * cos_lat)
+        if dlng * 2 >= 360 or abs(lat) + dlat >= 90:
+            return np.arange(len(self._entries))
+
+        first_row, last_row = int(self._row(max(lat - dlat, -90))), int(self._row(min(lat + dlat, 90)))
+        west = int(np.floor((lng - dlng + 180) / self.CELL_DEGREES))
+        east = int(np.floor((lng + dlng + 180) / self.CELL_DEGREES))
+        # Column ranges, split where the box crosses the antimeridian
+        spans = [(west % self._columns, east % self._columns)]
+        if spans[0][0] > spans[0][1]:
+            spans = [(spans[0][0], self._columns - 1), (0, spans[0][1])]
+
+        slices = []
+        for row in range(first_row, last_row + 1):
+            for first_column, last_column in spans:
+                lo = np.searchsorted(self._keys, row * self._columns + first_column, side="left")
+                hi = np.searchsorted(self._keys, row * self._columns + last_column, side="right")
+                if hi > lo:
+                    slices.append(np.arange(lo, hi))
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+    def _measure(self, lat, lng, radius_miles):
+        candidates = self._candidates(lat, lng, radius_miles)
+        return candidates, haversine_miles_batch(lat, lng, self._lat[candidates], self._lng[candidates])
+
+    def _results(self, candidates, distances, limit):
+        order = np.argsort(distances, kind="stable")[:limit]
+        return [dict(self._entries[candidates[i]], distance_miles=float(distances[i])) for i in order]
+
+    def within(self, lat, lng, radius_miles, limit=None):
+        """Cities within `radius_miles` of (lat, lng), nearest first, with `distance_miles`."""
+        candidates, distances = self._measure(float(lat), float(lng), radius_miles)
+        inside = distances <= radius_miles
+        return self._results(candidates[inside], distances[inside], limit)
+
+    def nearest(self, lat, lng, k=1):
+        """The `k` cities closest to (lat, lng), nearest first, with `distance_miles`."""
+        lat, lng = float(lat), float(lng)
+        k = min(k, len(self._entries))
+        if not k:
+            return []
+        # Widen until the cells hold k cities. The k-th of those bounds the answer, so
+        # at most one more pass at that radius is needed to catch closer cities in
+        # cells outside the first box.
+        radius = 69.0 * self.CELL_DEGREES
+        while True:
+            candidates, distances = self._measure(lat, lng, radius)
+            if len(candidates) >= k:
+                kth = np.partition(distances, k - 1)[k - 1]
+                if kth <= radius:
+                    return self._results(candidates, distances, k)
+                radius = kth
+            else:
+                radius = min(radius * 4, self.MAX_RADIUS_MILES)
+
+    def lookup(self, city, state):
+        return self._by_name.get((city.strip().lower(), state.strip().upper()))
+
+
+class CityIndexHolder:
+    """Per-process holder that builds an index lazily and rebuilds it when the cities change.
+
+    At most every CITY_INDEX_CHECK_SECONDS a caller compares the USCity row count and
+    highest id with those the index was built from. load_us_cities replaces every row,
+    so a reload changes the stamp and every worker rebuilds, not only the one that ran it.
+    """
+
+    def __init__(self, index_class=CityPrefixIndex):
+        self.index_class = index_class
+        self._index = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _current_version():
+        from .models import USCity
+
+        stamp = USCity.objects.order_by().aggregate(count=Count("pk"), last=Max("pk"))
+        return stamp["count"], stamp["last"]
+
+    def _load(self):
+        from .models import USCity
+        from .serializers import USCitySerializer
+
+        cities = USCitySerializer(USCity.objects.all().order_by(), many=True).data
+        return self.index_class([dict(c) for c in cities])
+
+    def _fresh(self, index):
+        return index is not None and time.monotonic() - self._checked_at < settings.CITY_INDEX_CHECK_SECONDS
+
+    def get(self):
+        index = self._index
+        if self._fresh(index):
+            return index
+        with self._lock:
+            if not self._fresh(self._index):
+                version = self._current_version()
+                if self._index is None or version != self._version:
+                    self._index = self._load()
+                    self._version = version
+                self._checked_at = time.monotonic()
+            return self._index
+
+    async def aget(self):
+        index = self._index
+        if self._fresh(index):
+            return index
+        return await sync_to_async(self.get)()
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
+
+    def search(self, query):
+        return self.get().search(query)
+
+
+city_index = CityIndexHolder()
+city_locator = CityIndexHolder(CitySpatialIndex)
@@ -0,0 +1,56 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from locations.index import CityIndexHolder
+from locations.models import USCity
+from locations.serializers import USCitySerializer
+from ride_project.benchmarking import percentile
+
+
+class Command(BaseCommand):
+    help = "Compare city autocomplete latency: ORM istartswith query vs in-process prefix index"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queries", type=int, default=2000)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        names = list(USCity.objects.values_list("city", "state"))
+        if not names:
+            self.stderr.write(self.style.ERROR("No cities loaded; run `python manage.py load_us_cities` first"))
+            return
+
+        rng = random.Random(options["seed"])
+        queries = []
+        for _ in range(options["queries"]):
+            city, state = rng.choice(names)
+            prefix = city[: rng.randint(2, min(len(city), 6))]
+            queries.append(f"{prefix}, {state}" if rng.random() < 0.1 else prefix)
+
+        def orm(query):
+            city_part, _, state_part = query.partition(",")
+            qs = USCity.objects.filter(city__istartswith=city_part.strip())
+            if state_part.strip():
+                qs = qs.filter(state__istartswith=state_part.strip())
+            return USCitySerializer(qs.order_by("-population", "city", "state")[:10], many=True).data
+
+        holder = CityIndexHolder()
+        started = time.perf_counter()
+        holder.get()
+        build_ms = (time.perf_counter() - started) * 1000
+
+        self.stdout.write(f"{len(names)} cities, {len(queries)} queries, index built in {build_ms:.1f} ms")
+        for label, fn in (("orm", orm), ("index", holder.search)):
+            timings = []
+            for query in queries:
+                started = time.perf_counter()
+                fn(query)
+                timings.append((time.perf_counter() - started) * 1_000_000)
+            timings.sort()
+            self.stdout.write(
+                f"{label:>6}: mean={statistics.mean(timings):8.1f}us "
+                f"p50={percentile(timings, 0.50):8.1f}us p95={percentile(timings, 0.95):8.1f}us"
+            )
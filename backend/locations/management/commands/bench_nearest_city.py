@@ -0,0 +1,62 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from locations.index import CityIndexHolder, CitySpatialIndex
+from locations.models import USCity
+from ride_project.benchmarking import percentile
+from rides.utils import haversine_miles
+
+
+class Command(BaseCommand):
+    help = "Compare nearest-city lookups: full table scan vs in-process spatial index"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queries", type=int, default=2000)
+        parser.add_argument("--k", type=int, default=5)
+        parser.add_argument("--radius", type=float, default=50)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        if not USCity.objects.exists():
+            self.stderr.write(self.style.ERROR("No cities loaded; run `python manage.py load_us_cities` first"))
+            return
+
+        rng = random.Random(options["seed"])
+        # Points scattered over the continental US
+        points = [(rng.uniform(25, 49), rng.uniform(-124, -67)) for _ in range(options["queries"])]
+        k, radius = options["k"], options["radius"]
+
+        def scan_nearest(lat, lng):
+            rows = USCity.objects.values_list("id", "latitude", "longitude")
+            return sorted((haversine_miles(lat, lng, la, ln), pk) for pk, la, ln in rows)[:k]
+
+        def scan_within(lat, lng):
+            rows = USCity.objects.values_list("id", "latitude", "longitude")
+            return sorted(d for d in ((haversine_miles(lat, lng, la, ln), pk) for pk, la, ln in rows) if d[0] <= radius)
+
+        holder = CityIndexHolder(CitySpatialIndex)
+        started = time.perf_counter()
+        index = holder.get()
+        build_ms = (time.perf_counter() - started) * 1000
+
+        self.stdout.write(f"{len(index)} cities, {len(points)} queries, index built in {build_ms:.1f} ms")
+        cases = (
+            (f"scan k={k}", scan_nearest),
+            (f"index k={k}", lambda lat, lng: index.nearest(lat, lng, k)),
+            (f"scan r={radius:g}", scan_within),
+            (f"index r={radius:g}", lambda lat, lng: index.within(lat, lng, radius)),
+        )
+        for label, fn in cases:
+            timings = []
+            for lat, lng in points:
+                started = time.perf_counter()
+                fn(lat, lng)
+                timings.append((time.perf_counter() - started) * 1_000_000)
+            timings.sort()
+            self.stdout.write(
+                f"{label:>12}: mean={statistics.mean(timings):8.1f}us "
+                f"p50={percentile(timings, 0.50):8.1f}us p95={percentile(timings, 0.95):8.1f}us"
+            )
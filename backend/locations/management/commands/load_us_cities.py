@@ -1,6 +1,7 @@
 import json
 import os
 from django.core.management.base import BaseCommand
+from locations.index import city_index, city_locator
 from locations.models import USCity
 
 
@@ -32,4 +33,6 @@ class Command(BaseCommand):
 
         USCity.objects.all().delete()
         USCity.objects.bulk_create(objs, batch_size=1000)
+        city_index.invalidate()
+        city_locator.invalidate()
         self.stdout.write(self.style.SUCCESS(f"Loaded {len(objs)} cities"))
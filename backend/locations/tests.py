@@ -1,3 +1,190 @@
+import time
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from .index import CityPrefixIndex, CitySpatialIndex, city_index, city_locator
+from .models import USCity
+from rides.utils import haversine_miles
+
+
+def city(name, state, population, latitude="0.000000", longitude="0.000000"):
+    return {"id": None, "city": name, "state": state, "state_name": "", "latitude": latitude,
+            "longitude": longitude, "population": population}
+
+
+class CityPrefixIndexTests(TestCase):
+    def setUp(self):
+        self.index = CityPrefixIndex([
+            city("Springfield", "IL", 114000),
+            city("Springfield", "MO", 169000),
+            city("Spokane", "WA", 228000),
+            city("Sparks", "NV", 108000),
+            city("Salem", "OR", 175000),
+        ], limit=3)
+
+    def names(self, results):
+        return [f"{c['city']}, {c['state']}" for c in results]
+
+    def test_prefix_matches_are_ranked_by_population(self):
+        self.assertEqual(
+            self.names(self.index.search("sp")),
+            ["Spokane, WA", "Springfield, MO", "Springfield, IL"],
+        )
+        self.assertEqual(self.names(self.index.search("SPRINGF")), ["Springfield, MO", "Springfield, IL"])
+
+    def test_city_state_queries(self):
+        self.assertEqual(self.names(self.index.search("Springfield, il")), ["Springfield, IL"])
+        self.assertEqual(self.names(self.index.search("spr, M")), ["Springfield, MO"])
+        self.assertEqual(self.index.search("Salem, WA"), [])
+
+    def test_no_match(self):
+        self.assertEqual(self.index.search("zz"), [])
+
+
+class CitySpatialIndexTests(TestCase):
+    def setUp(self):
+        self.index = CitySpatialIndex([
+            city("San Francisco", "CA", 808000, "37.7562", "-122.4430"),
+            city("Oakland", "CA", 433000, "37.7904", "-122.2166"),
+            city("Sacramento", "CA", 525000, "38.5667", "-121.4683"),
+            city("Honolulu", "HI", 350000, "21.3294", "-157.8460"),
+            city("Suva", "FJ", 93000, "-18.1416", "178.4419"),
+            city("Apia", "WS", 37000, "-13.8333", "-171.7667"),
+        ])
+
+    def names(self, results):
+        return [c["city"] for c in results]
+
+    def test_nearest_cities_in_order(self):
+        results = self.index.nearest(37.7749, -122.4194, k=3)
+        self.assertEqual(self.names(results), ["San Francisco", "Oakland", "Sacramento"])
+        self.assertEqual(results[0]["distance_miles"], haversine_miles(37.7749, -122.4194, 37.7562, -122.4430))
+
+    def test_nearest_searches_past_empty_cells(self):
+        self.assertEqual(self.names(self.index.nearest(30, -150)), ["Honolulu"])
+        self.assertEqual(len(self.index.nearest(0, 0, k=10)), 6)
+
+    def test_within_radius(self):
+        self.assertEqual(self.names(self.index.within(37.7749, -122.4194, 25)), ["San Francisco", "Oakland"])
+        self.assertEqual(self.index.within(0, 0, 100), [])
+
+    def test_within_crosses_the_antimeridian(self):
+        self.assertEqual(self.names(self.index.within(-16, 179.9, 700)), ["Suva", "Apia"])
+
+    def test_lookup_ignores_case(self):
+        self.assertEqual(self.index.lookup("san francisco ", "ca")["city"], "San Francisco")
+        self.assertIsNone(self.index.lookup("San Francisco", "NV"))
+
+
+class CityAutocompleteViewTests(TestCase):
+    def setUp(self):
+        city_index.invalidate()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("a@example.com", "A", "1", "rider"))
+
+    def tearDown(self):
+        city_index.invalidate()
+
+    def test_autocomplete_is_served_without_queries(self):
+        call_command("load_us_cities", stdout=StringIO())
+        city_index.get()
+
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/locations/autocomplete/", {"q": "san"})
+
+        self.assertEqual(response.status_code, 200)
+        populations = [c["population"] for c in response.data]
+        self.assertEqual(populations, sorted(populations, reverse=True))
+        self.assertTrue(all(c["city"].lower().startswith("san") for c in response.data))
+        self.assertLessEqual(len(response.data), 10)
+
+    def test_reload_refreshes_the_index(self):
+        USCity.objects.create(city="Testville", state="ZZ", state_name="Test", latitude=1, longitude=1)
+        self.assertEqual(len(self.client.get("/api/locations/autocomplete/", {"q": "testv"}).data), 1)
+
+        call_command("load_us_cities", stdout=StringIO())
+
+        self.assertEqual(self.client.get("/api/locations/autocomplete/", {"q": "testv"}).data, [])
+
+    def test_reload_in_another_process_refreshes_the_index(self):
+        city_index.get()
+        # As load_us_cities run elsewhere: this process's index is not invalidated
+        USCity.objects.create(city="Testville", state="ZZ", state_name="Test", latitude=1, longitude=1)
+        self.assertEqual(self.client.get("/api/locations/autocomplete/", {"q": "testv"}).data, [])
+
+        with mock.patch("locations.index.time.monotonic", return_value=time.monotonic() + 3600):
+            self.assertEqual(len(self.client.get("/api/locations/autocomplete/", {"q": "testv"}).data), 1)
+
+
+class NearestCityViewTests(TestCase):
+    def setUp(self):
+        call_command("load_us_cities", stdout=StringIO())
+        city_locator.invalidate()
+        self.addCleanup(city_locator.invalidate)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("a@example.com", "A", "1", "rider"))
+
+    def test_nearest_is_served_from_the_index(self):
+        city_locator.get()
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/locations/nearest/", {"lat": 37.78, "lng": -122.41, "k": 3})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual(response.data[0]["city"], "San Francisco")
+        distances = [c["distance_miles"] for c in response.data]
+        self.assertEqual(distances, sorted(distances))
+
+    def test_radius(self):
+        response = self.client.get("/api/locations/nearest/", {"lat": 37.78, "lng": -122.41, "radius": 10})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data)
+        self.assertTrue(all(c["distance_miles"] <= 10 for c in response.data))
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get("/api/locations/nearest/", {"lat": 37.78}).status_code, 400)
+        self.assertEqual(self.client.get("/api/locations/nearest/", {"lat": 97, "lng": 0}).status_code, 400)
+        self.assertEqual(self.client.get("/api/locations/nearest/", {"lat": 0, "lng": 0, "radius": 5000}).status_code, 400)
+
+
+class BatchDistanceViewTests(TestCase):
+    SF, OAKLAND, SACRAMENTO = [37.7749, -122.4194], [37.8044, -122.2711], [38.5816, -121.4944]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("a@example.com", "A", "1", "rider"))
+
+    def post(self, data):
+        return self.client.post("/api/locations/distance/batch/", data, format="json")
+
+    def test_pairs(self):
+        response = self.post({"pairs": [self.SF + self.OAKLAND, self.SF + self.SACRAMENTO]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data["distance_miles"],
+            [haversine_miles(*self.SF, *self.OAKLAND), haversine_miles(*self.SF, *self.SACRAMENTO)],
+        )
+        self.assertEqual(response.data["suggested_price"][0], "4.18")
+
+    def test_matrix_is_indexed_origin_then_destination(self):
+        response = self.post({"origins": [self.SF, self.OAKLAND], "destinations": [self.OAKLAND, self.SACRAMENTO, self.SF]})
+
+        self.assertEqual(response.status_code, 200)
+        matrix = response.data["distance_miles"]
+        self.assertEqual((len(matrix), len(matrix[0])), (2, 3))
+        self.assertEqual(matrix[1][1], haversine_miles(*self.OAKLAND, *self.SACRAMENTO))
+        self.assertEqual(response.data["suggested_price"][1][0], "3.00")
 
-# Create your tests here.
+    def test_rejects_malformed_and_oversized_batches(self):
+        self.assertEqual(self.post({"pairs": [[1, 2, 3]]}).status_code, 400)
+        self.assertEqual(self.post({"pairs": [[91, 0, 0, 0]]}).status_code, 400)
+        self.assertEqual(self.post({"origins": [self.SF]}).status_code, 400)
+        with self.settings(DISTANCE_BATCH_MAX_PAIRS=3):
+            self.assertEqual(self.post({"origins": [self.SF] * 2, "destinations": [self.SF] * 2}).status_code, 400)
@@ -3,5 +3,7 @@ from . import views
 
 urlpatterns = [
     path("autocomplete/", views.CityAutocompleteView.as_view(), name="city_autocomplete"),
+    path("nearest/", views.NearestCityView.as_view(), name="nearest_city"),
     path("distance/", views.DistanceView.as_view(), name="distance"),
+    path("distance/batch/", views.BatchDistanceView.as_view(), name="distance_batch"),
 ]
@@ -1,10 +1,11 @@
+import numpy as np
+from django.conf import settings
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import USCity
-from .serializers import USCitySerializer
-from rides.utils import haversine_miles
+from .index import city_index, city_locator
+from rides.utils import haversine_miles, haversine_miles_batch, calculate_suggested_price_batch
 
 
 class CityAutocompleteView(APIView):
@@ -13,8 +14,30 @@ class CityAutocompleteView(APIView):
         if len(query) < 2:
             return Response([])
 
-        cities = USCity.objects.filter(city__istartswith=query).order_by("city", "state")[:10]
-        return Response(USCitySerializer(cities, many=True).data)
+        return Response(city_index.search(query))
+
+
+class NearestCityView(APIView):
+    """Cities nearest to a point: the closest `k` (default 1), or all within `radius` miles."""
+
+    MAX_RESULTS = 50
+
+    def get(self, request):
+        try:
+            lat = float(request.query_params["lat"])
+            lng = float(request.query_params["lng"])
+            k = int(request.query_params.get("k", 1))
+            radius = float(request.query_params["radius"]) if "radius" in request.query_params else None
+        except (KeyError, ValueError):
+            return Response({"error": "Missing or invalid coordinates"}, status=400)
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180) or not 1 <= k <= self.MAX_RESULTS:
+            return Response({"error": f"Coordinates out of range, or k not between 1 and {self.MAX_RESULTS}"}, status=400)
+
+        if radius is not None:
+            if not 0 <= radius <= settings.NEAREST_CITY_MAX_RADIUS_MILES:
+                return Response({"error": f"radius must be at most {settings.NEAREST_CITY_MAX_RADIUS_MILES} miles"}, status=400)
+            return Response(city_locator.get().within(lat, lng, radius, limit=self.MAX_RESULTS))
+        return Response(city_locator.get().nearest(lat, lng, k))
 
 
 class DistanceView(APIView):
@@ -29,3 +52,49 @@ class DistanceView(APIView):
 
         distance = haversine_miles(from_lat, from_lng, to_lat, to_lng)
         return Response({"distance_miles": distance})
+
+
+def _coordinates(value, columns):
+    """Parse a list of [lat, lng, ...] rows into a float array, or None if malformed."""
+    try:
+        array = np.asarray(value, dtype=np.float64)
+    except (TypeError, ValueError):
+        return None
+    if array.ndim != 2 or array.shape[1] != columns or not np.isfinite(array).all():
+        return None
+    if (np.abs(array[:, 0::2]) > 90).any() or (np.abs(array[:, 1::2]) > 180).any():
+        return None
+    return array
+
+
+class BatchDistanceView(APIView):
+    """Distances and suggested prices for many trips in one request.
+
+    Either `pairs`, a list of [from_lat, from_lng, to_lat, to_lng], answered
+    element-wise, or `origins` and `destinations`, lists of [lat, lng], answered
+    as a matrix indexed [origin][destination].
+    """
+
+    def post(self, request):
+        if "pairs" in request.data:
+            pairs = _coordinates(request.data["pairs"], 4)
+            if pairs is None:
+                return Response({"error": "pairs must be a list of [from_lat, from_lng, to_lat, to_lng]"}, status=400)
+            count = len(pairs)
+            from_lat, from_lng, to_lat, to_lng = pairs.T
+        else:
+            origins = _coordinates(request.data.get("origins"), 2)
+            destinations = _coordinates(request.data.get("destinations"), 2)
+            if origins is None or destinations is None:
+                return Response({"error": "Send pairs, or origins and destinations as lists of [lat, lng]"}, status=400)
+            count = len(origins) * len(destinations)
+            from_lat, from_lng = origins[:, :1], origins[:, 1:]
+            to_lat, to_lng = destinations[:, 0], destinations[:, 1]
+
+        if count > settings.DISTANCE_BATCH_MAX_PAIRS:
+            return Response({"error": f"At most {settings.DISTANCE_BATCH_MAX_PAIRS} pairs per request"}, status=400)
+
+        distances = haversine_miles_batch(from_lat, from_lng, to_lat, to_lng)
+        cents = calculate_suggested_price_batch(distances)
+        prices = np.vectorize(lambda c: f"{c // 100}.{c % 100:02d}", otypes=[object])(cents)
+        return Response({"distance_miles": distances.tolist(), "suggested_price": prices.tolist()})
@@ -1,3 +1,8 @@
 from django.contrib import admin
+from .models import OutboxEvent
 
-# Register your models here.
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ("id", "group", "created_at", "dispatched_at")
+    list_filter = ("group",)
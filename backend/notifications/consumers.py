@@ -1,7 +1,125 @@
+from urllib.parse import parse_qs
+
+from channels.consumer import get_handler_name
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 
+from accounts.presence import presence
+from ride_project.metrics import ws_connects, ws_disconnects, ws_messages_sent, ws_open
+from ride_project.replay import REPLAY_KEY
+
+
+class OutboxBatchMixin:
+    """Handles the per-group envelopes the outbox dispatcher sends (notifications.outbox)."""
+
+    async def outbox_batch(self, event):
+        # dispatch() already closed stale DB connections for the envelope
+        for message in event["messages"]:
+            handler = getattr(self, get_handler_name(message), None)
+            if handler is None:
+                raise ValueError("No handler for message type %s" % message["type"])
+            await handler(message)
+
+
+class MetricsMixin:
+    """Counts accepted sockets, closes and messages sent per consumer class (ride_project.metrics)."""
+
+    metrics_accepted = False
+
+    async def accept(self, subprotocol=None, headers=None):
+        await super().accept(subprotocol, headers)
+        self.metrics_accepted = True
+        ws_connects.inc(type(self).__name__)
+        ws_open.inc(type(self).__name__)
+
+    async def send_json(self, content, close=False):
+        await super().send_json(content, close)
+        ws_messages_sent.inc(type(self).__name__)
+
+    async def websocket_disconnect(self, message):
+        if self.metrics_accepted:
+            self.metrics_accepted = False
+            ws_disconnects.inc(type(self).__name__)
+            ws_open.dec(type(self).__name__)
+        await super().websocket_disconnect(message)
+
+
+class PresenceMixin:
+    """Keeps the socket's user in the presence registry (accounts.presence).
+
+    The consumer calls presence.connect() once it accepts. Any message from the
+    client counts as a heartbeat, and {"type": "ping"} is answered with a pong.
+    """
+
+    presence_kind = "user"
+
+    async def receive_json(self, content, **kwargs):
+        presence.heartbeat(self.user.id, self.channel_name, self.presence_kind)
+        if content.get("type") == "ping":
+            await self.send_json({"type": "pong"})
+
+    async def disconnect(self, close_code):
+        user = getattr(self, "user", None)
+        if user is not None and not user.is_anonymous:
+            presence.disconnect(user.id, self.channel_name)
+
+
+class ReplayMixin:
+    """Sequence numbers and replay for group broadcasts (ride_project.replay).
+
+    Every message that arrives through a group is sent to the client with that
+    group's "group" and "seq". A client reconnecting with
+    `?since=<group>:<seq>,...` gets what it missed on each group the consumer
+    passes to replay_group() after accepting. If that is no longer available, it
+    gets {"type": "resync_required", "group": ...} instead. Messages that arrive
+    live after being replayed are dropped.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replay_since = None  # group -> seq from the query string
+        self.replay_seen = {}  # group -> last seq sent to the client
+        self.replay_stamp = None
+
+    async def dispatch(self, message):
+        stamp = message.get(REPLAY_KEY)
+        if stamp is None:
+            return await super().dispatch(message)
+        if stamp["seq"] <= self.replay_seen.get(stamp["group"], 0):
+            return
+        self.replay_seen[stamp["group"]] = stamp["seq"]
+        self.replay_stamp = stamp
+        try:
+            await super().dispatch(message)
+        finally:
+            self.replay_stamp = None
+
+    async def send_json(self, content, close=False):
+        if self.replay_stamp is not None:
+            content = {**content, **self.replay_stamp}
+        await super().send_json(content, close)
+
+    async def replay_group(self, group):
+        if self.replay_since is None:
+            query = parse_qs(self.scope.get("query_string", b"").decode())
+            self.replay_since = {}
+            for cursor in ",".join(query.get("since", [])).split(","):
+                name, _, seq = cursor.rpartition(":")
+                if name and seq.isdigit():
+                    self.replay_since[name] = int(seq)
+
+        seq = self.replay_since.pop(group, None)
+        if seq is None:
+            return
+        group_replay = getattr(self.channel_layer, "group_replay", None)
+        messages = await group_replay(group, seq) if group_replay else None
+        if messages is None:
+            await self.send_json({"type": "resync_required", "group": group})
+            return
+        for message in messages:
+            await self.dispatch(message)
+
 
-class NotificationConsumer(AsyncJsonWebsocketConsumer):
+class NotificationConsumer(MetricsMixin, ReplayMixin, PresenceMixin, OutboxBatchMixin, AsyncJsonWebsocketConsumer):
     async def connect(self):
         self.user = self.scope["user"]
         if self.user.is_anonymous:
@@ -11,10 +129,13 @@ class NotificationConsumer(AsyncJsonWebsocketConsumer):
         self.group_name = f"notifications_{self.user.id}"
         await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.accept()
+        presence.connect(self.user.id, self.channel_name, self.presence_kind)
+        await self.replay_group(self.group_name)
 
     async def disconnect(self, close_code):
         if hasattr(self, "group_name"):
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        await super().disconnect(close_code)
 
     async def notification(self, event):
         await self.send_json({"type": "notification", "data": event["data"]})
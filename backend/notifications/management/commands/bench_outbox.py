@@ -0,0 +1,114 @@
+import asyncio
+import contextlib
+import statistics
+import threading
+import time
+import uuid
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from accounts.models import User, RiderProfile
+from notifications.models import OutboxEvent
+from notifications.outbox import dispatcher
+from ride_project.benchmarking import percentile
+from rides.testing import RIDE_PAYLOAD
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare ride request creation latency with channel-layer fan-out inline in the request "
+        "(OUTBOX_ENABLED=False) and through the outbox dispatcher. Runs against the configured database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument(
+            "--send-delay-ms",
+            type=float,
+            default=1.0,
+            help="Simulated channel-layer round trip per group_send (the in-memory layer has none)",
+        )
+        parser.add_argument("--keep", action="store_true", help="Keep the generated rider, rides and events")
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        rider = User.objects.create_user(f"rider@bench-{tag}.invalid", "Bench Rider", "555-0100", "rider")
+        RiderProfile.objects.create(user=rider)
+        first_event_id = OutboxEvent.objects.order_by("-id").values_list("id", flat=True).first() or 0
+
+        host = next((h for h in settings.ALLOWED_HOSTS if h != "*" and not h.startswith(".")), "localhost")
+        client = APIClient(SERVER_NAME=host)
+        client.force_authenticate(rider)
+
+        layer = get_channel_layer()
+        original_group_send = layer.group_send
+
+        async def group_send(group, message):
+            await asyncio.sleep(options["send_delay_ms"] / 1000)
+            await original_group_send(group, message)
+
+        layer.group_send = group_send
+        try:
+            with override_settings(OUTBOX_ENABLED=False):
+                inline = self.measure(client, options["requests"])
+            with self.running_dispatcher(), override_settings(OUTBOX_ENABLED=True):
+                outbox = self.measure(client, options["requests"])
+                self.wait_for_dispatch()
+                lag = dispatcher.stats()
+        finally:
+            layer.group_send = original_group_send
+            if not options["keep"]:
+                OutboxEvent.objects.filter(pk__gt=first_event_id, payload__data__rider__id=str(rider.pk)).delete()
+                User.objects.filter(email__endswith=f"@bench-{tag}.invalid").delete()
+
+        self.stdout.write(
+            f"POST /api/rides/request/ x{options['requests']}, {options['send_delay_ms']}ms per group_send"
+        )
+        self.report("inline group_send", inline)
+        self.report("outbox", outbox)
+        self.stdout.write(
+            f"{'outbox dispatch lag':>19}: p50={lag['lag_p50_ms']}ms p95={lag['lag_p95_ms']}ms "
+            f"max={lag['lag_max_ms']}ms over {lag['dispatched']} events"
+        )
+
+    def measure(self, client, count):
+        latencies = []
+        for _ in range(count):
+            started = time.perf_counter()
+            response = client.post("/api/rides/request/", RIDE_PAYLOAD)
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 201, response.content
+        return sorted(latencies)
+
+    def report(self, label, latencies):
+        self.stdout.write(
+            f"{label:>19}: p50={statistics.median(latencies) * 1000:.1f}ms "
+            f"p95={percentile(latencies, 0.95) * 1000:.1f}ms "
+            f"max={latencies[-1] * 1000:.1f}ms"
+        )
+
+    def wait_for_dispatch(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        while OutboxEvent.objects.pending().exists() and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    @contextlib.contextmanager
+    def running_dispatcher(self):
+        """Run the dispatcher on its own event loop thread, as it would run on the ASGI server's loop."""
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        asyncio.run_coroutine_threadsafe(self.start_dispatcher(), loop).result()
+        try:
+            yield
+        finally:
+            dispatcher.stop()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+
+    async def start_dispatcher(self):
+        dispatcher.start()
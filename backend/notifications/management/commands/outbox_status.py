@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from notifications.models import OutboxEvent
+from notifications.outbox import dispatcher
+from ride_project.benchmarking import percentile
+
+
+class Command(BaseCommand):
+    help = "Report the WebSocket outbox backlog and dispatch lag of recently sent events."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recent", type=int, default=1000, help="Dispatched events to compute lag over")
+        parser.add_argument(
+            "--dispatch", action="store_true", help="Send pending events first (e.g. while no ASGI worker is up)"
+        )
+
+    def handle(self, *args, **options):
+        if options["dispatch"]:
+            sent = dispatcher.dispatch_now()
+            self.stdout.write(f"dispatched {sent} pending events")
+
+        backlog = OutboxEvent.objects.pending().aggregate(count=Count("id"), oldest=Min("created_at"))
+        oldest_age = "-"
+        if backlog["oldest"]:
+            oldest_age = f"{(timezone.now() - backlog['oldest']).total_seconds():.1f}s"
+        self.stdout.write(f"pending: {backlog['count']} (oldest {oldest_age})")
+
+        recent = (
+            OutboxEvent.objects.filter(dispatched_at__isnull=False)
+            .order_by("-dispatched_at")
+            .values_list("created_at", "dispatched_at")[: options["recent"]]
+        )
+        lags = sorted((dispatched - created).total_seconds() * 1000 for created, dispatched in recent)
+        if not lags:
+            self.stdout.write("no dispatched events")
+            return
+        self.stdout.write(
+            f"dispatch lag over the last {len(lags)} events: p50={percentile(lags, 0.50):.1f}ms "
+            f"p95={percentile(lags, 0.95):.1f}ms max={lags[-1]:.1f}ms"
+        )
@@ -0,0 +1,26 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ride_project.channel_broker import ChannelBroker
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the channel broker that lets several ASGI workers on this host share groups and channels. "
+        "Start the workers with CHANNEL_BROKER_SOCKET pointing at the same path."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default=settings.CHANNEL_BROKER_SOCKET)
+
+    def handle(self, *args, **options):
+        if not options["path"]:
+            raise CommandError("Pass --path or set CHANNEL_BROKER_SOCKET")
+        self.stdout.write(f"channel broker listening on {options['path']}")
+        self.stdout.flush()
+        try:
+            asyncio.run(ChannelBroker().serve(options["path"]))
+        except KeyboardInterrupt:
+            pass
@@ -1,3 +1,45 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
-# Create your models here.
+
+class OutboxEventQuerySet(models.QuerySet):
+    def pending(self):
+        return self.filter(dispatched_at__isnull=True)
+
+    def claimable(self, now):
+        """Pending events not claimed by a dispatcher, or whose claim has run out."""
+        lease_start = now - timedelta(seconds=settings.OUTBOX_CLAIM_TIMEOUT_SECONDS)
+        return self.pending().filter(models.Q(claimed_at__isnull=True) | models.Q(claimed_at__lt=lease_start))
+
+
+class OutboxEvent(models.Model):
+    """A channel-layer message recorded in the same transaction as the write it describes."""
+
+    group = models.CharField(max_length=100)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set by a dispatcher while it sends the event (notifications.outbox); dispatched_at once sent
+    claim_token = models.UUIDField(null=True, blank=True, db_index=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+
+    objects = OutboxEventQuerySet.as_manager()
+
+    class Meta:
+        db_table = "outbox_events"
+        ordering = ["id"]
+        indexes = [
+            models.Index(
+                fields=["id"],
+                name="outbox_pending_idx",
+                condition=models.Q(dispatched_at__isnull=True),
+            ),
+            models.Index(fields=["dispatched_at"], name="outbox_dispatched_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.payload.get('type')} -> {self.group}"
@@ -0,0 +1,219 @@
+"""
+Transactional outbox for channel-layer messages.
+
+Views call `publish()` inside the transaction that makes the change, so an event
+exists only if the write committed. After commit the dispatcher is woken; it runs
+as a task on the ASGI server's event loop, claims pending events in id order and
+sends one message per group, so the request thread never waits on the channel
+layer. Processes without a running dispatcher (tests, WSGI, management commands)
+dispatch inline after commit.
+
+A claim is a lease: the batch gets a claim token and claimed_at, and
+dispatched_at is only set once the messages went out. A batch whose dispatcher
+died before that is claimed again after OUTBOX_CLAIM_TIMEOUT_SECONDS, so an
+event is sent at least once.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ride_project.benchmarking import percentile
+from ride_project.metrics import timed_group_send
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+# Several events for the same group in one claim go out as a single envelope;
+# consumers unpack it with OutboxBatchMixin.
+BATCH_MESSAGE_TYPE = "outbox.batch"
+
+PRUNE_INTERVAL_SECONDS = 60
+
+
+def publish(groups, message):
+    """Record `message` for each group in the current transaction and dispatch it after commit."""
+    if isinstance(groups, str):
+        groups = [groups]
+    if not groups:
+        return
+
+    if not settings.OUTBOX_ENABLED:
+        channel_layer = get_channel_layer()
+        transaction.on_commit(lambda: async_to_sync(_group_send_many)(channel_layer, groups, message))
+        return
+
+    OutboxEvent.objects.bulk_create([OutboxEvent(group=group, payload=message) for group in groups])
+    transaction.on_commit(dispatcher.wake)
+
+
+async def _group_send_many(channel_layer, groups, message):
+    for group in groups:
+        await timed_group_send(channel_layer, group, message)
+
+
+class OutboxDispatcher:
+    def __init__(self):
+        self.loop = None
+        self._task = None
+        self._wakeup = None
+        self._last_prune = 0.0
+        self._lags = deque(maxlen=1000)
+        self.dispatched_total = 0
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Run the dispatcher as a task on the current event loop."""
+        if self.running:
+            return
+        self.loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = self.loop.create_task(self.run())
+
+    def stop(self):
+        if self.running:
+            self.loop.call_soon_threadsafe(self._task.cancel)
+        self._task = None
+        self.loop = None
+
+    def wake(self):
+        if self.running:
+            self.loop.call_soon_threadsafe(self._wakeup.set)
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No dispatcher in this process (tests, WSGI, management commands)
+            try:
+                self.dispatch_now()
+                self.prune()
+            except Exception:
+                logger.exception("Outbox dispatch failed; events stay pending")
+        else:
+            loop.create_task(self.drain())
+
+    async def run(self):
+        while True:
+            await self.drain()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), settings.OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                # Also picks up events left by a worker that died between commit and dispatch,
+                # and batches whose claim ran out (OUTBOX_CLAIM_TIMEOUT_SECONDS)
+                pass
+            self._wakeup.clear()
+
+    async def drain(self):
+        try:
+            await self.dispatch_pending()
+            await database_sync_to_async(self.prune)()
+        except Exception:
+            logger.exception("Outbox dispatch failed; retrying on the next poll")
+
+    async def dispatch_pending(self):
+        sent = 0
+        while True:
+            events = await database_sync_to_async(self.claim)()
+            if not events:
+                return sent
+            try:
+                await self.send(events)
+            except Exception:
+                await database_sync_to_async(self.release)(events)
+                raise
+            await database_sync_to_async(self.complete)(events)
+            sent += len(events)
+            if len(events) < settings.OUTBOX_BATCH_SIZE:
+                return sent
+
+    def dispatch_now(self):
+        """Synchronous counterpart of dispatch_pending() for callers outside an event loop."""
+        sent = 0
+        while True:
+            events = self.claim()
+            if not events:
+                return sent
+            try:
+                async_to_sync(self.send)(events)
+            except Exception:
+                self.release(events)
+                raise
+            self.complete(events)
+            sent += len(events)
+            if len(events) < settings.OUTBOX_BATCH_SIZE:
+                return sent
+
+    def claim(self):
+        # One UPDATE claims the batch, so concurrent dispatchers never take the same rows
+        # and SQLite takes its write lock up front instead of upgrading a read.
+        now = timezone.now()
+        claimable = OutboxEvent.objects.claimable(now)
+        batch = claimable.order_by("id").values("id")[: settings.OUTBOX_BATCH_SIZE]
+        if connection.features.has_select_for_update_skip_locked:
+            batch = batch.select_for_update(skip_locked=True)
+        token = uuid.uuid4()
+        with transaction.atomic():
+            claimed = claimable.filter(pk__in=batch).update(claim_token=token, claimed_at=now)
+            if not claimed:
+                return []
+            return list(OutboxEvent.objects.filter(claim_token=token).order_by("id"))
+
+    def complete(self, events):
+        OutboxEvent.objects.filter(claim_token=events[0].claim_token).update(dispatched_at=timezone.now())
+
+    def release(self, events):
+        OutboxEvent.objects.filter(claim_token=events[0].claim_token).update(claim_token=None, claimed_at=None)
+
+    def prune(self):
+        if time.monotonic() - self._last_prune < PRUNE_INTERVAL_SECONDS:
+            return
+        self._last_prune = time.monotonic()
+        cutoff = timezone.now() - timedelta(seconds=settings.OUTBOX_RETENTION_SECONDS)
+        OutboxEvent.objects.filter(dispatched_at__lt=cutoff).delete()
+
+    async def send(self, events):
+        channel_layer = get_channel_layer()
+        by_group = {}
+        for event in events:
+            by_group.setdefault(event.group, []).append(event.payload)
+
+        # One message per group keeps each group's events in order, so groups can go out concurrently
+        await asyncio.gather(
+            *(
+                timed_group_send(
+                    channel_layer,
+                    group,
+                    messages[0] if len(messages) == 1 else {"type": BATCH_MESSAGE_TYPE, "messages": messages},
+                )
+                for group, messages in by_group.items()
+            )
+        )
+
+        now = timezone.now()
+        self._lags.extend((now - event.created_at).total_seconds() for event in events)
+        self.dispatched_total += len(events)
+
+    def stats(self):
+        """Dispatch lag (event recorded to group_send) over the last 1000 events sent by this process."""
+        lags = sorted(self._lags)
+        return {
+            "dispatched": self.dispatched_total,
+            "lag_p50_ms": None if not lags else round(percentile(lags, 0.50) * 1000, 1),
+            "lag_p95_ms": None if not lags else round(percentile(lags, 0.95) * 1000, 1),
+            "lag_max_ms": None if not lags else round(lags[-1] * 1000, 1),
+        }
+
+
+dispatcher = OutboxDispatcher()
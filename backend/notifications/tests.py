@@ -1,3 +1,430 @@
-from django.test import TestCase
+import asyncio
+import gc
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.exceptions import ChannelFull
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management import call_command
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User, RiderProfile
+from accounts.presence import PresenceRegistry, presence
+from ride_project.channel_broker import BrokerChannelLayer
+from ride_project.metrics import metrics, ws_connects, ws_disconnects, ws_messages_sent, ws_open
+from ride_project.replay import REPLAY_KEY, GroupReplayBuffer
+from rides.testing import RIDE_PAYLOAD
+
+from .consumers import NotificationConsumer
+from .models import OutboxEvent
+from .outbox import BATCH_MESSAGE_TYPE, dispatcher, publish
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.layer = get_channel_layer()
+        self.channel = async_to_sync(self.layer.new_channel)()
+        async_to_sync(self.layer.group_add)("notifications_test", self.channel)
+
+    def receive(self):
+        message = async_to_sync(asyncio.wait_for)(self.layer.receive(self.channel), 1)
+        message.pop(REPLAY_KEY)  # stamped by the channel layer (ride_project.replay)
+        return message
+
+    def assertNothingReceived(self):
+        with self.assertRaises(asyncio.TimeoutError):
+            async_to_sync(asyncio.wait_for)(self.layer.receive(self.channel), 0.05)
+
+    def test_event_is_sent_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            publish("notifications_test", {"type": "notification", "data": {"n": 1}})
+            self.assertEqual(OutboxEvent.objects.pending().count(), 1)
+            self.assertNothingReceived()
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.receive(), {"type": "notification", "data": {"n": 1}})
+        self.assertFalse(OutboxEvent.objects.pending().exists())
+
+    def test_rolled_back_write_sends_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    publish("notifications_test", {"type": "notification", "data": {"n": 1}})
+                    raise ValueError
+            except ValueError:
+                pass
+
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.assertNothingReceived()
+
+    def test_events_for_one_group_are_batched_in_order(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                for n in range(3):
+                    publish("notifications_test", {"type": "notification", "data": {"n": n}})
+
+        message = self.receive()
+        self.assertEqual(message["type"], BATCH_MESSAGE_TYPE)
+        self.assertEqual([m["data"]["n"] for m in message["messages"]], [0, 1, 2])
+        self.assertNothingReceived()
+
+    def test_consumer_unpacks_batches(self):
+        consumer = NotificationConsumer()
+        sent = []
+
+        async def send_json(content):
+            sent.append(content)
+
+        consumer.send_json = send_json
+        async_to_sync(consumer.outbox_batch)(
+            {"type": BATCH_MESSAGE_TYPE, "messages": [{"type": "notification", "data": n} for n in range(2)]}
+        )
+        self.assertEqual(sent, [{"type": "notification", "data": 0}, {"type": "notification", "data": 1}])
+
+    def test_failed_send_leaves_events_pending(self):
+        with mock.patch.object(dispatcher, "send", side_effect=ConnectionError):
+            with self.assertLogs("notifications.outbox", "ERROR"):
+                with self.captureOnCommitCallbacks(execute=True):
+                    publish("notifications_test", {"type": "notification", "data": {}})
+
+        self.assertEqual(OutboxEvent.objects.pending().count(), 1)
+        out = StringIO()
+        call_command("outbox_status", dispatch=True, stdout=out)
+        self.assertIn("dispatched 1 pending events", out.getvalue())
+        self.assertIn("pending: 0", out.getvalue())
+        self.assertEqual(self.receive()["type"], "notification")
+
+    def test_claim_from_a_dead_dispatcher_runs_out(self):
+        with mock.patch.object(dispatcher, "wake"):
+            with self.captureOnCommitCallbacks(execute=True):
+                publish("notifications_test", {"type": "notification", "data": {}})
+        # Claimed by a dispatcher that dies before sending
+        claimed = dispatcher.claim()
+        self.assertEqual(len(claimed), 1)
+        self.assertIsNone(OutboxEvent.objects.get().dispatched_at)
+        self.assertEqual(dispatcher.claim(), [])
+
+        later = timezone.now() + timedelta(seconds=settings.OUTBOX_CLAIM_TIMEOUT_SECONDS + 1)
+        with mock.patch("notifications.outbox.timezone.now", return_value=later):
+            reclaimed = dispatcher.claim()
+        self.assertEqual([e.pk for e in reclaimed], [claimed[0].pk])
+        self.assertNotEqual(reclaimed[0].claim_token, claimed[0].claim_token)
+
+        # The dead dispatcher's token no longer marks the event sent
+        dispatcher.complete(claimed)
+        self.assertIsNone(OutboxEvent.objects.get().dispatched_at)
+        dispatcher.complete(reclaimed)
+        self.assertFalse(OutboxEvent.objects.pending().exists())
+
+    @override_settings(OUTBOX_ENABLED=False)
+    def test_disabled_outbox_sends_after_commit_without_recording(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            publish("notifications_test", {"type": "notification", "data": {}})
+
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.assertEqual(self.receive()["type"], "notification")
+
+
+class GroupReplayBufferTests(SimpleTestCase):
+    def fill(self, buffer, count, now=0):
+        return [buffer.stamp("g", {"type": "test.message", "n": n}, now)[REPLAY_KEY]["seq"] for n in range(count)]
+
+    def test_returns_only_missed_messages(self):
+        buffer = GroupReplayBuffer(size=10, ttl=60)
+        seqs = self.fill(buffer, 3)
+
+        self.assertEqual([m["n"] for m in buffer.since("g", seqs[0], now=1)], [1, 2])
+        self.assertEqual(buffer.since("g", seqs[-1], now=1), [])
+
+    def test_rolled_over_buffer_needs_a_resync(self):
+        buffer = GroupReplayBuffer(size=2, ttl=60)
+        seqs = self.fill(buffer, 4)
+
+        self.assertIsNone(buffer.since("g", seqs[0], now=1))
+        self.assertEqual([m["n"] for m in buffer.since("g", seqs[1], now=1)], [2, 3])
+
+    def test_expired_and_unknown_groups_need_a_resync(self):
+        buffer = GroupReplayBuffer(size=10, ttl=60)
+        seqs = self.fill(buffer, 2)
+
+        self.assertIsNone(buffer.since("g", seqs[0], now=61))
+        self.assertIsNone(buffer.since("other", seqs[0], now=1))
+        buffer.sweep(now=61)
+        self.assertEqual(buffer.stats(), {"groups": 0, "messages": 0})
+
+    def test_sequence_numbers_survive_a_restart(self):
+        seq = self.fill(GroupReplayBuffer(), 1)[0]
+        restarted = GroupReplayBuffer()
+        self.fill(restarted, 1)
+        self.assertIsNone(restarted.since("g", seq, now=1))
+
+
+class ReplayConsumerTests(SimpleTestCase):
+    # Consumers close the thread's database connection on every message, so these
+    # tests stay off the database: no TestCase transaction to lose.
+    def setUp(self):
+        self.user = SimpleNamespace(id=uuid.uuid4(), is_anonymous=False)
+        self.group = f"notifications_{self.user.id}"
+        # Keeps presence writes off the database threads
+        patcher = mock.patch.object(PresenceRegistry, "running", new_callable=mock.PropertyMock, return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(presence.clear)
+
+    async def connect(self, since=""):
+        communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), f"/ws/notifications/?since={since}")
+        communicator.scope["user"] = self.user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def notify(self, n):
+        await get_channel_layer().group_send(self.group, {"type": "notification", "data": {"n": n}})
+
+    def test_reconnect_replays_what_was_missed(self):
+        async def scenario():
+            first = await self.connect()
+            await self.notify(1)
+            seen = await first.receive_json_from()
+            await first.disconnect()
+            await self.notify(2)
+            await self.notify(3)
+
+            second = await self.connect(f"{self.group}:{seen['seq']}")
+            replayed = [await second.receive_json_from() for _ in range(2)]
+            await self.notify(4)
+            live = await second.receive_json_from()
+            await second.disconnect()
+            return seen, replayed, live
+
+        seen, replayed, live = async_to_sync(scenario)()
+        self.assertEqual(seen["group"], self.group)
+        self.assertEqual([m["data"]["n"] for m in replayed], [2, 3])
+        self.assertEqual(live["data"]["n"], 4)
+        self.assertLess(seen["seq"], replayed[0]["seq"])
+
+    def test_unknown_position_asks_for_a_resync(self):
+        async def scenario():
+            await self.notify(1)
+            communicator = await self.connect(f"{self.group}:1")
+            message = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return message
+
+        self.assertEqual(async_to_sync(scenario)(), {"type": "resync_required", "group": self.group})
+
+    def test_socket_metrics(self):
+        metrics.clear()
+        self.addCleanup(metrics.clear)
+
+        async def scenario():
+            communicator = await self.connect()
+            await self.notify(1)
+            await communicator.receive_json_from()
+            open_sockets = ws_open.values[("NotificationConsumer",)]
+            await communicator.disconnect()
+            return open_sockets
+
+        self.assertEqual(async_to_sync(scenario)(), 1)
+        self.assertEqual(ws_connects.values, {("NotificationConsumer",): 1})
+        self.assertEqual(ws_disconnects.values, {("NotificationConsumer",): 1})
+        self.assertEqual(ws_open.values, {("NotificationConsumer",): 0})
+        self.assertEqual(ws_messages_sent.values, {("NotificationConsumer",): 1})
+
+
+# Runs DriverConsumer in a second process ("worker B") sharing the broker
+DRIVER_WORKER = """
+import asyncio, json, os, django
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ride_project.settings")
+django.setup()
+from django.core.management import call_command
+call_command("migrate", verbosity=0)  # the presence flush writes to this worker's database
+from channels.testing import WebsocketCommunicator
+from accounts.models import User
+from rides.consumers import DriverConsumer
+
+async def main():
+    communicator = WebsocketCommunicator(DriverConsumer.as_asgi(), "/ws/rides/driver/")
+    communicator.scope["user"] = User(email="driver@example.com", role="driver")
+    await communicator.connect()
+    await communicator.send_json_to({"type": "update_location", "lat": 37.80, "lng": -122.40})
+    await communicator.receive_nothing(0.5)
+    print("ready", flush=True)
+    print(json.dumps(await communicator.receive_json_from(timeout=10)), flush=True)
+    await communicator.disconnect()
+
+asyncio.run(main())
+"""
+
+
+@skipUnless(hasattr(socket, "AF_UNIX"), "the channel broker listens on a Unix socket")
+class ChannelBrokerTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.socket_path = os.path.join(cls.tmpdir, "channels.sock")
+        cls.broker = subprocess.Popen(
+            [sys.executable, "manage.py", "run_channel_broker", "--path", cls.socket_path],
+            cwd=settings.BASE_DIR,
+            stdout=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 10
+        while not os.path.exists(cls.socket_path) and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.broker.terminate()
+        cls.broker.wait()
+        shutil.rmtree(cls.tmpdir)
+        super().tearDownClass()
+
+    def setUp(self):
+        async_to_sync(self.layer().flush)()
+
+    def layer(self, **config):
+        return BrokerChannelLayer(path=self.socket_path, **config)
+
+    def receive(self, layer, channel, timeout=1):
+        return async_to_sync(asyncio.wait_for)(layer.receive(channel), timeout)
+
+    def test_send_and_receive_across_layers(self):
+        sender, receiver = self.layer(), self.layer()
+        channel = async_to_sync(receiver.new_channel)()
+
+        async_to_sync(sender.send)(channel, {"type": "test.message", "text": "hi", "bytes": b"\x00\xff"})
+
+        self.assertEqual(self.receive(receiver, channel), {"type": "test.message", "text": "hi", "bytes": b"\x00\xff"})
+
+    def test_group_send_reaches_every_member(self):
+        first, second = self.layer(), self.layer()
+        a = async_to_sync(first.new_channel)()
+        b = async_to_sync(second.new_channel)()
+        async_to_sync(first.group_add)("drivers_cell_9q8y", a)
+        async_to_sync(second.group_add)("drivers_cell_9q8y", b)
+
+        async_to_sync(first.group_send)("drivers_cell_9q8y", {"type": "test.message", "n": 1})
+        async_to_sync(second.group_discard)("drivers_cell_9q8y", b)
+        async_to_sync(first.group_send)("drivers_cell_9q8y", {"type": "test.message", "n": 2})
+
+        self.assertEqual(self.receive(first, a)["n"], 1)
+        self.assertEqual(self.receive(first, a)["n"], 2)
+        self.assertEqual(self.receive(second, b)["n"], 1)
+        with self.assertRaises(asyncio.TimeoutError):
+            self.receive(second, b, timeout=0.1)
+
+    def test_capacity_and_expiry(self):
+        layer = self.layer(capacity=2, expiry=0.2)
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.send)(channel, {"type": "test.message", "n": 1})
+        async_to_sync(layer.send)(channel, {"type": "test.message", "n": 2})
+        with self.assertRaises(ChannelFull):
+            async_to_sync(layer.send)(channel, {"type": "test.message", "n": 3})
+
+        time.sleep(0.3)
+        async_to_sync(layer.send)(channel, {"type": "test.message", "n": 4})
+        self.assertEqual(self.receive(layer, channel)["n"], 4)
+
+    def test_group_replay_across_layers(self):
+        first, second = self.layer(), self.layer()
+        channel = async_to_sync(first.new_channel)()
+        async_to_sync(first.group_add)("driver_1", channel)
+        async_to_sync(first.group_send)("driver_1", {"type": "test.message", "n": 1})
+        seq = self.receive(first, channel)[REPLAY_KEY]["seq"]
+        async_to_sync(first.group_send)("driver_1", {"type": "test.message", "n": 2})
+
+        replayed = async_to_sync(second.group_replay)("driver_1", seq)
+        self.assertEqual([m["n"] for m in replayed], [2])
+        self.assertIsNone(async_to_sync(second.group_replay)("driver_1", seq - 1000))
+
+    def test_cancelled_receive_does_not_swallow_a_message(self):
+        layer = self.layer()
+        channel = async_to_sync(layer.new_channel)()
+        with self.assertRaises(asyncio.TimeoutError):
+            self.receive(layer, channel, timeout=0.05)
+
+        async_to_sync(layer.send)(channel, {"type": "test.message"})
+        self.assertEqual(self.receive(layer, channel), {"type": "test.message"})
+
+    def test_cancelled_receive_is_acknowledged(self):
+        layer = self.layer()
+        channel = async_to_sync(layer.new_channel)()
+
+        async def cancel_then_wait():
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(layer.receive(channel), 0.05)
+            connection = await layer.connection()
+            await connection.request("group_replay", group="ack_barrier", seq=0)
+            return connection.cancelled
+
+        self.assertEqual(async_to_sync(cancel_then_wait)(), {})
+
+    def test_connections_of_closed_loops_are_closed(self):
+        layer = self.layer()
+        # A loop closed without cancelling its tasks (unlike asyncio.run) leaves the socket open
+        loop = asyncio.new_event_loop()
+        first = loop.run_until_complete(layer.connection())
+        loop.close()
+        self.assertNotEqual(first.sock.fileno(), -1)
+
+        async_to_sync(layer.group_add)("drivers_cell_9q8y", "test.channel")
+        self.assertEqual(first.sock.fileno(), -1)
+        self.assertEqual(len(layer._connections), 1)
+        # asyncio reports the reader task its loop never finished
+        with self.assertLogs("asyncio", "ERROR"):
+            del first
+            gc.collect()
+
+    def test_ride_created_on_one_worker_reaches_a_driver_on_another(self):
+        worker_b = subprocess.Popen(
+            [sys.executable, "-c", DRIVER_WORKER],
+            cwd=settings.BASE_DIR,
+            env={
+                **os.environ,
+                "CHANNEL_BROKER_SOCKET": self.socket_path,
+                "DATABASE_URL": f"sqlite:///{os.path.join(self.tmpdir, 'worker_b.sqlite3')}",
+            },
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        try:
+            self.assertEqual(worker_b.stdout.readline().strip(), "ready")
+
+            rider = User.objects.create_user("rider@example.com", "Rider", "555-0100", "rider")
+            RiderProfile.objects.create(user=rider)
+            client = APIClient()
+            client.force_authenticate(rider)
+            broker_layer = {
+                "default": {"BACKEND": "ride_project.channel_broker.BrokerChannelLayer", "CONFIG": {"path": self.socket_path}}
+            }
+            with override_settings(CHANNEL_LAYERS=broker_layer), self.captureOnCommitCallbacks(execute=True):
+                response = client.post("/api/rides/request/", RIDE_PAYLOAD)
+            self.assertEqual(response.status_code, 201)
+
+            output, _ = worker_b.communicate(timeout=15)
+        finally:
+            worker_b.kill()
+            worker_b.wait()
+
+        message = json.loads(output)
+        self.assertEqual(message["type"], "new_ride_request")
+        self.assertEqual(message["ride_request"]["id"], response.data["id"])
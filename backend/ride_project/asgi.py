@@ -1,18 +1,42 @@
+import logging
 import os
 from django.core.asgi import get_asgi_application
+from django.db import DatabaseError
 from channels.routing import ProtocolTypeRouter, URLRouter
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ride_project.settings")
 
 django_asgi_app = get_asgi_application()
 
-from ride_project.middleware import JWTWebSocketMiddleware
+from ride_project.middleware import (
+    JWTWebSocketMiddleware,
+    OutboxDispatcherMiddleware,
+    PresenceFlushMiddleware,
+    RideSchedulerMiddleware,
+)
+from locations.index import city_index, city_locator
 from rides.routing import websocket_urlpatterns as ride_ws
 from notifications.routing import websocket_urlpatterns as notif_ws
 
-application = ProtocolTypeRouter(
-    {
-        "http": django_asgi_app,
-        "websocket": JWTWebSocketMiddleware(URLRouter(ride_ws + notif_ws)),
-    }
+logger = logging.getLogger(__name__)
+
+# Build the city indexes at worker start rather than on the first keystroke
+try:
+    city_index.get()
+    city_locator.get()
+except DatabaseError:
+    # Not migrated yet, or the database is down; the indexes are built on first use
+    logger.exception("Could not build the city indexes at startup")
+
+application = RideSchedulerMiddleware(
+    PresenceFlushMiddleware(
+        OutboxDispatcherMiddleware(
+            ProtocolTypeRouter(
+                {
+                    "http": django_asgi_app,
+                    "websocket": JWTWebSocketMiddleware(URLRouter(ride_ws + notif_ws)),
+                }
+            )
+        )
+    )
 )
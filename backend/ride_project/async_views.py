@@ -0,0 +1,101 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from accounts.authentication import revocations
+from accounts.models import User
+from accounts.principals import cached_principal, get_principal
+
+
+class JSONResponse(HttpResponse):
+    """JSON response rendered up front, carrying `.data` like DRF's Response.
+
+    A DRF Response is rendered lazily, which under ASGI costs another hop to a
+    sync thread after the view returns.
+    """
+
+    def __init__(self, data, status=200, headers=None):
+        super().__init__(JSONRenderer().render(data), content_type="application/json", status=status, headers=headers)
+        self.data = data
+
+
+class AsyncAPIView(View):
+    """Async counterpart of DRF's APIView for the ride lifecycle endpoints.
+
+    Handlers are coroutines returning a JSONResponse, so a request stays on the
+    event loop and only hops to a thread for database work. JWT authentication
+    (or APIClient.force_authenticate in tests), parsers, permission classes and
+    error responses behave as they do for an APIView.
+    """
+
+    permission_classes = api_settings.DEFAULT_PERMISSION_CLASSES
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES
+    authentication_class = JWTAuthentication
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.request = Request(request, parsers=[parser() for parser in self.parser_classes])
+        try:
+            self.request.user = await self.authenticate(request)
+            self.check_permissions(self.request)
+            handler = getattr(self, request.method.lower(), None)
+            if handler is None or request.method.lower() not in self.http_method_names:
+                raise exceptions.MethodNotAllowed(request.method)
+            return await handler(self.request, *args, **kwargs)
+        except Exception as exc:
+            return self.handle_exception(exc)
+
+    async def authenticate(self, request):
+        forced_user = getattr(request, "_force_auth_user", None)
+        if forced_user is not None:
+            return forced_user
+
+        authenticator = self.authentication_class()
+        header = authenticator.get_header(request)
+        raw_token = authenticator.get_raw_token(header) if header is not None else None
+        if raw_token is None:
+            return AnonymousUser()
+        validated_token = authenticator.get_validated_token(raw_token)
+        user_id = validated_token.get(jwt_settings.USER_ID_CLAIM)
+        if user_id is None:
+            raise exceptions.AuthenticationFailed("Token contained no recognizable user identification")
+        # Shares the WebSocket principal cache, so a hit skips the hop for the user query
+        try:
+            user = cached_principal(user_id) or await sync_to_async(get_principal)(user_id)
+        except User.DoesNotExist:
+            raise exceptions.AuthenticationFailed("User not found", code="user_not_found")
+        # The cached principal can be WS_PRINCIPAL_CACHE_TTL_SECONDS old on this worker
+        if not user.is_active or await revocations.ais_revoked(user_id, validated_token.get("iat")):
+            raise exceptions.AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
+
+    def check_permissions(self, request):
+        for permission in [permission_class() for permission_class in self.permission_classes]:
+            if not permission.has_permission(request, self):
+                if not request.user.is_authenticated:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied(
+                    detail=getattr(permission, "message", None), code=getattr(permission, "code", None)
+                )
+
+    def handle_exception(self, exc):
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            exc.auth_header = self.authentication_class().authenticate_header(self.request)
+
+        response = exception_handler(exc, {"view": self, "request": self.request})
+        if response is None:
+            raise exc
+        headers = {name: value for name, value in response.headers.items() if name.lower() != "content-type"}
+        return JSONResponse(response.data, status=response.status_code, headers=headers)
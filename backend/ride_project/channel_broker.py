@@ -0,0 +1,413 @@
+"""
+Channel layer for running several ASGI workers on one host.
+
+`ChannelBroker` is a small asyncio server on a Unix socket that owns every channel
+queue and group; `python manage.py run_channel_broker` runs it. Each worker uses
+`BrokerChannelLayer`, which forwards channel-layer calls to the broker as
+newline-delimited JSON requests. Capacity, message expiry and group expiry come
+from the workers' CHANNEL_LAYERS config, as with other channel layer backends.
+The broker also keeps the group replay buffer (ride_project.replay), so a client
+can catch up through whichever worker it reconnects to.
+"""
+import asyncio
+import base64
+import itertools
+import json
+import os
+import re
+import socket
+import time
+import uuid
+from collections import defaultdict, deque
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+from .replay import GroupReplayBuffer
+
+# StreamReader line limit; messages carry serialized rides and offers
+MAX_FRAME_BYTES = 16 * 1024 * 1024
+SWEEP_INTERVAL_SECONDS = 5
+
+
+def _encode_default(value):
+    if isinstance(value, bytes):
+        return {"__bytes__": base64.b64encode(value).decode("ascii")}
+    raise TypeError(f"Object of type {type(value).__name__} cannot be sent over the channel broker")
+
+
+def _decode_hook(obj):
+    if len(obj) == 1 and "__bytes__" in obj:
+        return base64.b64decode(obj["__bytes__"])
+    return obj
+
+
+def encode_frame(obj):
+    return json.dumps(obj, default=_encode_default, separators=(",", ":")).encode() + b"\n"
+
+
+def decode_frame(line):
+    return json.loads(line, object_hook=_decode_hook)
+
+
+class _ClientConnection:
+    """Broker side of one worker connection."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.capacity = 100
+        self.channel_capacity = []
+        self.expiry = 60
+        self.group_expiry = 86400
+        self.replay_size = None
+        self.replay_ttl = None
+
+    @property
+    def closed(self):
+        return self.writer.is_closing()
+
+    def configure(self, request):
+        self.capacity = request.get("capacity", self.capacity)
+        self.channel_capacity = [(re.compile(p), c) for p, c in request.get("channel_capacity", [])]
+        self.expiry = request.get("expiry", self.expiry)
+        self.group_expiry = request.get("group_expiry", self.group_expiry)
+        self.replay_size = request.get("replay_size", self.replay_size)
+        self.replay_ttl = request.get("replay_ttl", self.replay_ttl)
+
+    def get_capacity(self, channel):
+        for pattern, capacity in self.channel_capacity:
+            if pattern.match(channel):
+                return capacity
+        return self.capacity
+
+    def respond(self, request_id, **fields):
+        if not self.closed:
+            self.writer.write(encode_frame({"id": request_id, **fields}))
+
+
+class ChannelBroker:
+    def __init__(self):
+        self.channels = {}  # channel -> deque of (expires_at, message)
+        self.groups = defaultdict(dict)  # group -> {channel: expires_at}
+        self.waiters = defaultdict(deque)  # channel -> deque of (connection, request id)
+        self.replay = GroupReplayBuffer()
+
+    async def serve(self, path):
+        if os.path.exists(path):
+            os.unlink(path)
+        server = await asyncio.start_unix_server(self.handle_client, path=path, limit=MAX_FRAME_BYTES)
+        sweeper = asyncio.get_running_loop().create_task(self.sweep_forever())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            sweeper.cancel()
+            if os.path.exists(path):
+                os.unlink(path)
+
+    async def handle_client(self, reader, writer):
+        connection = _ClientConnection(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.handle(connection, decode_frame(line))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for waiters in self.waiters.values():
+                for waiter in [w for w in waiters if w[0] is connection]:
+                    waiters.remove(waiter)
+            writer.close()
+
+    def handle(self, connection, request):
+        op = request["op"]
+        now = time.monotonic()
+        if op == "hello":
+            connection.configure(request)
+            # Workers share one buffer; the last to connect sets its limits
+            self.replay.size = connection.replay_size or self.replay.size
+            self.replay.ttl = connection.replay_ttl or self.replay.ttl
+        elif op == "send":
+            channel = request["channel"]
+            if self.deliver(channel, request["message"], now, connection.get_capacity(channel), connection.expiry):
+                connection.respond(request["id"])
+            else:
+                connection.respond(request["id"], error="full")
+        elif op == "receive":
+            message = self.pop(request["channel"], now)
+            if message is None:
+                self.waiters[request["channel"]].append((connection, request["id"]))
+            else:
+                connection.respond(request["id"], message=message)
+        elif op == "cancel":
+            waiters = self.waiters.get(request["channel"], ())
+            for waiter in [w for w in waiters if w == (connection, request["receive_id"])]:
+                waiters.remove(waiter)
+                # Otherwise the receive was already answered with a message
+                connection.respond(request["receive_id"], cancelled=True)
+        elif op == "group_add":
+            self.groups[request["group"]][request["channel"]] = now + connection.group_expiry
+            connection.respond(request["id"])
+        elif op == "group_discard":
+            self.groups.get(request["group"], {}).pop(request["channel"], None)
+            connection.respond(request["id"])
+        elif op == "group_send":
+            message = self.replay.stamp(request["group"], request["message"], now)
+            members = self.groups.get(request["group"], {})
+            for channel, expires_at in list(members.items()):
+                if expires_at < now:
+                    del members[channel]
+                    continue
+                # Full channels are skipped rather than failing the whole group
+                self.deliver(channel, message, now, connection.get_capacity(channel), connection.expiry)
+            connection.respond(request["id"])
+        elif op == "group_replay":
+            connection.respond(request["id"], messages=self.replay.since(request["group"], request["seq"], now))
+        elif op == "flush":
+            self.channels.clear()
+            self.groups.clear()
+            self.replay.groups.clear()
+            connection.respond(request["id"])
+        else:
+            connection.respond(request.get("id"), error=f"unknown op {op}")
+
+    def deliver(self, channel, message, now, capacity, expiry):
+        waiters = self.waiters.get(channel)
+        while waiters:
+            connection, request_id = waiters.popleft()
+            if not connection.closed:
+                connection.respond(request_id, message=message)
+                return True
+
+        queue = self.channels.setdefault(channel, deque())
+        self.drop_expired(queue, now)
+        if len(queue) >= capacity:
+            return False
+        queue.append((now + expiry, message))
+        return True
+
+    def pop(self, channel, now):
+        queue = self.channels.get(channel)
+        if not queue:
+            return None
+        self.drop_expired(queue, now)
+        if not queue:
+            del self.channels[channel]
+            return None
+        return queue.popleft()[1]
+
+    @staticmethod
+    def drop_expired(queue, now):
+        while queue and queue[0][0] < now:
+            queue.popleft()
+
+    async def sweep_forever(self):
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL_SECONDS)
+            self.sweep(time.monotonic())
+
+    def sweep(self, now):
+        for channel in list(self.channels):
+            queue = self.channels[channel]
+            self.drop_expired(queue, now)
+            if not queue:
+                del self.channels[channel]
+        for group in list(self.groups):
+            members = self.groups[group]
+            for channel in [c for c, expires_at in members.items() if expires_at < now]:
+                del members[channel]
+            if not members:
+                del self.groups[group]
+        for channel in [c for c, waiters in self.waiters.items() if not waiters]:
+            del self.waiters[channel]
+        self.replay.sweep(now)
+
+
+class _BrokerConnection:
+    """Worker side of the connection to the broker, bound to one event loop."""
+
+    def __init__(self, reader, writer, sock, on_orphaned_message):
+        self.reader = reader
+        self.writer = writer
+        self.sock = sock
+        self.on_orphaned_message = on_orphaned_message
+        self.ids = itertools.count(1)
+        self.pending = {}  # request id -> future
+        self.cancelled = {}  # receive request id -> channel, until the broker answers it
+        self.loop = asyncio.get_running_loop()
+        self.reader_task = self.loop.create_task(self.read_responses())
+
+    def notify(self, op, **fields):
+        self.writer.write(encode_frame({"op": op, **fields}))
+
+    async def request(self, op, **fields):
+        request_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        self.writer.write(encode_frame({"id": request_id, "op": op, **fields}))
+        try:
+            return await future
+        except asyncio.CancelledError:
+            self.pending.pop(request_id, None)
+            if op == "receive" and not self.writer.is_closing():
+                self.cancelled[request_id] = fields["channel"]
+                self.notify("cancel", channel=fields["channel"], receive_id=request_id)
+            raise
+
+    async def read_responses(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                response = decode_frame(line)
+                future = self.pending.pop(response["id"], None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+                elif response["id"] in self.cancelled:
+                    # Either the broker's acknowledgement of the cancel, or a message it
+                    # handed over just as the receive() was cancelled
+                    channel = self.cancelled.pop(response["id"])
+                    if "message" in response:
+                        self.on_orphaned_message(channel, response["message"])
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("Lost connection to the channel broker"))
+            self.pending.clear()
+            if not self.loop.is_closed():  # an abandoned task is finalized after its loop closed
+                self.writer.close()
+
+    @property
+    def closed(self):
+        return self.writer.is_closing() or self.reader_task.done()
+
+    def close(self):
+        if self.loop.is_closed():
+            # The streams cannot be closed without their loop; release the socket itself
+            self.sock.close()
+            return
+        self.reader_task.cancel()
+        self.writer.close()
+
+
+class BrokerChannelLayer(BaseChannelLayer):
+    """Channel layer backed by a ChannelBroker on a Unix socket."""
+
+    extensions = ["groups", "flush", "replay"]
+
+    def __init__(
+        self, path, expiry=60, group_expiry=86400, capacity=100, channel_capacity=None,
+        replay_size=100, replay_ttl=300, **kwargs,
+    ):
+        super().__init__(expiry=expiry, capacity=capacity, **kwargs)
+        self.path = path
+        self.group_expiry = group_expiry
+        self.replay_size = replay_size
+        self.replay_ttl = replay_ttl
+        self.channel_capacity = self.compile_capacities(channel_capacity or {})
+        self.client_prefix = uuid.uuid4().hex
+        # asyncio streams belong to the loop that opened them, and async_to_sync
+        # runs each call on a fresh loop, so connections are kept per loop.
+        self._connections = {}
+        self._orphaned = defaultdict(deque)
+
+    async def connection(self):
+        loop = asyncio.get_running_loop()
+        for other in [l for l in self._connections if l.is_closed()]:
+            connecting = self._connections.pop(other)
+            if connecting.done() and not connecting.cancelled() and connecting.exception() is None:
+                connecting.result().close()
+
+        connecting = self._connections.get(loop)
+        if connecting is None or (connecting.done() and self._unusable(connecting)):
+            connecting = self._connections[loop] = loop.create_task(self.connect())
+        return await asyncio.shield(connecting)
+
+    @staticmethod
+    def _unusable(connecting):
+        return connecting.cancelled() or connecting.exception() is not None or connecting.result().closed
+
+    async def connect(self):
+        # Opened here rather than by open_unix_connection so it can be closed after its loop
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        try:
+            await asyncio.get_running_loop().sock_connect(sock, self.path)
+            reader, writer = await asyncio.open_unix_connection(sock=sock, limit=MAX_FRAME_BYTES)
+        except BaseException:
+            sock.close()
+            raise
+        connection = _BrokerConnection(reader, writer, sock, self._orphaned_message)
+        connection.notify(
+            "hello",
+            capacity=self.capacity,
+            channel_capacity=[[pattern.pattern, capacity] for pattern, capacity in self.channel_capacity],
+            expiry=self.expiry,
+            group_expiry=self.group_expiry,
+            replay_size=self.replay_size,
+            replay_ttl=self.replay_ttl,
+        )
+        return connection
+
+    def _orphaned_message(self, channel, message):
+        self._orphaned[channel].append(message)
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        assert "__asgi_channel__" not in message
+        connection = await self.connection()
+        response = await connection.request("send", channel=channel, message=message)
+        if response.get("error") == "full":
+            raise ChannelFull(channel)
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        if self._orphaned.get(channel):
+            return self._orphaned[channel].popleft()
+        connection = await self.connection()
+        response = await connection.request("receive", channel=channel)
+        return response["message"]
+
+    async def new_channel(self, prefix="specific"):
+        return f"{prefix}.{self.client_prefix}!{uuid.uuid4().hex}"
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        connection = await self.connection()
+        await connection.request("group_add", group=group, channel=channel)
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        connection = await self.connection()
+        await connection.request("group_discard", group=group, channel=channel)
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_group_name(group)
+        connection = await self.connection()
+        await connection.request("group_send", group=group, message=message)
+
+    async def group_replay(self, group, seq):
+        """Messages sent to `group` after `seq`, or None if the client has to resync (ride_project.replay)."""
+        self.require_valid_group_name(group)
+        connection = await self.connection()
+        response = await connection.request("group_replay", group=group, seq=seq)
+        return response["messages"]
+
+    async def flush(self):
+        self._orphaned.clear()
+        connection = await self.connection()
+        await connection.request("flush")
+
+    async def close(self):
+        loop = asyncio.get_running_loop()
+        connecting = self._connections.pop(loop, None)
+        if connecting is not None and connecting.done() and not self._unusable(connecting):
+            connecting.result().close()
@@ -0,0 +1,99 @@
+"""
+Read-only fast path for list endpoints.
+
+A FastSerializer is compiled once from a DRF ModelSerializer class: every output
+field becomes a (key, values() lookup, converter) step, nested serializers are
+flattened into `__` lookups on the same query, and SerializerMethodFields are
+supplied by the caller as functions of the row. Rows come from
+`queryset.values(...)`, so no model instances are built, and rendering the result
+with JSONRenderer gives the same bytes as the DRF serializer.
+"""
+from django.conf import settings
+from rest_framework import serializers
+from rest_framework.response import Response
+
+# Fields whose to_representation returns database values unchanged
+PASSTHROUGH_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.EmailField,
+    serializers.IntegerField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+
+class MethodField:
+    """Output of a SerializerMethodField computed from `lookups` in the row."""
+
+    def __init__(self, function, lookups=()):
+        self.function = function
+        self.lookups = tuple(lookups)
+
+
+class FastSerializer:
+    def __init__(self, serializer_class, method_fields=None, prefix=""):
+        method_fields = method_fields or {}
+        self.lookups = []
+        self.steps = []  # (kind, key, argument)
+        self.pk_lookup = f"{prefix}{serializer_class.Meta.model._meta.pk.name}"
+
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField):
+                method = method_fields[name]
+                self.lookups.extend(method.lookups)
+                self.steps.append(("method", name, method.function))
+            elif isinstance(field, serializers.BaseSerializer):
+                nested = FastSerializer(type(field), method_fields.get(name), prefix=f"{prefix}{field.source}__")
+                self.lookups.extend(nested.lookups)
+                self.steps.append(("nested", name, nested))
+            else:
+                lookup = f"{prefix}{field.source}"
+                self.lookups.append(lookup)
+                converter = None if type(field) in PASSTHROUGH_FIELDS else field.to_representation
+                self.steps.append(("value", name, (lookup, converter)))
+
+        self.lookups = list(dict.fromkeys([*self.lookups, self.pk_lookup]))
+
+    def values(self, queryset):
+        return queryset.values(*self.lookups)
+
+    def to_representation(self, row):
+        data = {}
+        for kind, key, argument in self.steps:
+            if kind == "value":
+                lookup, converter = argument
+                value = row[lookup]
+                data[key] = value if value is None or converter is None else converter(value)
+            elif kind == "nested":
+                data[key] = argument.to_representation(row) if row[argument.pk_lookup] is not None else None
+            else:
+                data[key] = argument(row)
+        return data
+
+    def serialize(self, rows):
+        return [self.to_representation(row) for row in rows]
+
+
+class FastListMixin:
+    """ListAPIView mixin that serves `list()` through `fast_serializer` when API_FAST_SERIALIZERS is on."""
+
+    fast_serializer = None
+
+    def list(self, request, *args, **kwargs):
+        if not settings.API_FAST_SERIALIZERS:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.fast_serializer.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.fast_serializer.serialize(page))
+        return Response(self.fast_serializer.serialize(queryset))
+
+    def serialize_queryset(self, queryset):
+        """Unpaginated data for `queryset`, through the same path as list()."""
+        if not settings.API_FAST_SERIALIZERS:
+            return self.get_serializer(queryset, many=True).data
+        return self.fast_serializer.serialize(self.fast_serializer.values(queryset))
@@ -0,0 +1,266 @@
+"""
+In-process metrics served in the Prometheus text format by GET /api/admin/metrics/.
+
+Counters, gauges and histograms live in the worker's memory. Recording costs a
+dict lookup and a couple of additions under a lock; a histogram observation adds
+a bisect into fixed buckets. Nothing is written anywhere until the endpoint is
+scraped, and the numbers are per worker, like presence.
+
+Recorded here:
+- MetricsMiddleware (ride_project.middleware): duration and database queries per
+  view and method, and responses per status.
+- notifications.consumers.MetricsMixin: WebSocket connects, disconnects, open
+  sockets and messages sent per consumer.
+- timed_group_send(): every channel-layer group_send.
+
+`render()` adds the figures the caches, outbox dispatcher, presence registry and
+replay buffer already keep.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from channels.layers import get_channel_layer
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# [count] for the request being handled; sync_to_async copies the context, so
+# queries run on database threads are counted too
+_request_queries = ContextVar("request_queries", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}  # label values -> value
+        self.lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self):
+        with self.lock:
+            values = sorted(self.values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, key)} {_number(v)}" for key, v in values]
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                # One slot per bucket, one for +Inf, then sum
+                counts = self.values[labels] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def render(self):
+        with self.lock:
+            values = sorted((key, list(counts)) for key, counts in self.values.items())
+        lines = self.header()
+        for key, counts in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(counts[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Snapshot(Metric):
+    """Values read from another component when the endpoint is scraped."""
+
+    def __init__(self, name, help, kind, labelnames=(), values=None):
+        super().__init__(name, help, labelnames)
+        self.kind = kind
+        self.values = {key: value for key, value in (values or {}).items() if value is not None}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.add(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self.add(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DURATION_BUCKETS):
+        return self.add(Histogram(name, help, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in [*self.metrics, *component_metrics()]:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        for metric in self.metrics:
+            metric.clear()
+
+
+metrics = MetricsRegistry()
+
+http_request_duration = metrics.histogram(
+    "campusride_http_request_duration_seconds", "Time to handle a request, per view.", ("view", "method")
+)
+http_request_queries = metrics.histogram(
+    "campusride_http_request_queries", "Database queries per request, per view.", ("view", "method"), QUERY_BUCKETS
+)
+http_responses = metrics.counter(
+    "campusride_http_responses_total", "Responses per view and status.", ("view", "method", "status")
+)
+ws_connects = metrics.counter("campusride_ws_connects_total", "WebSockets accepted.", ("consumer",))
+ws_disconnects = metrics.counter("campusride_ws_disconnects_total", "Accepted WebSockets closed.", ("consumer",))
+ws_open = metrics.gauge("campusride_ws_connections", "WebSockets open on this worker.", ("consumer",))
+ws_messages_sent = metrics.counter("campusride_ws_messages_sent_total", "Messages sent to clients.", ("consumer",))
+group_send_duration = metrics.histogram(
+    "campusride_channel_group_send_seconds", "Time for one channel-layer group_send."
+)
+
+
+# Database queries
+
+def count_query(execute, sql, params, many, context):
+    counter = _request_queries.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(connection, **kwargs):
+    """Count this connection's queries towards the current request (connection_created receiver)."""
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+def start_request():
+    return _request_queries.set([0])
+
+
+def finish_request(request, response, started, token):
+    duration = time.perf_counter() - started
+    queries = _request_queries.get()[0]
+    _request_queries.reset(token)
+    match = getattr(request, "resolver_match", None)
+    view = match.view_name if match else "unmatched"
+    http_request_duration.observe(view, request.method, value=duration)
+    http_request_queries.observe(view, request.method, value=queries)
+    http_responses.inc(view, request.method, response.status_code)
+
+
+# Channel layer
+
+async def timed_group_send(channel_layer, group, message):
+    started = time.perf_counter()
+    try:
+        await channel_layer.group_send(group, message)
+    finally:
+        group_send_duration.observe(value=time.perf_counter() - started)
+
+
+# Stats kept by other components
+
+def component_metrics():
+    from accounts.cards import driver_card_cache
+    from accounts.presence import presence
+    from accounts.principals import principal_cache
+    from accounts.stats import stats_cache
+    from notifications.outbox import dispatcher
+
+    caches = {"principal": principal_cache, "driver_card": driver_card_cache, "admin_stats": stats_cache}
+    cache_stats = {name: cache.stats() for name, cache in caches.items()}
+
+    def per_cache(field):
+        return {(name,): stats[field] for name, stats in cache_stats.items()}
+
+    outbox = dispatcher.stats()
+    lag = {}
+    for quantile, field in (("0.5", "lag_p50_ms"), ("0.95", "lag_p95_ms"), ("1", "lag_max_ms")):
+        if outbox[field] is not None:
+            lag[(quantile,)] = outbox[field] / 1000
+    snapshots = [
+        Snapshot("campusride_cache_entries", "Entries in each per-worker cache.", "gauge", ("cache",), per_cache("size")),
+        Snapshot("campusride_cache_hits_total", "Cache hits.", "counter", ("cache",), per_cache("hits")),
+        Snapshot("campusride_cache_misses_total", "Cache misses.", "counter", ("cache",), per_cache("misses")),
+        Snapshot("campusride_cache_evictions_total", "Entries evicted for space.", "counter", ("cache",), per_cache("evictions")),
+        Snapshot("campusride_outbox_dispatched_total", "Outbox events sent by this worker.", "counter",
+                 values={(): outbox["dispatched"]}),
+        Snapshot("campusride_outbox_dispatch_lag_seconds", "Outbox event recorded to sent, last 1000 events.", "gauge",
+                 ("quantile",), lag),
+    ]
+
+    presence_stats = presence.stats()
+    for field, kind, help in (
+        ("users_connected", "gauge", "Users with an open WebSocket."),
+        ("sockets", "gauge", "WebSockets in the presence registry."),
+        ("pending_writes", "gauge", "Presence changes not yet written."),
+        ("flushed_total", "counter", "Presence changes written."),
+        ("expired_total", "counter", "Sockets dropped for not pinging."),
+    ):
+        snapshots.append(Snapshot(f"campusride_presence_{field}", help, kind, values={(): presence_stats[field]}))
+
+    # With the channel broker the buffer lives in the broker process
+    replay = getattr(get_channel_layer(), "replay", None)
+    if replay is not None:
+        replay_stats = replay.stats()
+        snapshots.append(Snapshot("campusride_replay_groups", "Groups with replayable messages.", "gauge",
+                                  values={(): replay_stats["groups"]}))
+        snapshots.append(Snapshot("campusride_replay_messages", "Messages kept for replay.", "gauge",
+                                  values={(): replay_stats["messages"]}))
+    return snapshots
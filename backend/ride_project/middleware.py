@@ -1,11 +1,23 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from channels.middleware import BaseMiddleware
 from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from whitenoise.middleware import WhiteNoiseMiddleware
 from rest_framework_simplejwt.tokens import AccessToken
-from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
 from urllib.parse import parse_qs
 
-User = get_user_model()
+from accounts.authentication import revocations
+from accounts.presence import presence
+from accounts.principals import cached_principal, get_principal
+from notifications.outbox import dispatcher as outbox_dispatcher
+from rides.scheduler import scheduler as ride_scheduler
+from ride_project import metrics, profiling
 
 
 class JWTWebSocketMiddleware(BaseMiddleware):
@@ -16,7 +28,12 @@ class JWTWebSocketMiddleware(BaseMiddleware):
         if token_list:
             try:
                 access_token = AccessToken(token_list[0])
-                user = await self.get_user(access_token["user_id"])
+                user_id = access_token["user_id"]
+                # Cache hits skip the hop to the database thread
+                user = cached_principal(user_id) or await self.get_user(user_id)
+                # The cached user can be WS_PRINCIPAL_CACHE_TTL_SECONDS old on this worker
+                if not user.is_active or await revocations.ais_revoked(user_id, access_token.get("iat")):
+                    user = AnonymousUser()
                 scope["user"] = user
             except Exception:
                 scope["user"] = AnonymousUser()
@@ -27,4 +44,135 @@ class JWTWebSocketMiddleware(BaseMiddleware):
 
     @database_sync_to_async
     def get_user(self, user_id):
-        return User.objects.get(id=user_id)
+        return get_principal(user_id)
+
+
+class OutboxDispatcherMiddleware:
+    """Starts the outbox dispatcher on the server's event loop with the first connection."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not outbox_dispatcher.running:
+            outbox_dispatcher.start()
+        return await self.app(scope, receive, send)
+
+
+class PresenceFlushMiddleware:
+    """Starts the presence flusher (accounts.presence) on the server's event loop with the first connection."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not presence.running:
+            presence.start()
+        return await self.app(scope, receive, send)
+
+
+class RideSchedulerMiddleware:
+    """Starts the ride scheduler (rides.scheduler) on the server's event loop with the first connection."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not ride_scheduler.running:
+            ride_scheduler.start()
+        return await self.app(scope, receive, send)
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise that stays async under ASGI.
+
+    WhiteNoiseMiddleware is sync-only, which makes Django run everything below it,
+    views included, in a sync thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class MetricsMiddleware:
+    """Records duration, database queries and status per view (ride_project.metrics).
+
+    Async-capable, so it does not move views off the event loop under ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        connection_created.connect(metrics.install_query_counter)
+        # Connections opened before the first request (tests, management commands)
+        for connection in connections.all(initialized_only=True):
+            metrics.install_query_counter(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started, token = time.perf_counter(), metrics.start_request()
+        response = self.get_response(request)
+        metrics.finish_request(request, response, started, token)
+        return response
+
+    async def __acall__(self, request):
+        started, token = time.perf_counter(), metrics.start_request()
+        response = await self.get_response(request)
+        metrics.finish_request(request, response, started, token)
+        return response
+
+
+class ProfilingMiddleware:
+    """Profiles requests that admins flag with X-Profile: 1 (ride_project.profiling)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not profiling.wants_profile(request) or not profiling.is_admin_request(request):
+            return self.get_response(request)
+        sampler, started = profiling.start_profile()
+        response = self.get_response(request)
+        return profiling.finish_profile(request, response, sampler, started)
+
+    async def __acall__(self, request):
+        if not profiling.wants_profile(request) or not await sync_to_async(profiling.is_admin_request)(request):
+            return await self.get_response(request)
+        sampler, started = profiling.start_profile()
+        response = await self.get_response(request)
+        return await sync_to_async(profiling.finish_profile)(request, response, sampler, started)
@@ -0,0 +1,193 @@
+"""
+On-demand profiling of single requests for admins.
+
+A request carrying `X-Profile: 1` (or `?profile=1`) with an admin's JWT runs
+under a sampling profiler, and the response gets an `X-Profile-Id` header.
+Every PROFILE_SAMPLE_INTERVAL_SECONDS, a background thread reads the stack of
+every thread in the worker. An ASGI request moves between the event loop and
+sync threads, so no single thread would show all of it. Stacks parked in a wait
+(an idle event loop or executor thread) are dropped. The rest are counted as
+collapsed stacks ("frame;frame;frame count"), which flamegraph.pl and
+speedscope read directly. Requests running on the worker at the same time
+show up too, so profile when the worker is quiet.
+
+Profiles are written to PROFILE_DIR, which all workers on the host share.
+Only the last PROFILE_KEEP are kept. /api/admin/profiles/ lists them, and
+/api/admin/profiles/<id>/ downloads one. Without the flag, the middleware
+only looks up a header and a query parameter.
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from rest_framework.exceptions import APIException
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_PARAM = "profile"
+PROFILE_ID_RE = re.compile(r"^[0-9]+-[0-9a-f]{8}$")
+
+# (file suffix, function) of frames a thread sits in while it has nothing to do
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("concurrent/futures/thread.py", "_worker"),
+}
+
+_path_prefixes = sorted({str(settings.BASE_DIR), *sys.path}, key=len, reverse=True)
+
+
+def wants_profile(request):
+    return request.headers.get(PROFILE_HEADER) == "1" or request.GET.get(PROFILE_PARAM) == "1"
+
+
+def is_admin_request(request):
+    """Whether the request's bearer token belongs to an admin."""
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except APIException:
+        return False
+    return authenticated is not None and authenticated[0].role == "admin"
+
+
+def _frame_name(code):
+    path = code.co_filename
+    for prefix in _path_prefixes:
+        if prefix and path.startswith(prefix):
+            path = path[len(prefix):].lstrip(os.sep)
+            break
+    return f"{path}:{code.co_qualname}"
+
+
+def _is_idle(frame):
+    path = frame.f_code.co_filename.replace(os.sep, "/")
+    return any(path.endswith(suffix) and frame.f_code.co_name == name for suffix, name in IDLE_FRAMES)
+
+
+class Sampler:
+    """Counts the stacks of every other thread at a fixed interval until stopped."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self.run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == own or _is_idle(frame):
+                    continue
+                names = []
+                while frame is not None:
+                    names.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(names))] += 1
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ProfileStore:
+    """Profiles on disk: <id>.json (what was profiled) and <id>.folded (collapsed stacks)."""
+
+    def __init__(self, directory, keep):
+        self.directory = directory
+        self.keep = keep
+        self._last_stamp = 0
+        self._lock = threading.Lock()
+
+    def save(self, meta, collapsed):
+        os.makedirs(self.directory, exist_ok=True)
+        # Ids sort by time (microseconds, never repeated within this process)
+        with self._lock:
+            self._last_stamp = max(time.time_ns() // 1000, self._last_stamp + 1)
+            profile_id = f"{self._last_stamp}-{uuid.uuid4().hex[:8]}"
+        with open(self.path(profile_id, "folded"), "w") as f:
+            f.write(collapsed)
+        with open(self.path(profile_id, "json"), "w") as f:
+            json.dump({"id": profile_id, **meta}, f)
+        self.prune()
+        return profile_id
+
+    def list(self):
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # pruned by another worker meanwhile
+        return profiles
+
+    def collapsed(self, profile_id):
+        """The profile's collapsed stacks, or None if there is no such profile."""
+        if not PROFILE_ID_RE.match(profile_id):
+            return None
+        try:
+            with open(self.path(profile_id, "folded")) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def prune(self):
+        ids = sorted(name[: -len(".json")] for name in os.listdir(self.directory) if name.endswith(".json"))
+        for profile_id in ids[: max(len(ids) - self.keep, 0)]:
+            for extension in ("json", "folded"):
+                try:
+                    os.remove(self.path(profile_id, extension))
+                except FileNotFoundError:
+                    pass
+
+    def path(self, profile_id, extension):
+        return os.path.join(self.directory, f"{profile_id}.{extension}")
+
+
+profile_store = ProfileStore(settings.PROFILE_DIR, settings.PROFILE_KEEP)
+
+
+def start_profile():
+    sampler = Sampler(settings.PROFILE_SAMPLE_INTERVAL_SECONDS)
+    sampler.start()
+    return sampler, time.perf_counter()
+
+
+def finish_profile(request, response, sampler, started):
+    duration = time.perf_counter() - started
+    sampler.stop()
+    match = getattr(request, "resolver_match", None)
+    profile_id = profile_store.save(
+        {
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "duration_ms": round(duration * 1000, 2),
+            "samples": sampler.samples,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        sampler.collapsed(),
+    )
+    response[f"{PROFILE_HEADER}-Id"] = profile_id
+    return response
@@ -0,0 +1,104 @@
+"""
+Replay of recent group broadcasts for reconnecting WebSocket clients.
+
+The channel layer stamps every group_send with a sequence number and keeps the
+last `replay_size` messages of each group for `replay_ttl` seconds. Sequence
+numbers come from one counter per layer, started at the wall clock in
+microseconds, so they increase within a group and a restarted layer never
+reissues a number a client still holds. A client that reconnects with the
+last number it saw for a group gets the messages it missed. If any of them
+have been evicted, it is told to resync over REST instead.
+
+`GroupReplayBuffer` is used by the broker (ride_project.channel_broker) and
+by `InMemoryReplayChannelLayer` for single-process deployments and tests.
+Consumers use notifications.consumers.ReplayMixin.
+"""
+import time
+from collections import deque
+
+from channels.layers import InMemoryChannelLayer
+
+# Key the layer adds to broadcast messages: {"group": ..., "seq": ...}
+REPLAY_KEY = "replay"
+
+
+class GroupReplayBuffer:
+    def __init__(self, size=100, ttl=300):
+        self.size = size
+        self.ttl = ttl
+        self.groups = {}  # group -> [floor, deque of (seq, expires_at, message)]
+        self.next_seq = time.time_ns() // 1000
+        self.next_sweep = 0.0
+
+    def stamp(self, group, message, now=None):
+        """Return `message` stamped with the group's next sequence number, and keep it."""
+        now = time.monotonic() if now is None else now
+        if now >= self.next_sweep:
+            self.sweep(now)
+            self.next_sweep = now + self.ttl
+        self.next_seq += 1
+        message = {**message, REPLAY_KEY: {"group": group, "seq": self.next_seq}}
+
+        entry = self.groups.get(group)
+        if entry is None:
+            # Anything a client holds for this group predates its first message here
+            entry = self.groups[group] = [self.next_seq - 1, deque()]
+        self.expire(entry, now)
+        entry[1].append((self.next_seq, now + self.ttl, message))
+        while len(entry[1]) > self.size:
+            entry[0] = entry[1].popleft()[0]
+        return message
+
+    def since(self, group, seq, now=None):
+        """Messages for `group` after `seq`, or None if some of them are gone."""
+        now = time.monotonic() if now is None else now
+        entry = self.groups.get(group)
+        if entry is None:
+            return None
+        self.expire(entry, now)
+        newest = entry[1][-1][0] if entry[1] else entry[0]
+        if seq < entry[0] or seq > newest:
+            return None
+        return [message for message_seq, _, message in entry[1] if message_seq > seq]
+
+    @staticmethod
+    def expire(entry, now):
+        messages = entry[1]
+        while messages and messages[0][1] < now:
+            entry[0] = messages.popleft()[0]
+
+    def sweep(self, now=None):
+        """Forget groups whose messages have all expired."""
+        now = time.monotonic() if now is None else now
+        for group in list(self.groups):
+            entry = self.groups[group]
+            self.expire(entry, now)
+            if not entry[1]:
+                del self.groups[group]
+
+    def stats(self):
+        return {
+            "groups": len(self.groups),
+            "messages": sum(len(messages) for _, messages in self.groups.values()),
+        }
+
+
+class InMemoryReplayChannelLayer(InMemoryChannelLayer):
+    """InMemoryChannelLayer with group replay (see the module docstring)."""
+
+    extensions = [*InMemoryChannelLayer.extensions, "replay"]
+
+    def __init__(self, replay_size=100, replay_ttl=300, **kwargs):
+        super().__init__(**kwargs)
+        self.replay = GroupReplayBuffer(replay_size, replay_ttl)
+
+    async def group_send(self, group, message):
+        await super().group_send(group, self.replay.stamp(group, message))
+
+    async def group_replay(self, group, seq):
+        self.require_valid_group_name(group)
+        return self.replay.since(group, seq)
+
+    async def flush(self):
+        await super().flush()
+        self.replay = GroupReplayBuffer(self.replay.size, self.replay.ttl)
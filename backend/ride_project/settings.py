@@ -1,8 +1,10 @@
 from pathlib import Path
 from datetime import timedelta
 import os
+import tempfile
 
 import dj_database_url
+from corsheaders.defaults import default_headers
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -34,8 +36,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "ride_project.middleware.MetricsMiddleware",
+    "ride_project.middleware.ProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "ride_project.middleware.AsyncWhiteNoiseMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -71,6 +75,10 @@ DATABASES = {
         conn_max_age=600,
     )
 }
+if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3":
+    # The shared-cache in-memory test database fails concurrent writers instead of
+    # making them wait, which the concurrency tests rely on.
+    DATABASES["default"]["TEST"] = {"NAME": BASE_DIR / "test_db.sqlite3"}
 
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator"},
@@ -93,7 +101,7 @@ AUTH_USER_MODEL = "accounts.User"
 # REST Framework
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "accounts.authentication.ClaimsJWTAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
@@ -108,6 +116,10 @@ SIMPLE_JWT = {
     "BLACKLIST_AFTER_ROTATION": True,
     "AUTH_HEADER_TYPES": ("Bearer",),
 }
+# REST requests are authenticated from the token's role/is_active claims without a user
+# query (accounts.authentication); deactivations reach every worker within this many seconds
+JWT_CLAIMS_AUTH = os.environ.get("JWT_CLAIMS_AUTH", "True") == "True"
+JWT_REVOCATION_REFRESH_SECONDS = float(os.environ.get("JWT_REVOCATION_REFRESH_SECONDS", "5"))
 
 # CORS
 CORS_ALLOWED_ORIGINS = os.environ.get(
@@ -117,6 +129,9 @@ CORS_ALLOWED_ORIGIN_REGEXES = [
     r"^https://campusride.*\.vercel\.app$",
 ]
 CORS_ALLOW_CREDENTIALS = True
+# Conditional GETs on polled ride endpoints (rides.views.ride_etag)
+CORS_ALLOW_HEADERS = (*default_headers, "if-none-match", "x-profile")
+CORS_EXPOSE_HEADERS = ["ETag", "X-Profile-Id"]
 
 # CSRF
 CSRF_TRUSTED_ORIGINS = os.environ.get(
@@ -124,8 +139,107 @@ CSRF_TRUSTED_ORIGINS = os.environ.get(
 ).split(",")
 
 # Channels
-CHANNEL_LAYERS = {
-    "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
+# With CHANNEL_BROKER_SOCKET set, workers share groups through the broker started by
+# `python manage.py run_channel_broker`, so more than one ASGI worker can run per host.
+CHANNEL_BROKER_SOCKET = os.environ.get("CHANNEL_BROKER_SOCKET", "")
+# Group broadcasts kept for reconnecting clients to replay (ride_project.replay): per group,
+# at most this many messages, each for this many seconds.
+CHANNEL_REPLAY_SIZE = int(os.environ.get("CHANNEL_REPLAY_SIZE", "100"))
+CHANNEL_REPLAY_TTL_SECONDS = int(os.environ.get("CHANNEL_REPLAY_TTL_SECONDS", "300"))
+if CHANNEL_BROKER_SOCKET:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "ride_project.channel_broker.BrokerChannelLayer",
+            "CONFIG": {
+                "path": CHANNEL_BROKER_SOCKET,
+                "capacity": int(os.environ.get("CHANNEL_CAPACITY", "100")),
+                "expiry": int(os.environ.get("CHANNEL_EXPIRY_SECONDS", "60")),
+                "replay_size": CHANNEL_REPLAY_SIZE,
+                "replay_ttl": CHANNEL_REPLAY_TTL_SECONDS,
+            },
+        }
     }
-}
+else:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "ride_project.replay.InMemoryReplayChannelLayer",
+            "CONFIG": {
+                "replay_size": CHANNEL_REPLAY_SIZE,
+                "replay_ttl": CHANNEL_REPLAY_TTL_SECONDS,
+            },
+        }
+    }
+
+# Ride requests are broadcast to drivers in the geohash cells around the pickup
+# point instead of every connected driver.
+RIDE_BROADCAST_GEOHASH_PRECISION = int(os.environ.get("RIDE_BROADCAST_GEOHASH_PRECISION", "4"))
+RIDE_BROADCAST_RADIUS_MILES = int(os.environ.get("RIDE_BROADCAST_RADIUS_MILES", "25"))
+RIDE_BROADCAST_MAX_RADIUS_MILES = int(os.environ.get("RIDE_BROADCAST_MAX_RADIUS_MILES", "200"))
+
+# City autocomplete is answered from an in-process prefix index. Each worker checks
+# this often whether `load_us_cities` replaced the cities, and rebuilds if so.
+CITY_INDEX_CHECK_SECONDS = int(os.environ.get("CITY_INDEX_CHECK_SECONDS", "10"))
+
+# /api/locations/nearest/ radius cap, and how far a ride's pickup/dropoff coordinates
+# may be from the city named for them (rides.serializers.RideRequestCreateSerializer)
+NEAREST_CITY_MAX_RADIUS_MILES = int(os.environ.get("NEAREST_CITY_MAX_RADIUS_MILES", "500"))
+RIDE_CITY_MATCH_RADIUS_MILES = int(os.environ.get("RIDE_CITY_MATCH_RADIUS_MILES", "25"))
+
+# Largest batch (pairs, or origins x destinations) accepted by /api/locations/distance/batch/
+DISTANCE_BATCH_MAX_PAIRS = int(os.environ.get("DISTANCE_BATCH_MAX_PAIRS", "10000"))
+
+# Keyset pagination for list endpoints (ride_project.pagination.KeysetPagination)
+API_PAGE_SIZE = int(os.environ.get("API_PAGE_SIZE", "50"))
+API_MAX_PAGE_SIZE = int(os.environ.get("API_MAX_PAGE_SIZE", "200"))
+# Ride, offer and history lists serialize .values() rows (ride_project.fast_serializers)
+API_FAST_SERIALIZERS = os.environ.get("API_FAST_SERIALIZERS", "True") == "True"
+# Most changes one ?since= delta sync of the driver board returns (rides.sync)
+RIDE_SYNC_MAX_CHANGES = int(os.environ.get("RIDE_SYNC_MAX_CHANGES", "500"))
+# A delta sync cursor waits at an uncommitted change id for up to this long
+# before skipping it as rolled back (rides.models.RideChange)
+RIDE_SYNC_SETTLE_SECONDS = int(os.environ.get("RIDE_SYNC_SETTLE_SECONDS", "10"))
+# How long RideChange rows are kept; they only number changes, the rides keep the data
+RIDE_CHANGE_RETENTION_SECONDS = int(os.environ.get("RIDE_CHANGE_RETENTION_SECONDS", "3600"))
+
+# Specific-time and range rides are held off the driver board until
+# RIDE_SCHEDULE_LEAD_MINUTES before their window and expire once it has passed; a
+# specific time's window closes RIDE_SCHEDULE_GRACE_MINUTES after it (rides.scheduler)
+RIDE_SCHEDULE_LEAD_MINUTES = int(os.environ.get("RIDE_SCHEDULE_LEAD_MINUTES", "30"))
+RIDE_SCHEDULE_GRACE_MINUTES = int(os.environ.get("RIDE_SCHEDULE_GRACE_MINUTES", "30"))
+RIDE_SCHEDULER_POLL_SECONDS = float(os.environ.get("RIDE_SCHEDULER_POLL_SECONDS", "30"))
+
+# Users resolved for WebSocket handshakes are cached per worker (accounts.principals)
+WS_PRINCIPAL_CACHE_SIZE = int(os.environ.get("WS_PRINCIPAL_CACHE_SIZE", "10000"))
+WS_PRINCIPAL_CACHE_TTL_SECONDS = int(os.environ.get("WS_PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+
+# Driver cards shared by offer/history payloads are cached per worker (accounts.cards)
+DRIVER_CARD_CACHE_SIZE = int(os.environ.get("DRIVER_CARD_CACHE_SIZE", "10000"))
+DRIVER_CARD_CACHE_TTL_SECONDS = int(os.environ.get("DRIVER_CARD_CACHE_TTL_SECONDS", "60"))
+
+# Admin dashboard totals are recomputed at most this often per worker (accounts.stats)
+ADMIN_STATS_CACHE_TTL_SECONDS = int(os.environ.get("ADMIN_STATS_CACHE_TTL_SECONDS", "10"))
+
+# Presence (accounts.presence): online/available changes are written in batches, and
+# sockets that have not pinged for PRESENCE_SOCKET_TTL_SECONDS are dropped
+PRESENCE_FLUSH_SECONDS = float(os.environ.get("PRESENCE_FLUSH_SECONDS", "5"))
+PRESENCE_SOCKET_TTL_SECONDS = int(os.environ.get("PRESENCE_SOCKET_TTL_SECONDS", "90"))
+
+# WebSocket events are written to an outbox with the change and sent after commit
+# by a dispatcher on the ASGI event loop (notifications.outbox).
+OUTBOX_ENABLED = os.environ.get("OUTBOX_ENABLED", "True") == "True"
+OUTBOX_BATCH_SIZE = int(os.environ.get("OUTBOX_BATCH_SIZE", "500"))
+OUTBOX_POLL_SECONDS = float(os.environ.get("OUTBOX_POLL_SECONDS", "1"))
+OUTBOX_RETENTION_SECONDS = int(os.environ.get("OUTBOX_RETENTION_SECONDS", "3600"))
+# A claimed batch that is not marked sent within this long (its dispatcher died) is claimed again
+OUTBOX_CLAIM_TIMEOUT_SECONDS = int(os.environ.get("OUTBOX_CLAIM_TIMEOUT_SECONDS", "30"))
+
+# Per-worker request, WebSocket and channel-layer metrics, served to admins at
+# /api/admin/metrics/ (ride_project.metrics)
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "True") == "True"
+
+# Admins can profile a request with X-Profile: 1 (ride_project.profiling); the last
+# PROFILE_KEEP profiles are kept in PROFILE_DIR
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "True") == "True"
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "campusride-profiles"))
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "50"))
+PROFILE_SAMPLE_INTERVAL_SECONDS = float(os.environ.get("PROFILE_SAMPLE_INTERVAL_SECONDS", "0.001"))
@@ -14,5 +14,8 @@ urlpatterns = [
     path("api/admin/users/<uuid:user_id>/", account_views.AdminDeleteUserView.as_view(), name="admin_delete_user"),
     path("api/admin/online-users/", account_views.AdminOnlineUsersView.as_view(), name="admin_online_users"),
     path("api/admin/stats/", account_views.AdminStatsView.as_view(), name="admin_stats"),
+    path("api/admin/metrics/", account_views.AdminMetricsView.as_view(), name="admin_metrics"),
+    path("api/admin/profiles/", account_views.AdminProfileListView.as_view(), name="admin_profiles"),
+    path("api/admin/profiles/<str:profile_id>/", account_views.AdminProfileDownloadView.as_view(), name="admin_profile"),
     path("api/admin/rides/", ride_views.AdminRidesView.as_view(), name="admin_rides"),
 ]
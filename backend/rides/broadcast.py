@@ -0,0 +1,42 @@
+from django.conf import settings
+
+from .utils import geohash_cells_within, geohash_encode
+
+# Every driver socket, whatever its cell. The board lists every live ride to every
+# driver, so a ride leaving it (ride_cancelled) goes here, not to the pickup cells.
+DRIVER_BOARD_GROUP = "drivers_board"
+
+
+def driver_cell_group(cell):
+    return f"drivers_cell_{cell}"
+
+
+def driver_cell_for(lat, lng):
+    return geohash_encode(lat, lng, settings.RIDE_BROADCAST_GEOHASH_PRECISION)
+
+
+def broadcast_radius(ride_request):
+    return ride_request.broadcast_radius_miles or settings.RIDE_BROADCAST_RADIUS_MILES
+
+
+def driver_groups_for_pickup(lat, lng, radius_miles):
+    """Channel groups of the driver cells within `radius_miles` of a pickup point."""
+    cells = geohash_cells_within(lat, lng, radius_miles, settings.RIDE_BROADCAST_GEOHASH_PRECISION)
+    return [driver_cell_group(cell) for cell in cells]
+
+
+def driver_groups_for_request(ride_request, radius_miles=None):
+    return driver_groups_for_pickup(
+        ride_request.pickup_lat,
+        ride_request.pickup_lng,
+        radius_miles or broadcast_radius(ride_request),
+    )
+
+
+def widened_radius(ride_request):
+    """Next broadcast radius for a request nobody has picked up, or None at the limit."""
+    current = broadcast_radius(ride_request)
+    if current >= settings.RIDE_BROADCAST_MAX_RADIUS_MILES:
+        return None
+    return min(current * 2, settings.RIDE_BROADCAST_MAX_RADIUS_MILES)
+
@@ -1,31 +1,62 @@
-import json
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
-from channels.db import database_sync_to_async
 
+from accounts.presence import presence
+from notifications.consumers import MetricsMixin, OutboxBatchMixin, PresenceMixin, ReplayMixin
+from .broadcast import DRIVER_BOARD_GROUP, driver_cell_for, driver_cell_group
+
+
+class DriverConsumer(MetricsMixin, ReplayMixin, PresenceMixin, OutboxBatchMixin, AsyncJsonWebsocketConsumer):
+    presence_kind = "driver"
 
-class DriverConsumer(AsyncJsonWebsocketConsumer):
     async def connect(self):
         self.user = self.scope["user"]
         if self.user.is_anonymous or self.user.role != "driver":
             await self.close()
             return
 
-        self.group_name = "drivers_available"
-        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        # Drivers join the geohash cell of the position they report; requests are
+        # only sent to the cells around their pickup point.
+        self.cell_group = None
 
         self.personal_group = f"driver_{self.user.id}"
         await self.channel_layer.group_add(self.personal_group, self.channel_name)
+        # Not replayed: a reconnecting board catches up through its delta sync (rides.sync)
+        await self.channel_layer.group_add(DRIVER_BOARD_GROUP, self.channel_name)
 
         await self.accept()
-        await self.mark_driver_available(True)
+        presence.connect(self.user.id, self.channel_name, self.presence_kind)
+        await self.replay_group(self.personal_group)
 
     async def disconnect(self, close_code):
-        if hasattr(self, "group_name"):
-            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        if getattr(self, "cell_group", None):
+            await self.channel_layer.group_discard(self.cell_group, self.channel_name)
         if hasattr(self, "personal_group"):
             await self.channel_layer.group_discard(self.personal_group, self.channel_name)
-        if hasattr(self, "user") and not self.user.is_anonymous:
-            await self.mark_driver_available(False)
+            await self.channel_layer.group_discard(DRIVER_BOARD_GROUP, self.channel_name)
+        await super().disconnect(close_code)
+
+    async def receive_json(self, content, **kwargs):
+        await super().receive_json(content, **kwargs)
+        if content.get("type") == "update_location":
+            await self.update_location(content.get("lat"), content.get("lng"))
+
+    async def update_location(self, lat, lng):
+        try:
+            lat, lng = float(lat), float(lng)
+        except (TypeError, ValueError):
+            return
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return
+
+        cell_group = driver_cell_group(driver_cell_for(lat, lng))
+        if cell_group == self.cell_group:
+            return
+        if self.cell_group:
+            await self.channel_layer.group_discard(self.cell_group, self.channel_name)
+        await self.channel_layer.group_add(cell_group, self.channel_name)
+        self.cell_group = cell_group
+        # A driver reconnecting in the same place catches up on its cell as well
+        await self.replay_group(cell_group)
 
     async def new_ride_request(self, event):
         await self.send_json({"type": "new_ride_request", "ride_request": event["data"]})
@@ -36,17 +67,10 @@ class DriverConsumer(AsyncJsonWebsocketConsumer):
     async def ride_cancelled(self, event):
         await self.send_json({"type": "ride_cancelled", "ride_request_id": event["ride_request_id"]})
 
-    @database_sync_to_async
-    def mark_driver_available(self, available):
-        try:
-            profile = self.user.driver_profile
-            profile.is_available = available
-            profile.save(update_fields=["is_available"])
-        except Exception:
-            pass
 
+class RiderConsumer(MetricsMixin, ReplayMixin, PresenceMixin, OutboxBatchMixin, AsyncJsonWebsocketConsumer):
+    presence_kind = "rider"
 
-class RiderConsumer(AsyncJsonWebsocketConsumer):
     async def connect(self):
         self.user = self.scope["user"]
         if self.user.is_anonymous or self.user.role != "rider":
@@ -62,12 +86,17 @@ class RiderConsumer(AsyncJsonWebsocketConsumer):
         await self.channel_layer.group_add(self.personal_group, self.channel_name)
 
         await self.accept()
+        presence.connect(self.user.id, self.channel_name, self.presence_kind)
+        await self.replay_group(self.group_name)
+        await self.replay_group(self.personal_group)
 
     async def disconnect(self, close_code):
         if hasattr(self, "group_name"):
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
         if hasattr(self, "personal_group"):
             await self.channel_layer.group_discard(self.personal_group, self.channel_name)
+            await self.channel_layer.group_discard(DRIVER_BOARD_GROUP, self.channel_name)
+        await super().disconnect(close_code)
 
     async def new_offer(self, event):
         await self.send_json({"type": "new_offer", "offer": event["data"]})
@@ -83,3 +112,6 @@ class RiderConsumer(AsyncJsonWebsocketConsumer):
 
     async def ride_completed(self, event):
         await self.send_json({"type": "ride_completed", "data": event["data"]})
+
+    async def ride_expired(self, event):
+        await self.send_json({"type": "ride_expired", "data": event["data"]})
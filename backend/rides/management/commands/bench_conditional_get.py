@@ -0,0 +1,70 @@
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from accounts.models import User, DriverProfile, RiderProfile
+from ride_project.benchmarking import percentile
+from rides.models import RideRequest, RideOffer
+from rides.views import ActiveRideView, RideRequestDetailView
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the cost of polling the active-ride and ride-detail endpoints with and without "
+        "If-None-Match (full response vs 304). Runs against the configured database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--polls", type=int, default=2000)
+        parser.add_argument("--offers", type=int, default=5, help="Offers on the polled ride")
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        rider = User.objects.create(email=f"rider@polling-{tag}.invalid", full_name="Rider", role="rider")
+        drivers = User.objects.bulk_create(
+            [User(email=f"driver{i}@polling-{tag}.invalid", full_name="Driver", role="driver") for i in range(options["offers"])]
+        )
+        try:
+            RiderProfile.objects.create(user=rider)
+            DriverProfile.objects.bulk_create([DriverProfile(user=u) for u in drivers])
+            ride = RideRequest.objects.create(
+                rider=rider, status="offered",
+                pickup_city="San Francisco", pickup_state="CA", pickup_lat="37.774900", pickup_lng="-122.419400",
+                dropoff_city="Oakland", dropoff_state="CA", dropoff_lat="37.804400", dropoff_lng="-122.271100",
+                distance_miles="8.00", suggested_price="4.00",
+            )
+            RideOffer.objects.bulk_create([RideOffer(ride_request=ride, driver=d, price="5.00") for d in drivers])
+
+            endpoints = [
+                ("active", ActiveRideView.as_view(), "/api/rides/active/", {}),
+                ("detail", RideRequestDetailView.as_view(), f"/api/rides/request/{ride.pk}/", {"pk": ride.pk}),
+            ]
+            for label, view, path, kwargs in endpoints:
+                etag = self.poll(view, path, kwargs, rider)["ETag"]
+                for mode, headers in (("full", {}), ("304", {"HTTP_IF_NONE_MATCH": etag})):
+                    timings, queries = [], []
+                    with connection.execute_wrapper(lambda execute, *args: queries.append(1) or execute(*args)):
+                        for _ in range(options["polls"]):
+                            started = time.perf_counter()
+                            self.poll(view, path, kwargs, rider, **headers)
+                            timings.append((time.perf_counter() - started) * 1_000_000)
+                    timings.sort()
+                    self.stdout.write(
+                        f"{label:>6} {mode:>4}: p50={statistics.median(timings):7.1f}us "
+                        f"p95={percentile(timings, 0.95):7.1f}us "
+                        f"queries/poll={len(queries) / options['polls']:.1f}"
+                    )
+        finally:
+            User.objects.filter(email__endswith=f"@polling-{tag}.invalid").delete()
+
+    def poll(self, view, path, kwargs, user, **headers):
+        request = APIRequestFactory().get(path, **headers)
+        force_authenticate(request, user=user)
+        response = view(request, **kwargs)
+        if hasattr(response, "render"):
+            response.render()  # 304s come back from django's condition() already complete
+        return response
@@ -0,0 +1,61 @@
+import json
+import os
+import random
+import statistics
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ride_project.benchmarking import percentile
+from rides.broadcast import driver_cell_for, driver_cell_group, driver_groups_for_pickup
+
+
+class Command(BaseCommand):
+    help = "Compare WebSocket messages per ride request: global driver broadcast vs geohash cells"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--drivers", type=int, default=5000)
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument("--radius", type=int, default=settings.RIDE_BROADCAST_RADIUS_MILES)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        data_path = os.path.join(os.path.dirname(__file__), "..", "..", "..", "locations", "data", "us_cities.json")
+        with open(os.path.abspath(data_path), "r") as f:
+            cities = json.load(f)
+
+        rng = random.Random(options["seed"])
+        weights = [max(c.get("population", 0), 1) for c in cities]
+
+        def random_point():
+            # Population-weighted city with ~5 miles of jitter
+            city = rng.choices(cities, weights=weights)[0]
+            return city["lat"] + rng.uniform(-0.07, 0.07), city["lng"] + rng.uniform(-0.07, 0.07)
+
+        drivers_per_group = {}
+        for _ in range(options["drivers"]):
+            group = driver_cell_group(driver_cell_for(*random_point()))
+            drivers_per_group[group] = drivers_per_group.get(group, 0) + 1
+
+        global_messages = options["drivers"]
+        geo_messages = []
+        groups_per_request = []
+        for _ in range(options["requests"]):
+            groups = driver_groups_for_pickup(*random_point(), options["radius"])
+            groups_per_request.append(len(groups))
+            geo_messages.append(sum(drivers_per_group.get(g, 0) for g in groups))
+
+        geo_messages.sort()
+        p95 = percentile(geo_messages, 0.95)
+        mean = statistics.mean(geo_messages)
+
+        self.stdout.write(
+            f"drivers={options['drivers']} requests={options['requests']} radius={options['radius']}mi "
+            f"precision={settings.RIDE_BROADCAST_GEOHASH_PRECISION}"
+        )
+        self.stdout.write(f"global broadcast: {global_messages} messages/request")
+        self.stdout.write(
+            f"geohash cells:    mean={mean:.1f} p95={p95} max={geo_messages[-1]} messages/request, "
+            f"mean {statistics.mean(groups_per_request):.1f} group_send calls/request"
+        )
+        self.stdout.write(self.style.SUCCESS(f"fan-out reduced {global_messages / max(mean, 1):.1f}x"))
@@ -0,0 +1,59 @@
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from rides.utils import (
+    calculate_suggested_price,
+    calculate_suggested_price_batch,
+    haversine_miles,
+    haversine_miles_batch,
+)
+
+
+class Command(BaseCommand):
+    help = "Compare the scalar haversine_miles/calculate_suggested_price loop with the NumPy batch versions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1_000, 100_000])
+        parser.add_argument("--repeat", type=int, default=5, help="Best of this many runs is reported")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        for size in options["sizes"]:
+            # Trips within the continental US, coordinates at the precision the models store
+            pairs = [
+                [round(rng.uniform(25, 49), 6), round(rng.uniform(-124, -67), 6),
+                 round(rng.uniform(25, 49), 6), round(rng.uniform(-124, -67), 6)]
+                for _ in range(size)
+            ]
+            columns = np.array(pairs).T
+
+            def scalar():
+                distances = [haversine_miles(*pair) for pair in pairs]
+                return distances, [calculate_suggested_price(d) for d in distances]
+
+            def batch():
+                distances = haversine_miles_batch(*columns)
+                return distances, calculate_suggested_price_batch(distances)
+
+            scalar_s, (distances, prices) = self.best_of(scalar, options["repeat"])
+            batch_s, (batch_distances, batch_cents) = self.best_of(batch, options["repeat"])
+
+            if distances != batch_distances.tolist() or [int(p * 100) for p in prices] != batch_cents.tolist():
+                raise CommandError(f"batch results differ from the scalar functions at {size} pairs")
+            self.stdout.write(
+                f"{size:>8} pairs: scalar {scalar_s * 1000:9.3f}ms  batch {batch_s * 1000:8.3f}ms  "
+                f"{scalar_s / batch_s:6.1f}x  (results identical to the cent)"
+            )
+
+    def best_of(self, fn, repeat):
+        best, result = None, None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
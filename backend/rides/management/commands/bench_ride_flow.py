@@ -0,0 +1,235 @@
+import asyncio
+import json
+import time
+import uuid
+from collections import defaultdict
+
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from accounts.presence import presence
+from notifications.models import OutboxEvent
+from notifications.outbox import dispatcher
+from ride_project.benchmarking import percentile
+from rides.management.asgi_client import ASGIClient
+from rides.testing import RIDE_PAYLOAD
+
+PASSWORD = "bench-flow-password"
+STEPS = [
+    "register", "login", "create", "ws_new_ride_request", "offer", "ws_new_offer",
+    "accept", "ws_offer_accepted", "complete", "ws_ride_completed", "pending_ratings", "rate",
+]
+
+
+class Inbox:
+    """Reads one WebSocket and records when each message arrived, keyed by (type, ride id)."""
+
+    def __init__(self, communicator):
+        self.communicator = communicator
+        self.arrivals = {}
+        self.events = defaultdict(asyncio.Event)
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.read())
+
+    async def read(self):
+        while True:
+            message = await self.communicator.receive_json_from(timeout=3600)
+            ride = message.get("ride_request") or message.get("offer") or message.get("data") or {}
+            key = (message["type"], str(ride.get("ride_request") or ride.get("id") or ""))
+            self.arrivals.setdefault(key, time.perf_counter())
+            self.events[key].set()
+
+    async def wait(self, message_type, ride_id, timeout):
+        key = (message_type, str(ride_id))
+        try:
+            await asyncio.wait_for(self.events[key].wait(), timeout)
+        except asyncio.TimeoutError:
+            raise CommandError(f"{message_type} for ride {ride_id} was not delivered within {timeout}s")
+        return self.arrivals[key]
+
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+        await self.communicator.disconnect()
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the full ride flow for N riders and M drivers through the ASGI application in this process: "
+        "register and log in over HTTP, drivers on DriverConsumer and riders on RiderConsumer, then "
+        "create, offer, accept, complete and rate. Reports p50/p95/p99 per step, including the time from "
+        "the HTTP request to WebSocket delivery (ws_* steps). Runs against the configured database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--riders", type=int, default=50, help="One ride flow per rider")
+        parser.add_argument("--drivers", type=int, default=10)
+        parser.add_argument("--concurrency", type=int, default=10)
+        parser.add_argument("--timeout", type=float, default=10.0, help="Seconds to wait for a WebSocket message")
+        parser.add_argument("--json", metavar="PATH", help="Also write the results as JSON to PATH ('-' for stdout)")
+
+    def handle(self, *args, **options):
+        from ride_project.asgi import application
+
+        self.application = application
+        self.client = ASGIClient(application)
+        self.latencies = defaultdict(list)
+        self.errors = []
+        self.tag = uuid.uuid4().hex[:8]
+        first_event_id = OutboxEvent.objects.order_by("-id").values_list("id", flat=True).first() or 0
+
+        try:
+            began = time.perf_counter()
+            completed = async_to_sync(self.run)(options)
+            elapsed = time.perf_counter() - began
+        finally:
+            dispatcher.stop()
+            presence.stop()
+            presence.clear()
+            OutboxEvent.objects.filter(pk__gt=first_event_id, dispatched_at__isnull=False).delete()
+            User.objects.filter(email__endswith=f"@flow-{self.tag}.invalid").delete()
+
+        requests = sum(len(self.latencies[step]) for step in STEPS if not step.startswith("ws_"))
+        results = {
+            "options": {key: options[key] for key in ("riders", "drivers", "concurrency")},
+            "flows": options["riders"],
+            "completed": completed,
+            "errors": self.errors,
+            "elapsed_seconds": round(elapsed, 3),
+            "requests_per_second": round(requests / elapsed, 1),
+            "steps": {step: self.summary(self.latencies[step]) for step in STEPS if self.latencies[step]},
+        }
+
+        if options["json"] == "-":
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        if options["json"]:
+            with open(options["json"], "w") as f:
+                json.dump(results, f, indent=2)
+
+        self.stdout.write(
+            f"{completed}/{options['riders']} flows with {options['drivers']} drivers at concurrency "
+            f"{options['concurrency']} in {elapsed:.2f}s ({results['requests_per_second']:.0f} HTTP req/s)"
+        )
+        for step, summary in results["steps"].items():
+            self.stdout.write(
+                f"{step:>20}: p50={summary['p50_ms']:7.1f}ms p95={summary['p95_ms']:7.1f}ms "
+                f"p99={summary['p99_ms']:7.1f}ms max={summary['max_ms']:7.1f}ms (n={summary['count']})"
+            )
+        for error in self.errors[:5]:
+            self.stderr.write(error)
+
+    @staticmethod
+    def summary(latencies):
+        latencies = sorted(latencies)
+        return {
+            "count": len(latencies),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "max_ms": round(latencies[-1] * 1000, 2),
+        }
+
+    async def run(self, options):
+        semaphore = asyncio.Semaphore(options["concurrency"])
+        self.timeout = options["timeout"]
+
+        async def limited(coroutine):
+            async with semaphore:
+                return await coroutine
+
+        drivers = await asyncio.gather(*(limited(self.sign_up("driver", i)) for i in range(options["drivers"])))
+        riders = await asyncio.gather(*(limited(self.sign_up("rider", i)) for i in range(options["riders"])))
+
+        inboxes = []
+        try:
+            for token in drivers:
+                inboxes.append(await self.connect(f"/ws/rides/driver/?token={token}", {
+                    "type": "update_location", "lat": 37.7749, "lng": -122.4194,
+                }))
+
+            async def flow(i):
+                try:
+                    await self.flow(riders[i], drivers[i % len(drivers)], inboxes[i % len(drivers)])
+                    return True
+                except CommandError as e:
+                    self.errors.append(f"flow {i}: {e}")
+                    return False
+
+            return sum(await asyncio.gather(*(limited(flow(i)) for i in range(len(riders)))))
+        finally:
+            for inbox in inboxes:
+                await inbox.close()
+
+    async def sign_up(self, role, i):
+        email = f"{role}{i}@flow-{self.tag}.invalid"
+        body = {
+            "email": email, "full_name": f"Flow {role.title()} {i}", "phone_number": "555-0100",
+            "role": role, "password": PASSWORD, "password_confirm": PASSWORD,
+        }
+        if role == "driver":
+            body.update(vehicle_make="Honda", vehicle_model="Civic", vehicle_year=2020, license_plate=f"FLOW{i}")
+        await self.call("register", "POST", "/api/auth/register/", None, body, 201)
+        data = await self.call("login", "POST", "/api/auth/login/", None, {"email": email, "password": PASSWORD}, 200)
+        return data["tokens"]["access"]
+
+    async def connect(self, path, first_message=None):
+        communicator = WebsocketCommunicator(self.application, path)
+        connected, _ = await communicator.connect()
+        if not connected:
+            raise CommandError(f"WebSocket {path.split('?')[0]} was rejected")
+        if first_message:
+            await communicator.send_json_to(first_message)
+        # The pong comes back once everything sent before it has been handled
+        await communicator.send_json_to({"type": "ping"})
+        while (await communicator.receive_json_from(timeout=self.timeout))["type"] != "pong":
+            pass
+        inbox = Inbox(communicator)
+        inbox.start()
+        return inbox
+
+    async def flow(self, rider, driver, driver_inbox):
+        sent = time.perf_counter()
+        ride = await self.call("create", "POST", "/api/rides/request/", rider, RIDE_PAYLOAD, 201)
+        self.delivered("ws_new_ride_request", sent, await driver_inbox.wait("new_ride_request", ride["id"], self.timeout))
+
+        rider_inbox = await self.connect(f"/ws/rides/rider/{ride['id']}/?token={rider}")
+        try:
+            sent = time.perf_counter()
+            offer = await self.call(
+                "offer", "POST", "/api/rides/offer/", driver,
+                {"ride_request": ride["id"], "price": "5.00", "estimated_arrival_minutes": 5}, 201,
+            )
+            self.delivered("ws_new_offer", sent, await rider_inbox.wait("new_offer", ride["id"], self.timeout))
+
+            sent = time.perf_counter()
+            await self.call("accept", "POST", "/api/rides/accept-offer/", rider, {"offer_id": offer["id"]}, 200)
+            self.delivered("ws_offer_accepted", sent, await driver_inbox.wait("offer_accepted", ride["id"], self.timeout))
+
+            sent = time.perf_counter()
+            await self.call("complete", "POST", f"/api/rides/complete/{ride['id']}/", driver, {}, 200)
+            self.delivered("ws_ride_completed", sent, await rider_inbox.wait("ride_completed", ride["id"], self.timeout))
+        finally:
+            await rider_inbox.close()
+
+        pending = await self.call("pending_ratings", "GET", "/api/rides/pending-ratings/", rider, None, 200)
+        completed_ride = next((c for c in pending if c["ride_request"]["id"] == ride["id"]), None)
+        if completed_ride is None:
+            raise CommandError(f"ride {ride['id']} is not waiting for a rating")
+        await self.call("rate", "POST", "/api/rides/rate/", rider, {"ride_id": completed_ride["id"], "rating": 5}, 200)
+
+    def delivered(self, step, sent, arrived):
+        # Messages can arrive before the HTTP response does; both are measured from the request
+        self.latencies[step].append(arrived - sent)
+
+    async def call(self, step, method, path, token, body, expected_status):
+        started = time.perf_counter()
+        status, data = await self.client.request(method, path, token, body)
+        self.latencies[step].append(time.perf_counter() - started)
+        if status != expected_status:
+            raise CommandError(f"{method} {path} returned {status}: {str(data)[:200]}")
+        return data
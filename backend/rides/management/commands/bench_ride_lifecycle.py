@@ -0,0 +1,135 @@
+import asyncio
+import statistics
+import time
+import uuid
+from collections import defaultdict
+
+from asgiref.sync import SyncToAsync, async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import User, DriverProfile, RiderProfile
+from notifications.models import OutboxEvent
+from notifications.outbox import dispatcher
+from ride_project.benchmarking import percentile
+from rides.management.asgi_client import ASGIClient
+from rides.testing import RIDE_PAYLOAD
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive create/offer/accept/complete and create/offer/cancel flows through the ASGI application "
+        "in this process (one worker) and report throughput, latency per endpoint, sync_to_async thread hops "
+        "and the time spent on sync threads. The sync mode serves the same endpoints from sync APIViews "
+        "(rides.management.sync_baseline) as a baseline. Runs against the configured database."
+    )
+
+    MODES = {
+        "sync": ("sync APIView baseline", "rides.management.sync_baseline"),
+        "async": ("async views", None),
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument("--flows", type=int, default=200, help="Ride lifecycles; every other one is cancelled")
+        parser.add_argument("--concurrency", type=int, default=20)
+        parser.add_argument("--drivers", type=int, default=20)
+        parser.add_argument("--mode", choices=[*self.MODES, "both"], default="both")
+
+    def handle(self, *args, **options):
+        from ride_project.asgi import application
+
+        tag = uuid.uuid4().hex[:8]
+        riders = User.objects.bulk_create(
+            [User(email=f"rider{i}@lifecycle-{tag}.invalid", full_name="Rider", role="rider") for i in range(options["flows"])]
+        )
+        drivers = User.objects.bulk_create(
+            [User(email=f"driver{i}@lifecycle-{tag}.invalid", full_name="Driver", role="driver") for i in range(options["drivers"])]
+        )
+        RiderProfile.objects.bulk_create([RiderProfile(user=u) for u in riders])
+        DriverProfile.objects.bulk_create([DriverProfile(user=u) for u in drivers])
+        rider_tokens = [str(AccessToken.for_user(u)) for u in riders]
+        driver_tokens = [str(AccessToken.for_user(u)) for u in drivers]
+        first_event_id = OutboxEvent.objects.order_by("-id").values_list("id", flat=True).first() or 0
+
+        self.client = ASGIClient(application)
+        modes = list(self.MODES) if options["mode"] == "both" else [options["mode"]]
+        try:
+            for mode in modes:
+                label, urlconf = self.MODES[mode]
+                with override_settings(ROOT_URLCONF=urlconf or settings.ROOT_URLCONF):
+                    elapsed = self.measure(application, rider_tokens, driver_tokens, options["concurrency"])
+                self.report(label, options, elapsed)
+        finally:
+            dispatcher.stop()
+            OutboxEvent.objects.filter(pk__gt=first_event_id, dispatched_at__isnull=False).delete()
+            User.objects.filter(email__endswith=f"@lifecycle-{tag}.invalid").delete()
+
+    def measure(self, application, rider_tokens, driver_tokens, concurrency):
+        self.latencies = defaultdict(list)
+        self.hops = []
+        original_handler = SyncToAsync.thread_handler
+
+        def timed_handler(sync_to_async, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return original_handler(sync_to_async, *args, **kwargs)
+            finally:
+                self.hops.append(time.perf_counter() - started)
+
+        SyncToAsync.thread_handler = timed_handler
+        try:
+            began = time.perf_counter()
+            async_to_sync(self.run)(application, rider_tokens, driver_tokens, concurrency)
+            return time.perf_counter() - began
+        finally:
+            SyncToAsync.thread_handler = original_handler
+
+    def report(self, label, options, elapsed):
+        requests = sum(len(v) for v in self.latencies.values())
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(
+            f"{options['flows']} flows, {requests} requests at concurrency {options['concurrency']} in {elapsed:.2f}s: "
+            f"{requests / elapsed:.0f} req/s, {len(self.hops) / requests:.1f} sync_to_async hops and "
+            f"{sum(self.hops) / requests * 1000:.1f}ms on sync threads per request "
+            f"({sum(self.hops) / elapsed:.0%} of wall time)"
+        )
+        for endpoint, latencies in self.latencies.items():
+            latencies.sort()
+            self.stdout.write(
+                f"{endpoint:>22}: p50={statistics.median(latencies) * 1000:.1f}ms "
+                f"p95={percentile(latencies, 0.95) * 1000:.1f}ms"
+            )
+
+    async def run(self, application, rider_tokens, driver_tokens, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def flow(i):
+            async with semaphore:
+                await self.flow(application, i, rider_tokens[i], driver_tokens[i % len(driver_tokens)])
+
+        await asyncio.gather(*(flow(i) for i in range(len(rider_tokens))))
+
+    async def flow(self, application, i, rider, driver):
+        ride = await self.call(application, "create", "POST", "/api/rides/request/", rider, RIDE_PAYLOAD, 201)
+        offer = await self.call(
+            application, "offer", "POST", "/api/rides/offer/", driver,
+            {"ride_request": ride["id"], "price": "5.00", "estimated_arrival_minutes": 5}, 201,
+        )
+        if i % 2:
+            await self.call(
+                application, "cancel", "PATCH", f"/api/rides/request/{ride['id']}/update/", rider,
+                {"status": "cancelled"}, 200,
+            )
+            return
+        await self.call(application, "accept", "POST", "/api/rides/accept-offer/", rider, {"offer_id": offer["id"]}, 200)
+        await self.call(application, "complete", "POST", f"/api/rides/complete/{ride['id']}/", driver, {}, 200)
+
+    async def call(self, application, endpoint, method, path, token, body, expected_status):
+        started = time.perf_counter()
+        status, data = await self.client.request(method, path, token, body)
+        self.latencies[endpoint].append(time.perf_counter() - started)
+        if status != expected_status:
+            raise CommandError(f"{method} {path} returned {status}: {str(data)[:200]}")
+        return data
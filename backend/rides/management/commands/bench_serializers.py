@@ -0,0 +1,97 @@
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from accounts.cards import driver_card_cache
+from accounts.models import User, DriverProfile, RiderProfile
+from rides.models import RideRequest, RideOffer, CompletedRide
+from rides.serializers import (
+    CompletedRideSerializer,
+    RideOfferSerializer,
+    RideRequestSerializer,
+    fast_completed_rides,
+    fast_ride_offers,
+    fast_ride_requests,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare list serialization: DRF serializers over model instances vs the .values() fast path "
+        "(query + serialize + render, ms per 1k rows, best of --repeat). Runs against the configured database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=2000, help="Ride requests to seed (2 offers each)")
+        parser.add_argument("--drivers", type=int, default=50)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        tag = uuid.uuid4().hex[:8]
+        riders = User.objects.bulk_create(
+            [User(email=f"rider{i}@serializers-{tag}.invalid", full_name="Rider", role="rider") for i in range(50)]
+        )
+        drivers = User.objects.bulk_create(
+            [User(email=f"driver{i}@serializers-{tag}.invalid", full_name="Driver", role="driver") for i in range(options["drivers"])]
+        )
+        try:
+            RiderProfile.objects.bulk_create([RiderProfile(user=u) for u in riders])
+            DriverProfile.objects.bulk_create(
+                [DriverProfile(user=u, vehicle_make="Honda", vehicle_model="Civic", vehicle_year=2020) for u in drivers]
+            )
+            rides = RideRequest.objects.bulk_create([
+                RideRequest(
+                    rider=rng.choice(riders), status="completed",
+                    pickup_city="San Francisco", pickup_state="CA", pickup_lat="37.774900", pickup_lng="-122.419400",
+                    dropoff_city="Oakland", dropoff_state="CA", dropoff_lat="37.804400", dropoff_lng="-122.271100",
+                    distance_miles="8.00", suggested_price="4.00",
+                )
+                for _ in range(options["rows"])
+            ])
+            RideOffer.objects.bulk_create([
+                RideOffer(ride_request=ride, driver=driver, price="5.00")
+                for ride in rides for driver in rng.sample(drivers, 2)
+            ])
+            CompletedRide.objects.bulk_create([
+                CompletedRide(
+                    ride_request=ride, driver=rng.choice(drivers), rider=ride.rider,
+                    final_price="5.00", distance_miles="8.00",
+                )
+                for ride in rides
+            ])
+
+            ride_ids = [ride.pk for ride in rides]
+            cases = [
+                ("requests", RideRequestSerializer, fast_ride_requests,
+                 RideRequest.objects.filter(pk__in=ride_ids).for_listing()),
+                ("offers", RideOfferSerializer, fast_ride_offers,
+                 RideOffer.objects.filter(ride_request_id__in=ride_ids).for_listing()),
+                ("history", CompletedRideSerializer, fast_completed_rides,
+                 CompletedRide.objects.filter(ride_request_id__in=ride_ids).for_listing()),
+            ]
+            renderer = JSONRenderer()
+            for label, serializer_class, fast, queryset in cases:
+                rows = queryset.count()
+                drf = self.best(options["repeat"], lambda: renderer.render(serializer_class(queryset.all(), many=True).data))
+                values = self.best(options["repeat"], lambda: renderer.render(fast.serialize(fast.values(queryset.all()))))
+                self.stdout.write(
+                    f"{label:>8} ({rows} rows): drf={drf / rows * 1_000_000:7.1f}ms/1k "
+                    f"fast={values / rows * 1_000_000:7.1f}ms/1k ({drf / values:.1f}x)"
+                )
+        finally:
+            driver_card_cache.clear()
+            User.objects.filter(email__endswith=f"@serializers-{tag}.invalid").delete()
+
+    def best(self, repeat, fn):
+        fn()  # warm the driver card cache
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
@@ -0,0 +1,205 @@
+import random
+import statistics
+from collections import Counter
+from types import SimpleNamespace
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.models import User
+from ride_project.benchmarking import percentile
+from ride_project.pagination import KeysetPagination
+from rides.models import RideRequest, RideOffer, CompletedRide
+from rides.views import AdminRidesView, ListRideRequestsView, PendingRatingsView, active_rides
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a large ride dataset inside a transaction, print EXPLAIN output and timings "
+        "for the ride state-machine queries, then roll the data back. Fails when a plan "
+        "scans a whole table or sorts outside an index"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--riders", type=int, default=2000)
+        parser.add_argument("--drivers", type=int, default=500)
+        parser.add_argument("--requests", type=int, default=100_000)
+        parser.add_argument("--runs", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--keep", action="store_true", help="Commit the seeded rows instead of rolling back")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Database vendor: {connection.vendor}")
+        flagged = []
+        with transaction.atomic():
+            rider, driver, board_driver, admin = self.seed(options)
+            self.analyze()
+            for label, queryset, evaluate in self.hot_queries(rider, driver, board_driver, admin):
+                if self.report(label, queryset, evaluate, options["runs"]):
+                    flagged.append(label)
+            if not options["keep"]:
+                transaction.set_rollback(True)
+        if flagged:
+            raise CommandError(f"{len(flagged)} hot queries scan a whole table or sort: {', '.join(flagged)}")
+
+    def seed(self, options):
+        rng = random.Random(options["seed"])
+        started = time.perf_counter()
+
+        def users(role, count):
+            return User.objects.bulk_create(
+                [
+                    User(
+                        email=f"{role}-{uuid.uuid4().hex[:12]}@seed.invalid",
+                        full_name=f"Seed {role.title()} {i}",
+                        phone_number="555-0100",
+                        role=role,
+                        password="!",
+                    )
+                    for i in range(count)
+                ],
+                batch_size=1000,
+            )
+
+        riders = users("rider", options["riders"])
+        drivers = users("driver", options["drivers"])
+
+        # Most rides are finished; the open and in-flight ones are the hot minority
+        statuses = ["completed"] * 70 + ["cancelled"] * 15 + ["pending"] * 6 + ["offered"] * 5 + ["accepted"] * 4
+        now = timezone.now()
+        requests, created, offers, completed = [], [], [], []
+        for i in range(options["requests"]):
+            created_at = now - timedelta(minutes=options["requests"] - i)
+            ride = RideRequest(
+                rider=rng.choice(riders),
+                pickup_city="Seed", pickup_state="CA", pickup_lat=Decimal("37.774900"), pickup_lng=Decimal("-122.419400"),
+                dropoff_city="Seed", dropoff_state="CA", dropoff_lat=Decimal("37.804400"), dropoff_lng=Decimal("-122.271100"),
+                distance_miles=Decimal("8.00"), suggested_price=Decimal("4.00"),
+                time_type="immediate", status=rng.choice(statuses),
+            )
+            requests.append(ride)
+            created.append(created_at)
+            if ride.status in ("pending", "cancelled"):
+                continue
+
+            # UUID keys are assigned up front, so the accepted_offer cycle can be
+            # built in memory; FK checks are deferred to the end of the transaction.
+            driver = rng.choice(drivers)
+            accepted = ride.status in ("accepted", "completed")
+            offer = RideOffer(
+                ride_request=ride, driver=driver, price=Decimal("5.00"),
+                status="accepted" if accepted else "pending",
+            )
+            offers.append(offer)
+            if not accepted:
+                continue
+            ride.accepted_offer = offer
+            finished = ride.status == "completed"
+            completed.append(
+                CompletedRide(
+                    ride_request=ride, driver=driver, rider=ride.rider, final_price=Decimal("5.00"),
+                    distance_miles=Decimal("8.00"), pickup_time=created_at,
+                    dropoff_time=created_at if finished else None,
+                    driver_rating=rng.choice([None, None, 3, 4, 5]) if finished else None,
+                )
+            )
+
+        RideRequest.objects.bulk_create(requests, batch_size=1000)
+        RideOffer.objects.bulk_create(offers, batch_size=1000)
+        CompletedRide.objects.bulk_create(completed, batch_size=1000)
+        # created_at is auto_now_add, so bulk_create stored now(); spread the rows out afterwards
+        for ride, created_at in zip(requests, created):
+            ride.created_at = created_at
+        RideRequest.objects.bulk_update(requests, ["created_at"], batch_size=1000)
+        CompletedRide.objects.filter(driver__in=drivers).update(created_at=F("pickup_time"))
+
+        self.stdout.write(
+            f"Seeded {len(riders)} riders, {len(drivers)} drivers, {len(requests)} requests, "
+            f"{len(offers)} offers, {len(completed)} completed rides in {time.perf_counter() - started:.1f}s\n"
+        )
+        # Explain against the heaviest users, where a missing index hurts most
+        if not completed:
+            # Rolled back with the rest of the seed by handle()'s transaction
+            raise CommandError(
+                f"--requests {options['requests']} seeded no completed rides, so the per-rider and "
+                "per-driver queries have no one to run against; seed more requests"
+            )
+        busiest_rider = Counter(ride.rider for ride in requests).most_common(1)[0][0]
+        busiest_driver = Counter(ride.driver for ride in completed).most_common(1)[0][0]
+        admin = User(email=f"admin-{uuid.uuid4().hex[:12]}@seed.invalid", full_name="Seed Admin", role="admin")
+        return busiest_rider, busiest_driver, drivers[0], admin
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                for table in ("users", "ride_requests", "ride_offers", "completed_rides"):
+                    cursor.execute(f"ANALYZE {table}")
+            else:
+                cursor.execute("ANALYZE")
+
+    def page(self, view_class, user, middle=False):
+        """A page of a keyset-paginated list, built as the view and KeysetPagination build it.
+        With `middle`, the page starts halfway down the list, as a later page does."""
+        view = view_class(request=SimpleNamespace(user=user))
+        queryset = view.get_queryset()
+        cursor = None
+        if middle:
+            keys = queryset.order_by("-created_at", "-pk").values_list("created_at", "pk")
+            cursor = keys[keys.count() // 2]
+        if settings.API_FAST_SERIALIZERS and getattr(view, "fast_serializer", None):
+            queryset = view.fast_serializer.values(queryset)
+        return KeysetPagination().after(queryset, cursor)[: settings.API_PAGE_SIZE + 1]
+
+    def hot_queries(self, rider, driver, board_driver, admin):
+        yield "driver board, first page", self.page(ListRideRequestsView, board_driver), list
+        yield "driver board, later page", self.page(ListRideRequestsView, board_driver, middle=True), list
+        yield "rider ride list, later page", self.page(ListRideRequestsView, rider, middle=True), list
+        yield "admin ride list, later page", self.page(AdminRidesView, admin, middle=True), list
+        yield "ActiveRideView rider", active_rides(rider).for_listing()[:1], list
+        yield "ActiveRideView driver", active_rides(driver).for_listing()[:1], list
+        pending = PendingRatingsView(request=SimpleNamespace(user=rider)).get_queryset()
+        yield "PendingRatingsView", pending, list
+
+    def plan_problems(self, plan):
+        """Lines of an EXPLAIN plan that read a whole table or sort rows outside an index."""
+        problems = []
+        for line in plan.splitlines():
+            if connection.vendor == "sqlite":
+                # explain() prints "<id> <parent> <notused> <detail>"
+                detail = line.split(" ", 3)[-1]
+                full_scan = detail.startswith("SCAN ") and " USING " not in detail
+                sort = "TEMP B-TREE" in detail
+            else:
+                detail = line.strip().removeprefix("->").strip()
+                full_scan = detail.startswith("Seq Scan")
+                sort = detail.startswith(("Sort ", "Incremental Sort "))
+            if full_scan or sort:
+                problems.append(detail)
+        return problems
+
+    def report(self, label, queryset, evaluate, runs):
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            evaluate(queryset._chain())
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+
+        plan = queryset.explain()
+        problems = self.plan_problems(plan)
+        self.stdout.write(self.style.MIGRATE_HEADING(label))
+        self.stdout.write(plan)
+        for problem in problems:
+            self.stdout.write(self.style.WARNING(f"  full scan or sort: {problem}"))
+        self.stdout.write(
+            f"  median={statistics.median(timings):.3f}ms p95={percentile(timings, 0.95):.3f}ms "
+            f"({runs} runs)\n"
+        )
+        return bool(problems)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from rides.models import RideRequest, inlined_all
+from rides.scheduler import scheduler
+from rides.sync import BOARD_STATUSES
+
+
+class Command(BaseCommand):
+    help = "Report rides held for their window or due to expire (rides.scheduler)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--run", action="store_true", help="Release and expire due rides first (e.g. from cron under WSGI)"
+        )
+
+    def handle(self, *args, **options):
+        if options["run"]:
+            scheduler.run_due()
+            stats = scheduler.stats()
+            self.stdout.write(f"released {stats['released']}, expired {stats['expired']}")
+
+        now = timezone.now()
+        open_rides = RideRequest.objects.filter(status__in=inlined_all(*BOARD_STATUSES))
+        held = open_rides.filter(release_at__isnull=False).aggregate(count=Count("id"), next=Min("release_at"))
+        closing = open_rides.filter(expires_at__isnull=False).aggregate(count=Count("id"), next=Min("expires_at"))
+        for label, row in (("held", held), ("with a window", closing)):
+            due = "-" if row["next"] is None else f"{(row['next'] - now).total_seconds():.0f}s"
+            self.stdout.write(f"{label}: {row['count']} (next due in {due})")
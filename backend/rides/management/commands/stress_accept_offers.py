@@ -0,0 +1,143 @@
+import logging
+import random
+import statistics
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from rest_framework.test import APIClient
+
+from accounts.models import User, DriverProfile, RiderProfile
+from ride_project.benchmarking import percentile
+from rides.models import RideRequest, RideOffer, CompletedRide
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire parallel offer accepts and ride cancels at the same rides and check that exactly one "
+        "transition wins per ride; reports throughput. Runs against the configured database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rides", type=int, default=20)
+        parser.add_argument("--offers", type=int, default=10, help="Competing driver offers (and accepts) per ride")
+        parser.add_argument("--cancels", type=int, default=5, help="Concurrent cancel attempts per ride")
+        parser.add_argument("--threads", type=int, default=32)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--keep", action="store_true", help="Keep the generated users and rides")
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        riders, drivers, rides, offers_by_ride = self.seed(tag, options)
+        try:
+            results = self.fire(riders, rides, offers_by_ride, options)
+            self.verify(rides, results)
+        finally:
+            if not options["keep"]:
+                User.objects.filter(email__endswith=f"@stress-{tag}.invalid").delete()
+
+    def seed(self, tag, options):
+        def user(role, i):
+            return User.objects.create_user(f"{role}{i}@stress-{tag}.invalid", f"Stress {role} {i}", "555-0100", role)
+
+        drivers = [user("driver", i) for i in range(options["offers"])]
+        DriverProfile.objects.bulk_create([DriverProfile(user=d) for d in drivers])
+        riders, rides, offers_by_ride = [], [], {}
+        for i in range(options["rides"]):
+            rider = user("rider", i)
+            RiderProfile.objects.create(user=rider)
+            ride = RideRequest.objects.create(
+                rider=rider,
+                pickup_city="Stress", pickup_state="CA", pickup_lat=Decimal("37.774900"), pickup_lng=Decimal("-122.419400"),
+                dropoff_city="Stress", dropoff_state="CA", dropoff_lat=Decimal("37.804400"), dropoff_lng=Decimal("-122.271100"),
+                distance_miles=Decimal("8.00"), suggested_price=Decimal("4.00"), time_type="immediate", status="offered",
+            )
+            offers_by_ride[ride.pk] = RideOffer.objects.bulk_create(
+                [RideOffer(ride_request=ride, driver=d, price=Decimal("5.00") + j) for j, d in enumerate(drivers)]
+            )
+            riders.append(rider)
+            rides.append(ride)
+        return riders, drivers, rides, offers_by_ride
+
+    def fire(self, riders, rides, offers_by_ride, options):
+        tasks = []
+        for rider, ride in zip(riders, rides):
+            tasks += [("accept", rider, ride, offer) for offer in offers_by_ride[ride.pk]]
+            tasks += [("cancel", rider, ride, None)] * options["cancels"]
+        random.Random(options["seed"]).shuffle(tasks)
+
+        start = threading.Barrier(min(options["threads"], len(tasks)))
+        latencies = []
+        host = next((h for h in settings.ALLOWED_HOSTS if h != "*" and not h.startswith(".")), "localhost")
+
+        def run(task):
+            kind, rider, ride, offer = task
+            client = APIClient(SERVER_NAME=host)
+            client.force_authenticate(rider)
+            try:
+                start.wait(timeout=5)
+            except threading.BrokenBarrierError:
+                pass
+            started = time.perf_counter()
+            try:
+                if kind == "accept":
+                    response = client.post("/api/rides/accept-offer/", {"offer_id": str(offer.pk)})
+                else:
+                    response = client.patch(f"/api/rides/request/{ride.pk}/update/", {"status": "cancelled"})
+            finally:
+                connections.close_all()
+            latencies.append(time.perf_counter() - started)
+            return kind, ride.pk, response.status_code
+
+        # Losing accepts are expected 400s; keep them out of the log
+        request_logger = logging.getLogger("django.request")
+        previous_level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        began = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=options["threads"]) as pool:
+                results = list(pool.map(run, tasks))
+        finally:
+            request_logger.setLevel(previous_level)
+        elapsed = time.perf_counter() - began
+
+        latencies.sort()
+        self.stdout.write(
+            f"{len(tasks)} requests ({len(rides)} rides) on {options['threads']} threads in {elapsed:.2f}s: "
+            f"{len(tasks) / elapsed:.0f} req/s, p50={statistics.median(latencies) * 1000:.1f}ms "
+            f"p95={percentile(latencies, 0.95) * 1000:.1f}ms"
+        )
+        self.stdout.write(f"responses: {dict(Counter((kind, code) for kind, _, code in results))}")
+        return results
+
+    def verify(self, rides, results):
+        errors = [r for r in results if r[2] >= 500]
+        if errors:
+            raise CommandError(f"{len(errors)} requests failed with a server error")
+
+        accept_wins = Counter(ride_pk for kind, ride_pk, code in results if kind == "accept" and code == 200)
+        for ride in rides:
+            ride.refresh_from_db()
+            accepted_offers = RideOffer.objects.filter(ride_request=ride, status="accepted").count()
+            history = CompletedRide.objects.filter(ride_request=ride).count()
+            if ride.status == "accepted":
+                expected = (1, 1, 1)
+            elif ride.status == "cancelled":
+                expected = (0, 0, 0)
+            else:
+                raise CommandError(f"Ride {ride.pk} ended in unexpected status {ride.status}")
+            actual = (accept_wins[ride.pk], accepted_offers, history)
+            if actual != expected:
+                raise CommandError(
+                    f"Ride {ride.pk} ({ride.status}): {actual[0]} winning accepts, {actual[1]} accepted offers, "
+                    f"{actual[2]} history rows; expected {expected}"
+                )
+
+        outcomes = Counter(ride.status for ride in rides)
+        self.stdout.write(self.style.SUCCESS(f"exactly one transition won on every ride: {dict(outcomes)}"))
@@ -0,0 +1,104 @@
+"""
+Sync APIView versions of the ride lifecycle endpoints, for bench_ride_lifecycle.
+
+They serve create, offer, cancel, accept and complete the way the views did
+before they became AsyncAPIViews: each request runs on one sync thread, with
+DRF authentication and rendering. The transactional parts are the async views'
+own methods, so both modes run the same writes and only the request handling
+differs. `urlpatterns` puts them in front of the project URLconf; the bench
+switches to it with ROOT_URLCONF.
+"""
+from django.urls import include, path
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from accounts.permissions import IsDriver, IsRider
+from locations.index import city_locator
+from rides import views
+from rides.models import RideOffer, RideRequest
+from rides.serializers import RideRequestCreateSerializer, RideRequestSerializer
+from rides.utils import calculate_suggested_price, haversine_miles
+
+
+class SyncCreateRideRequestView(APIView):
+    permission_classes = [IsRider]
+    create = views.CreateRideRequestView.create
+
+    def post(self, request):
+        serializer = RideRequestCreateSerializer(data=request.data, context={"cities": city_locator.get()})
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        distance = haversine_miles(data["pickup_lat"], data["pickup_lng"], data["dropoff_lat"], data["dropoff_lng"])
+        ride_data = self.create(request.user, data, distance, calculate_suggested_price(distance))
+        return Response(ride_data, status=status.HTTP_201_CREATED)
+
+
+class SyncUpdateRideRequestView(APIView):
+    permission_classes = [IsRider]
+    cancel = views.UpdateRideRequestView.cancel
+
+    def patch(self, request, pk):
+        try:
+            ride_request = RideRequest.objects.get(pk=pk, rider=request.user)
+        except RideRequest.DoesNotExist:
+            return Response({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+        if request.data.get("status") == "cancelled":
+            self.cancel(ride_request)
+        return Response(RideRequestSerializer(RideRequest.objects.for_listing().get(pk=pk)).data)
+
+
+class SyncCreateRideOfferView(APIView):
+    permission_classes = [IsDriver]
+    create = views.CreateRideOfferView.create
+
+    def post(self, request):
+        offer_data = self.create(request.data, request.user)
+        if offer_data is None:
+            return Response({"error": "This ride is no longer accepting offers"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(offer_data, status=status.HTTP_201_CREATED)
+
+
+class SyncAcceptOfferView(APIView):
+    permission_classes = [IsRider]
+    accept = views.AcceptOfferView.accept
+    notify = views.AcceptOfferView.notify
+
+    def post(self, request):
+        try:
+            offer = RideOffer.objects.select_related("ride_request", "driver").get(pk=request.data.get("offer_id"))
+        except RideOffer.DoesNotExist:
+            return Response({"error": "Offer not found"}, status=status.HTTP_404_NOT_FOUND)
+        if offer.ride_request.rider_id != request.user.id:
+            return Response({"error": "Not your ride"}, status=status.HTTP_403_FORBIDDEN)
+        ride_data = self.accept(offer, request.user)
+        if ride_data is None:
+            return Response({"error": "Ride already accepted"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(ride_data)
+
+
+class SyncCompleteRideView(APIView):
+    permission_classes = [IsDriver]
+    complete = views.CompleteRideView.complete
+
+    def post(self, request, pk):
+        try:
+            ride_request = RideRequest.objects.select_related("accepted_offer").get(pk=pk, status="accepted")
+        except RideRequest.DoesNotExist:
+            return Response({"error": "Ride not found"}, status=status.HTTP_404_NOT_FOUND)
+        if ride_request.accepted_offer.driver_id != request.user.id:
+            return Response({"error": "Not your ride"}, status=status.HTTP_403_FORBIDDEN)
+        ride_data = self.complete(ride_request, request.user)
+        if ride_data is None:
+            return Response({"error": "Ride not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(ride_data)
+
+
+urlpatterns = [
+    path("api/rides/request/", SyncCreateRideRequestView.as_view()),
+    path("api/rides/request/<uuid:pk>/update/", SyncUpdateRideRequestView.as_view()),
+    path("api/rides/offer/", SyncCreateRideOfferView.as_view()),
+    path("api/rides/accept-offer/", SyncAcceptOfferView.as_view()),
+    path("api/rides/complete/<uuid:pk>/", SyncCompleteRideView.as_view()),
+    path("", include("ride_project.urls")),
+]
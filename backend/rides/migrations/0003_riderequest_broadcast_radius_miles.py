@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rides", "0002_completedride_review_text"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="riderequest",
+            name="broadcast_radius_miles",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rides", "0003_riderequest_broadcast_radius_miles"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="completedride",
+            index=models.Index(
+                fields=["rider", "-created_at", "-id"],
+                name="completed_rider_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="completedride",
+            index=models.Index(
+                fields=["driver", "-created_at", "-id"],
+                name="completed_driver_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="riderequest",
+            index=models.Index(
+                fields=["-created_at", "-id"], name="ride_req_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="riderequest",
+            index=models.Index(
+                fields=["rider", "-created_at", "-id"],
+                name="ride_req_rider_created_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rides", "0004_keyset_pagination_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="completedride",
+            index=models.Index(
+                condition=models.Q(
+                    ("driver_rating__isnull", True), ("dropoff_time__isnull", False)
+                ),
+                fields=["rider", "-created_at"],
+                name="completed_pending_rating_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="rideoffer",
+            index=models.Index(
+                condition=models.Q(("status", "accepted")),
+                fields=["driver", "-created_at"],
+                name="offer_driver_accepted_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="riderequest",
+            index=models.Index(
+                condition=models.Q(("status__in", ["pending", "offered"])),
+                fields=["-created_at", "-id"],
+                name="ride_req_open_created_idx",
+            ),
+        ),
+    ]
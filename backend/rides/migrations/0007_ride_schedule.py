@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rides", "0006_ride_change_seq"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="riderequest",
+            name="expires_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="riderequest",
+            name="release_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="riderequest",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("offered", "Offers Received"),
+                    ("accepted", "Accepted"),
+                    ("in_progress", "In Progress"),
+                    ("completed", "Completed"),
+                    ("cancelled", "Cancelled"),
+                    ("expired", "Expired"),
+                ],
+                default="pending",
+                max_length=15,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="riderequest",
+            index=models.Index(
+                condition=models.Q(
+                    ("release_at__isnull", False),
+                    ("status__in", ["pending", "offered"]),
+                ),
+                fields=["release_at"],
+                name="ride_req_held_release_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="riderequest",
+            index=models.Index(
+                condition=models.Q(
+                    ("expires_at__isnull", False),
+                    ("status__in", ["pending", "offered"]),
+                ),
+                fields=["expires_at"],
+                name="ride_req_open_expires_idx",
+            ),
+        ),
+    ]
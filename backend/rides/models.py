@@ -1,6 +1,125 @@
 import uuid
-from django.db import models
+from datetime import timedelta
+from django.db import models, transaction
+from django.db.models import F, Func, Max, Min, OuterRef, Q, Subquery
+from django.db.models.expressions import RawSQL
 from django.conf import settings
+from django.utils import timezone
+
+
+class RideChange(models.Model):
+    """Append-only log that numbers ride writes for delta sync (rides.sync).
+
+    A write takes the id of a new row as its change_seq. Inserts do not wait for
+    each other, so writers share no lock. Ids can commit out of order, so readers
+    only hand out positions that have settled (settled_position).
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    PRUNE_EVERY = 1000
+
+    class Meta:
+        db_table = "ride_changes"
+
+    @classmethod
+    def next(cls):
+        pk = cls.objects.create().pk
+        if pk % cls.PRUNE_EVERY == 0:
+            cutoff = timezone.now() - timedelta(seconds=settings.RIDE_CHANGE_RETENTION_SECONDS)
+            cls.objects.filter(created_at__lt=cutoff).delete()
+        return pk
+
+    @classmethod
+    def settled_position(cls, since):
+        """The furthest position at or after `since` below which every change is visible.
+
+        An id missing from the log belongs to a write that has not committed yet, or
+        one that rolled back. Ids allocated before the newest row older than
+        RIDE_SYNC_SETTLE_SECONDS are treated as done either way, and so are pruned
+        ones. Past that point the position only moves over consecutive ids. Returns
+        less than `since` when `since` was never handed out.
+        """
+        horizon = timezone.now() - timedelta(seconds=settings.RIDE_SYNC_SETTLE_SECONDS)
+        log = cls.objects.aggregate(
+            newest=Max("id"), oldest=Min("id"), settled=Max("id", filter=Q(created_at__lte=horizon))
+        )
+        newest = log["newest"] or 0
+        if since > newest:
+            return newest
+        settled = log["settled"] if log["settled"] is not None else (log["oldest"] or 1) - 1
+        position = max(since, settled)
+        for pk in cls.objects.filter(id__gt=position).order_by("id").values_list("id", flat=True):
+            if pk != position + 1:
+                break
+            position = pk
+        return position
+
+
+def offers_total():
+    """Each request's offer count as a correlated subquery. Unlike Count("offers") it
+    adds no GROUP BY, so a list can walk an index in order and stop at the page."""
+    offers = RideOffer.objects.filter(ride_request=OuterRef("pk")).order_by()
+    # COUNT() as a plain function: the subquery returns one row without grouping
+    count = Func(F("pk"), function="COUNT", output_field=models.IntegerField())
+    return Subquery(offers.annotate(c=count).values("c"), output_field=models.IntegerField())
+
+
+def inlined(value):
+    """A constant written into the SQL instead of bound as a parameter.
+
+    SQLite only uses a partial index when the query states the index condition with
+    the same literals, so filters that a partial index is built for name their
+    statuses this way: `status=inlined("accepted")` or, for several,
+    `status__in=inlined_all(...)`. Only for names from the code, never for request data.
+    """
+    if not value.isidentifier():
+        raise ValueError(f"{value!r} cannot be inlined")
+    return RawSQL(f"'{value}'", ())
+
+
+def inlined_all(*values):
+    return [inlined(value) for value in values]
+
+
+class RideRequestQuerySet(models.QuerySet):
+    def for_listing(self):
+        """Load everything RideRequestSerializer reads in the same query."""
+        return self.select_related("rider").annotate(offers_total=offers_total())
+
+    def update_tracked(self, **fields):
+        """update() that also stamps updated_at and the next change_seq. Call it inside
+        the writer's transaction (see RideChange)."""
+        fields.setdefault("updated_at", timezone.now())
+        return self.update(**fields, change_seq=RideChange.next())
+
+    def live(self, now=None):
+        """Requests on the driver board: open, released by rides.scheduler and with a window
+        that has not passed yet."""
+        now = now or timezone.now()
+        return self.filter(
+            Q(expires_at__isnull=True) | Q(expires_at__gt=now),
+            status__in=inlined_all("pending", "offered"),
+            release_at__isnull=True,
+        )
+
+    def version(self):
+        """What RideRequestSerializer output depends on for the first ride, read without
+        loading it (None when there is no ride). Equal versions serialize identically."""
+        return self.annotate(offers_total=offers_total()).values_list(
+            "id", "updated_at", "offers_total", "rider__updated_at", "rider__is_online", "rider__is_active",
+        ).first()
+
+
+class RideOfferQuerySet(models.QuerySet):
+    def for_listing(self):
+        return self.select_related("driver__driver_profile")
+
+
+class CompletedRideQuerySet(models.QuerySet):
+    def for_listing(self):
+        return self.select_related("driver__driver_profile", "rider", "ride_request")
 
 
 class RideRequest(models.Model):
@@ -16,6 +135,7 @@ class RideRequest(models.Model):
         IN_PROGRESS = "in_progress", "In Progress"
         COMPLETED = "completed", "Completed"
         CANCELLED = "cancelled", "Cancelled"
+        EXPIRED = "expired", "Expired"
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     rider = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="ride_requests")
@@ -37,8 +157,13 @@ class RideRequest(models.Model):
     requested_time = models.DateTimeField(null=True, blank=True)
     time_range_start = models.DateTimeField(null=True, blank=True)
     time_range_end = models.DateTimeField(null=True, blank=True)
+    # Set while a scheduled or range ride is held off the driver board, and when its
+    # window closes (rides.scheduler)
+    release_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
 
     status = models.CharField(max_length=15, choices=Status.choices, default=Status.PENDING)
+    broadcast_radius_miles = models.PositiveIntegerField(null=True, blank=True)
     accepted_offer = models.ForeignKey(
         "RideOffer",
         on_delete=models.SET_NULL,
@@ -49,14 +174,58 @@ class RideRequest(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Position in the ride change stream (rides.sync); bumped by every write
+    change_seq = models.BigIntegerField(default=0)
+
+    objects = RideRequestQuerySet.as_manager()
 
     class Meta:
         db_table = "ride_requests"
         ordering = ["-created_at"]
+        indexes = [
+            # Keyset pagination (ride_project.pagination.KeysetPagination)
+            models.Index(fields=["-created_at", "-id"], name="ride_req_created_idx"),
+            models.Index(fields=["rider", "-created_at", "-id"], name="ride_req_rider_created_idx"),
+            # Driver board: only open requests, newest first
+            models.Index(
+                fields=["-created_at", "-id"],
+                name="ride_req_open_created_idx",
+                condition=models.Q(status__in=["pending", "offered"]),
+            ),
+            # Delta sync (rides.sync.board_changes)
+            models.Index(fields=["change_seq"], name="ride_req_change_seq_idx"),
+            # Scheduler (rides.scheduler): held requests by release time, open ones by window end
+            models.Index(
+                fields=["release_at"],
+                name="ride_req_held_release_idx",
+                condition=models.Q(status__in=["pending", "offered"], release_at__isnull=False),
+            ),
+            models.Index(
+                fields=["expires_at"],
+                name="ride_req_open_expires_idx",
+                condition=models.Q(status__in=["pending", "offered"], expires_at__isnull=False),
+            ),
+        ]
 
     def __str__(self):
         return f"Ride: {self.pickup_city} -> {self.dropoff_city} ({self.status})"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            self.change_seq = RideChange.next()
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "change_seq", "updated_at"}
+            super().save(*args, **kwargs)
+
+
+def ride_window(time_type, requested_time=None, time_range_start=None, time_range_end=None):
+    """(start, end) of a ride's pickup window; (None, None) for an immediate ride."""
+    if time_type == RideRequest.TimeType.SPECIFIC and requested_time:
+        return requested_time, requested_time + timedelta(minutes=settings.RIDE_SCHEDULE_GRACE_MINUTES)
+    if time_type == RideRequest.TimeType.RANGE and time_range_start:
+        return time_range_start, time_range_end
+    return None, None
+
 
 class RideOffer(models.Model):
     class Status(models.TextChoices):
@@ -78,10 +247,20 @@ class RideOffer(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = RideOfferQuerySet.as_manager()
+
     class Meta:
         db_table = "ride_offers"
         ordering = ["price"]
         unique_together = ["ride_request", "driver"]
+        indexes = [
+            # ActiveRideView for drivers: newest accepted offer first
+            models.Index(
+                fields=["driver", "-created_at"],
+                name="offer_driver_accepted_idx",
+                condition=models.Q(status="accepted"),
+            ),
+        ]
 
     def __str__(self):
         return f"Offer: ${self.price} by {self.driver.full_name}"
@@ -105,6 +284,18 @@ class CompletedRide(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CompletedRideQuerySet.as_manager()
+
     class Meta:
         db_table = "completed_rides"
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["rider", "-created_at", "-id"], name="completed_rider_created_idx"),
+            models.Index(fields=["driver", "-created_at", "-id"], name="completed_driver_created_idx"),
+            # PendingRatingsView: finished rides the rider has not rated yet
+            models.Index(
+                fields=["rider", "-created_at"],
+                name="completed_pending_rating_idx",
+                condition=models.Q(driver_rating__isnull=True, dropoff_time__isnull=False),
+            ),
+        ]
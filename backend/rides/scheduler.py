@@ -0,0 +1,170 @@
+"""
+Time-window scheduler for specific-time and range rides.
+
+A ride booked for later is created with `release_at` (its window start minus
+RIDE_SCHEDULE_LEAD_MINUTES) and `expires_at` (the end of the range, or
+RIDE_SCHEDULE_GRACE_MINUTES after the specific time). Until it is released it
+is neither broadcast nor on the driver board (RideRequestQuerySet.live).
+
+The scheduler runs as a task on the ASGI server's event loop. Each pass reads
+the releases and expiries due before the next poll from two partial indexes
+into a heap, works off the due ones and sleeps until the earliest one left, so
+a window opens on time without polling every second. A ride created on this
+worker wakes it. Rides created on other workers are picked up by the next poll,
+at most RIDE_SCHEDULER_POLL_SECONDS later.
+
+Releasing clears `release_at` and broadcasts new_ride_request. Expiring moves an
+open ride to `expired`, drops it from driver boards (ride_cancelled) and tells
+the rider (ride_expired). Both are conditional updates through update_tracked,
+so every worker can run a scheduler and delta sync (rides.sync) sees the change.
+Processes without a running scheduler (tests, WSGI) work off what is due inline
+when a ride is created; `ride_schedule --run` does the same from cron.
+"""
+import asyncio
+import heapq
+import logging
+from datetime import timedelta
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from notifications.outbox import publish
+from .broadcast import DRIVER_BOARD_GROUP, driver_groups_for_request
+from .models import RideRequest, inlined_all, ride_window
+from .serializers import RideRequestSerializer
+from .sync import BOARD_STATUSES
+
+logger = logging.getLogger(__name__)
+
+RELEASE = "release"
+EXPIRE = "expire"
+
+
+def schedule_fields(data, now=None):
+    """release_at and expires_at for a new request; release_at is None when it goes out now."""
+    start, end = ride_window(
+        data.get("time_type"), data.get("requested_time"), data.get("time_range_start"), data.get("time_range_end")
+    )
+    if start is None:
+        return {"release_at": None, "expires_at": None}
+    release_at = start - timedelta(minutes=settings.RIDE_SCHEDULE_LEAD_MINUTES)
+    return {"release_at": release_at if release_at > (now or timezone.now()) else None, "expires_at": end}
+
+
+class RideScheduler:
+    def __init__(self):
+        self.loop = None
+        self._task = None
+        self._wakeup = None
+        self.released_total = 0
+        self.expired_total = 0
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Run the scheduler as a task on the current event loop."""
+        if self.running:
+            return
+        self.loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = self.loop.create_task(self.run())
+
+    def stop(self):
+        if self.running:
+            self.loop.call_soon_threadsafe(self._task.cancel)
+        self._task = None
+        self.loop = None
+
+    def wake(self):
+        if self.running:
+            self.loop.call_soon_threadsafe(self._wakeup.set)
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No scheduler in this process (tests, WSGI, management commands)
+            try:
+                self.run_due()
+            except Exception:
+                logger.exception("Ride scheduling failed; left for the next run")
+        else:
+            loop.create_task(database_sync_to_async(self.run_due)())
+
+    async def run(self):
+        while True:
+            delay = settings.RIDE_SCHEDULER_POLL_SECONDS
+            try:
+                delay = await database_sync_to_async(self.run_due)()
+            except Exception:
+                logger.exception("Ride scheduling failed; retrying on the next poll")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def upcoming(self, now):
+        """Heap of (when, action, ride id) for releases and expiries due before the next poll."""
+        horizon = now + timedelta(seconds=settings.RIDE_SCHEDULER_POLL_SECONDS)
+        open_rides = RideRequest.objects.filter(status__in=inlined_all(*BOARD_STATUSES))
+        held = open_rides.filter(release_at__isnull=False, release_at__lte=horizon).values_list("release_at", "id")
+        closing = open_rides.filter(expires_at__isnull=False, expires_at__lte=horizon).values_list("expires_at", "id")
+        events = [(when, RELEASE, pk) for when, pk in held] + [(when, EXPIRE, pk) for when, pk in closing]
+        heapq.heapify(events)
+        return events
+
+    def run_due(self, now=None):
+        """Release and expire every ride that is due; returns the seconds until the next event,
+        at most RIDE_SCHEDULER_POLL_SECONDS."""
+        now = now or timezone.now()
+        events = self.upcoming(now)
+        while events and events[0][0] <= now:
+            _, action, pk = heapq.heappop(events)
+            if action == RELEASE:
+                self.release(pk, now)
+            else:
+                self.expire(pk, now)
+        if not events:
+            return settings.RIDE_SCHEDULER_POLL_SECONDS
+        return (events[0][0] - now).total_seconds()
+
+    @transaction.atomic
+    def release(self, pk, now):
+        # A window that closed before the ride went out is left for expire()
+        released = RideRequest.objects.filter(
+            Q(expires_at__isnull=True) | Q(expires_at__gt=now),
+            pk=pk, status__in=BOARD_STATUSES, release_at__isnull=False,
+        ).update_tracked(release_at=None)
+        if not released:
+            return False
+        ride_request = RideRequest.objects.for_listing().get(pk=pk)
+        publish(
+            driver_groups_for_request(ride_request),
+            {"type": "new_ride_request", "data": RideRequestSerializer(ride_request).data},
+        )
+        self.released_total += 1
+        return True
+
+    @transaction.atomic
+    def expire(self, pk, now):
+        expired = RideRequest.objects.filter(
+            pk=pk, status__in=BOARD_STATUSES, expires_at__lte=now
+        ).update_tracked(status=RideRequest.Status.EXPIRED, release_at=None)
+        if not expired:
+            return False
+        ride_request = RideRequest.objects.for_listing().get(pk=pk)
+        publish(DRIVER_BOARD_GROUP, {"type": "ride_cancelled", "ride_request_id": str(pk)})
+        publish(f"ride_request_{pk}", {"type": "ride_expired", "data": RideRequestSerializer(ride_request).data})
+        self.expired_total += 1
+        return True
+
+    def stats(self):
+        return {"released": self.released_total, "expired": self.expired_total}
+
+
+scheduler = RideScheduler()
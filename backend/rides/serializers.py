@@ -1,6 +1,10 @@
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
-from .models import RideRequest, RideOffer, CompletedRide
+from .models import RideRequest, RideOffer, CompletedRide, ride_window
+from accounts.cards import PROFILE_CARD_FIELDS, cached_driver_card, card_user, driver_card, make_driver_card
 from accounts.serializers import UserSerializer
+from ride_project.fast_serializers import FastSerializer, MethodField
 
 
 class RideRequestCreateSerializer(serializers.ModelSerializer):
@@ -12,6 +16,32 @@ class RideRequestCreateSerializer(serializers.ModelSerializer):
             "time_type", "requested_time", "time_range_start", "time_range_end",
         ]
 
+    def validate(self, attrs):
+        start, end = ride_window(
+            attrs.get("time_type"), attrs.get("requested_time"),
+            attrs.get("time_range_start"), attrs.get("time_range_end"),
+        )
+        if end is not None and (end <= start or end <= timezone.now()):
+            raise serializers.ValidationError({"time_type": ["The pickup window has already passed."]})
+
+        # With a locations.index.CitySpatialIndex in the context, a known city must lie
+        # near its coordinates and is stored with the index's spelling. Cities missing
+        # from the table are accepted as typed.
+        cities = self.context.get("cities")
+        if not cities:
+            return attrs
+        for end in ("pickup", "dropoff"):
+            known = cities.lookup(attrs[f"{end}_city"], attrs[f"{end}_state"])
+            if known is None:
+                continue
+            nearby = cities.within(attrs[f"{end}_lat"], attrs[f"{end}_lng"], settings.RIDE_CITY_MATCH_RADIUS_MILES)
+            if not any(c["id"] == known["id"] for c in nearby):
+                raise serializers.ValidationError(
+                    {f"{end}_city": [f"{known['city']}, {known['state']} is not near the {end} coordinates."]}
+                )
+            attrs[f"{end}_city"], attrs[f"{end}_state"] = known["city"], known["state"]
+        return attrs
+
 
 class RideRequestSerializer(serializers.ModelSerializer):
     rider = UserSerializer(read_only=True)
@@ -22,7 +52,9 @@ class RideRequestSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
     def get_offers_count(self, obj):
-        return obj.offers.count()
+        # List views annotate the count (RideRequest.objects.for_listing())
+        count = getattr(obj, "offers_total", None)
+        return count if count is not None else obj.offers.count()
 
 
 class RideOfferCreateSerializer(serializers.ModelSerializer):
@@ -31,8 +63,24 @@ class RideOfferCreateSerializer(serializers.ModelSerializer):
         fields = ["ride_request", "price", "estimated_arrival_minutes", "message"]
 
 
-class RideOfferSerializer(serializers.ModelSerializer):
-    driver = UserSerializer(read_only=True)
+class DriverCardFieldsMixin:
+    """Driver fields read from the cached driver card (accounts.cards), looked up once per row."""
+
+    def driver_card(self, obj):
+        card = getattr(obj, "_driver_card", None)
+        if card is None:
+            card = obj._driver_card = driver_card(obj.driver)
+        return card
+
+    def get_driver(self, obj):
+        return card_user(self.driver_card(obj), obj.driver.is_online)
+
+    def get_driver_vehicle(self, obj):
+        return self.driver_card(obj)["vehicle"]
+
+
+class RideOfferSerializer(DriverCardFieldsMixin, serializers.ModelSerializer):
+    driver = serializers.SerializerMethodField()
     driver_vehicle = serializers.SerializerMethodField()
     driver_rating = serializers.SerializerMethodField()
 
@@ -40,16 +88,8 @@ class RideOfferSerializer(serializers.ModelSerializer):
         model = RideOffer
         fields = "__all__"
 
-    def get_driver_vehicle(self, obj):
-        profile = getattr(obj.driver, "driver_profile", None)
-        if profile:
-            parts = [profile.vehicle_color, str(profile.vehicle_year or ""), profile.vehicle_make, profile.vehicle_model]
-            return " ".join(p for p in parts if p).strip()
-        return ""
-
     def get_driver_rating(self, obj):
-        profile = getattr(obj.driver, "driver_profile", None)
-        return float(profile.rating) if profile else 5.0
+        return self.driver_card(obj)["rating"]
 
 
 class RideRequestBriefSerializer(serializers.ModelSerializer):
@@ -58,8 +98,8 @@ class RideRequestBriefSerializer(serializers.ModelSerializer):
         fields = ["id", "pickup_city", "pickup_state", "dropoff_city", "dropoff_state", "status"]
 
 
-class CompletedRideSerializer(serializers.ModelSerializer):
-    driver = UserSerializer(read_only=True)
+class CompletedRideSerializer(DriverCardFieldsMixin, serializers.ModelSerializer):
+    driver = serializers.SerializerMethodField()
     rider = UserSerializer(read_only=True)
     ride_request = RideRequestBriefSerializer(read_only=True)
     is_completed = serializers.SerializerMethodField()
@@ -73,13 +113,61 @@ class CompletedRideSerializer(serializers.ModelSerializer):
     def get_is_completed(self, obj):
         return obj.dropoff_time is not None
 
-    def get_driver_vehicle(self, obj):
-        profile = getattr(obj.driver, "driver_profile", None)
-        if profile:
-            parts = [profile.vehicle_color, str(profile.vehicle_year or ""), profile.vehicle_make, profile.vehicle_model]
-            return " ".join(p for p in parts if p).strip()
-        return ""
-
     def get_driver_profile_rating(self, obj):
-        profile = getattr(obj.driver, "driver_profile", None)
-        return float(profile.rating) if profile else 5.0
+        return self.driver_card(obj)["rating"]
+
+
+# Fast paths for the list endpoints (ride_project.fast_serializers): same output as
+# the serializers above, built from .values() rows.
+
+_driver_user = FastSerializer(UserSerializer, prefix="driver__")
+_driver_profile_lookups = {name: f"driver__driver_profile__{name}" for name in PROFILE_CARD_FIELDS}
+
+
+def _row_driver_card(row):
+    card = row.get("__driver_card")
+    if card is None:
+        def build():
+            profile = None
+            if row["driver__driver_profile__id"] is not None:
+                profile = {name: row[lookup] for name, lookup in _driver_profile_lookups.items()}
+            return make_driver_card(_driver_user.to_representation(row), profile)
+
+        card = row["__driver_card"] = cached_driver_card(row["driver"], build)
+    return card
+
+
+_driver_card_lookups = ["driver", "driver__driver_profile__id", *_driver_profile_lookups.values(), *_driver_user.lookups]
+
+
+def _driver_card_field(key):
+    return MethodField(lambda row: _row_driver_card(row)[key], _driver_card_lookups)
+
+
+def _driver_user_field():
+    return MethodField(lambda row: card_user(_row_driver_card(row), row["driver__is_online"]), _driver_card_lookups)
+
+
+fast_ride_requests = FastSerializer(
+    RideRequestSerializer,
+    {"offers_count": MethodField(lambda row: row["offers_total"], ["offers_total"])},
+)
+
+fast_ride_offers = FastSerializer(
+    RideOfferSerializer,
+    {
+        "driver": _driver_user_field(),
+        "driver_vehicle": _driver_card_field("vehicle"),
+        "driver_rating": _driver_card_field("rating"),
+    },
+)
+
+fast_completed_rides = FastSerializer(
+    CompletedRideSerializer,
+    {
+        "driver": _driver_user_field(),
+        "driver_vehicle": _driver_card_field("vehicle"),
+        "driver_profile_rating": _driver_card_field("rating"),
+        "is_completed": MethodField(lambda row: row["dropoff_time"] is not None, ["dropoff_time"]),
+    },
+)
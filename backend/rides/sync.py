@@ -0,0 +1,53 @@
+"""
+Delta sync for the driver ride board.
+
+Every write to a RideRequest stores the id of a new RideChange row in change_seq
+(RideRequest.save and RideRequestQuerySet.update_tracked). A client
+that has seen the board up to cursor N asks for `?since=N` and gets the open
+requests changed after N, the ids of those that left the board (tombstones), and
+a new cursor, so catching up after a reconnect costs O(changes) instead of
+O(board).
+
+`since=0` returns the whole board. Ids are taken in insert order but committed
+in transaction order, so a missing id may still be on its way. The cursor only
+moves over ids that are settled (RideChange.settled_position): it waits at a gap
+until the write commits or RIDE_SYNC_SETTLE_SECONDS pass. It is read before the
+rows, so a change committed while they are read is sent again next time rather
+than skipped.
+
+Rides held by the scheduler, or whose window has passed, are pending but left
+out of the board by RideRequestQuerySet.live(). Their release or expiry
+(rides.scheduler) is a change of its own.
+"""
+from .models import RideChange, RideRequest
+
+BOARD_STATUSES = ("pending", "offered")
+
+
+def board_changes(since, limit):
+    """Return (open_ids, removed_ids, cursor, has_more) for changes after `since`.
+
+    open_ids are in change order. At most `limit` changes are returned; when there
+    are more, the cursor stops at the last whole change_seq returned.
+    """
+    cursor = RideChange.settled_position(since)
+    if cursor <= since:
+        return [], [], cursor, False
+    changes = RideRequest.objects.filter(change_seq__gt=since, change_seq__lte=cursor).order_by("change_seq", "id")
+    if since == 0:
+        # A first sync needs no tombstones
+        changes = changes.filter(status__in=BOARD_STATUSES)
+
+    rows = list(changes.values_list("id", "status", "change_seq")[: limit + 1])
+    has_more = len(rows) > limit
+    if has_more:
+        # Never split one change_seq (a multi-row update_tracked) across two pages
+        boundary = rows[limit][2]
+        rows = [row for row in rows if row[2] < boundary] or list(
+            changes.filter(change_seq=boundary).values_list("id", "status", "change_seq")
+        )
+        cursor = rows[-1][2]
+
+    open_ids = [pk for pk, status, _ in rows if status in BOARD_STATUSES]
+    removed_ids = [pk for pk, status, _ in rows if status not in BOARD_STATUSES]
+    return open_ids, removed_ids, cursor, has_more
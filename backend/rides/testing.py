@@ -0,0 +1,10 @@
+"""Shared by the test suites and the load-generating management commands."""
+
+# A valid POST /api/rides/request/ body: an immediate ride from San Francisco to Oakland
+RIDE_PAYLOAD = {
+    "pickup_city": "San Francisco", "pickup_state": "CA",
+    "pickup_lat": "37.774900", "pickup_lng": "-122.419400",
+    "dropoff_city": "Oakland", "dropoff_state": "CA",
+    "dropoff_lat": "37.804400", "dropoff_lng": "-122.271100",
+    "time_type": "immediate",
+}
@@ -1,3 +1,803 @@
-from django.test import TestCase
+import asyncio
+import base64
+import heapq
+import random
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.cards import driver_card_cache
+from accounts.models import User, DriverProfile, RiderProfile
+from accounts.serializers import UserSerializer
+from locations.index import city_locator
+from ride_project.replay import REPLAY_KEY
+from .broadcast import DRIVER_BOARD_GROUP, driver_cell_for, driver_cell_group, driver_groups_for_pickup
+from .models import RideChange, RideRequest, RideOffer, CompletedRide
+from .scheduler import scheduler
+from .serializers import (
+    CompletedRideSerializer,
+    RideOfferSerializer,
+    RideRequestSerializer,
+    fast_completed_rides,
+    fast_ride_offers,
+    fast_ride_requests,
+)
+from .testing import RIDE_PAYLOAD
+from .utils import (
+    calculate_suggested_price,
+    calculate_suggested_price_batch,
+    geohash_cells_within,
+    geohash_encode,
+    haversine_miles,
+    haversine_miles_batch,
+)
+
+
+def make_user(email, role):
+    user = User.objects.create_user(email, email.split("@")[0].title(), "555-0100", role)
+    if role == "rider":
+        RiderProfile.objects.create(user=user)
+    elif role == "driver":
+        DriverProfile.objects.create(user=user, vehicle_make="Honda", vehicle_model="Civic", vehicle_year=2020)
+    return user
+
+
+def make_ride(rider, **fields):
+    data = {k: v for k, v in RIDE_PAYLOAD.items()}
+    data.update(distance_miles="8.00", suggested_price="4.00")
+    data.update(fields)
+    return RideRequest.objects.create(rider=rider, **data)
+
+
+class GeohashTests(TestCase):
+    def test_encode_matches_reference_values(self):
+        self.assertEqual(geohash_encode(37.7749, -122.4194, 6), "9q8yyk")
+        self.assertEqual(geohash_encode(57.64911, 10.40744, 11), "u4pruydqqvj")
+
+    def test_cells_within_cover_nearby_points_only(self):
+        cells = geohash_cells_within(37.7749, -122.4194, 25, 4)
+        self.assertIn(geohash_encode(37.7749, -122.4194, 4), cells)
+        # Oakland is ~8 miles away, Sacramento ~75
+        self.assertIn(geohash_encode(37.8044, -122.2711, 4), cells)
+        self.assertNotIn(geohash_encode(38.5816, -121.4944, 4), cells)
+
+    def test_cells_within_wrap_the_antimeridian(self):
+        cells = geohash_cells_within(0, 179.95, 25, 4)
+        self.assertIn(geohash_encode(0, -179.95, 4), cells)
+        self.assertLess(haversine_miles(0, 179.95, 0, -179.95), 25)
+
+
+class BatchHaversineTests(TestCase):
+    def test_matches_the_scalar_functions_to_the_cent(self):
+        rng = random.Random(7)
+        pairs = []
+        for _ in range(20000):
+            lat, lng = rng.uniform(-80, 80), rng.uniform(-180, 180)
+            spread = rng.choice([0.01, 0.5, 5, 90])
+            pairs.append([round(v, 6) for v in (lat, lng, lat + rng.uniform(-spread, spread) / 2, lng + rng.uniform(-spread, spread))])
+
+        distances = haversine_miles_batch(*np.array(pairs).T)
+        cents = calculate_suggested_price_batch(distances)
+
+        self.assertEqual(distances.tolist(), [haversine_miles(*pair) for pair in pairs])
+        self.assertEqual(cents.tolist(), [int(calculate_suggested_price(haversine_miles(*p)) * 100) for p in pairs])
+
+    def test_half_cent_prices_round_like_decimal(self):
+        distances = np.arange(0, 5000) / 100
+        self.assertEqual(
+            calculate_suggested_price_batch(distances, base_rate=0.35, minimum_fare=0).tolist(),
+            [int(calculate_suggested_price(d, base_rate=0.35, minimum_fare=0) * 100) for d in distances.tolist()],
+        )
+
+
+class DriverBroadcastTests(TestCase):
+    def setUp(self):
+        self.rider = make_user("rider@example.com", "rider")
+        self.client = APIClient()
+        self.client.force_authenticate(self.rider)
+        self.layer = get_channel_layer()
+
+    def join(self, lat, lng):
+        # The groups DriverConsumer puts a driver socket at (lat, lng) in
+        channel = async_to_sync(self.layer.new_channel)()
+        async_to_sync(self.layer.group_add)(driver_cell_group(driver_cell_for(lat, lng)), channel)
+        async_to_sync(self.layer.group_add)(DRIVER_BOARD_GROUP, channel)
+        return channel
+
+    def receive(self, channel):
+        message = async_to_sync(asyncio.wait_for)(self.layer.receive(channel), 1)
+        message.pop(REPLAY_KEY)  # stamped by the channel layer (ride_project.replay)
+        return message
+
+    def assertNothingReceived(self, channel):
+        with self.assertRaises(asyncio.TimeoutError):
+            async_to_sync(asyncio.wait_for)(self.layer.receive(channel), 0.05)
+
+    def test_request_reaches_nearby_driver_only(self):
+        nearby = self.join(37.80, -122.40)
+        far_away = self.join(40.7128, -74.0060)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/rides/request/", RIDE_PAYLOAD)
+
+        self.assertEqual(response.status_code, 201)
+        message = self.receive(nearby)
+        self.assertEqual(message["type"], "new_ride_request")
+        self.assertEqual(message["data"]["id"], response.data["id"])
+        self.assertNothingReceived(far_away)
+
+    def test_widen_reaches_only_newly_covered_cells(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/rides/request/", RIDE_PAYLOAD)
+        ride = RideRequest.objects.get(pk=response.data["id"])
+        nearby = self.join(37.80, -122.40)
+        # Sacramento: outside the default 25 miles, inside 50
+        sacramento = self.join(38.5816, -121.4944)
+        self.assertNotIn(
+            driver_cell_group(driver_cell_for(38.5816, -121.4944)),
+            driver_groups_for_pickup(ride.pickup_lat, ride.pickup_lng, 25),
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"/api/rides/request/{ride.id}/widen/")
+            response = self.client.post(f"/api/rides/request/{ride.id}/widen/")
+
+        self.assertEqual(response.status_code, 200)
+        ride.refresh_from_db()
+        self.assertEqual(ride.broadcast_radius_miles, 100)
+        self.assertEqual(self.receive(sacramento)["type"], "new_ride_request")
+        self.assertNothingReceived(nearby)
+
+    def test_cancel_reaches_every_driver_who_can_list_the_ride(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/rides/request/", RIDE_PAYLOAD)
+        nearby = self.join(37.80, -122.40)
+        # Outside the broadcast cells, but the board lists every live ride
+        far_away = self.join(40.7128, -74.0060)
+        driver = make_user("driver@example.com", "driver")
+        self.client.force_authenticate(driver)
+        self.assertIn(response.data["id"], [r["id"] for r in self.client.get("/api/rides/requests/").data["results"]])
+
+        self.client.force_authenticate(self.rider)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f"/api/rides/request/{response.data['id']}/update/", {"status": "cancelled"})
+
+        for channel in (nearby, far_away):
+            self.assertEqual(self.receive(channel), {"type": "ride_cancelled", "ride_request_id": response.data["id"]})
+
+
+class ListQueryBudgetTests(TestCase):
+    """List endpoints must run a constant number of queries however many rows they return."""
+
+    ROWS = 8
+
+    def setUp(self):
+        self.drivers = [make_user(f"driver{i}@example.com", "driver") for i in range(3)]
+        self.riders = [make_user(f"rider{i}@example.com", "rider") for i in range(self.ROWS)]
+        self.admin = make_user("admin@example.com", "admin")
+        self.rides = []
+        for rider in self.riders:
+            ride = make_ride(rider, status="offered")
+            for driver in self.drivers:
+                RideOffer.objects.create(ride_request=ride, driver=driver, price="5.00")
+            self.rides.append(ride)
+        for ride in self.rides[: self.ROWS // 2]:
+            CompletedRide.objects.create(
+                ride_request=ride, driver=self.drivers[0], rider=ride.rider,
+                final_price="5.00", distance_miles="8.00",
+            )
+        self.client = APIClient()
+
+    def get(self, user, url, queries):
+        self.client.force_authenticate(user)
+        with self.assertNumQueries(queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_driver_ride_board(self):
+        data = self.get(self.drivers[0], "/api/rides/requests/", 1)["results"]
+        self.assertEqual(len(data), self.ROWS)
+        self.assertTrue(all(r["offers_count"] == 3 for r in data))
+        self.assertEqual({r["rider"]["email"] for r in data}, {r.email for r in self.riders})
+
+    def test_admin_rides(self):
+        data = self.get(self.admin, "/api/admin/rides/", 1)["results"]
+        self.assertEqual(len(data), self.ROWS)
+
+    def test_ride_lists_count_offers_without_grouping(self):
+        # A GROUP BY over every ride makes the database sort the whole table for each page
+        for user, url in ((self.admin, "/api/admin/rides/?page_size=3"), (self.drivers[0], "/api/rides/requests/?page_size=3")):
+            self.client.force_authenticate(user)
+            with CaptureQueriesContext(connection) as queries:
+                data = self.client.get(url).data["results"]
+            self.assertEqual([r["offers_count"] for r in data], [3, 3, 3])
+            self.assertNotIn("GROUP BY", queries[0]["sql"].upper())
+
+    def test_ride_offers(self):
+        data = self.get(self.riders[0], f"/api/rides/offers/?ride_request={self.rides[0].id}", 1)
+        self.assertEqual(len(data), 3)
+        self.assertEqual(data[0]["driver_vehicle"], "2020 Honda Civic")
+        self.assertEqual(data[0]["driver_rating"], 5.0)
+
+    def test_driver_history(self):
+        data = self.get(self.drivers[0], "/api/rides/history/", 1)["results"]
+        self.assertEqual(len(data), self.ROWS // 2)
+        self.assertEqual(data[0]["driver_vehicle"], "2020 Honda Civic")
+
+    def test_driver_history_summary(self):
+        CompletedRide.objects.filter(ride_request=self.rides[0]).update(dropoff_time=timezone.now())
+        data = self.get(self.drivers[0], "/api/rides/history/summary/", 1)
+        self.assertEqual(data["total_rides"], self.ROWS // 2)
+        self.assertEqual(data["completed_rides"], 1)
+        self.assertEqual(Decimal(data["total_earnings"]), Decimal("5.00") * (self.ROWS // 2))
+
+        data = self.get(self.drivers[1], "/api/rides/history/summary/", 1)
+        self.assertEqual((data["total_rides"], Decimal(data["total_earnings"])), (0, 0))
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.rider = make_user("rider@example.com", "rider")
+        self.rides = [make_ride(self.rider) for _ in range(7)]
+        # Force created_at ties so the id tiebreaker is exercised
+        RideRequest.objects.filter(pk__in=[r.pk for r in self.rides[2:5]]).update(
+            created_at=self.rides[2].created_at
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.rider)
+
+    def test_pages_cover_every_row_once_in_stable_order(self):
+        seen = []
+        url = "/api/rides/requests/?page_size=3"
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertLessEqual(len(response.data["results"]), 3)
+            seen.extend(r["id"] for r in response.data["results"])
+            url = response.data["next"]
+
+        expected = RideRequest.objects.order_by("-created_at", "-id").values_list("id", flat=True)
+        self.assertEqual(seen, [str(pk) for pk in expected])
+
+    def test_page_size_is_capped(self):
+        with self.settings(API_MAX_PAGE_SIZE=2):
+            response = self.client.get("/api/rides/requests/?page_size=500")
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/rides/requests/?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_with_a_malformed_id(self):
+        cursor = base64.urlsafe_b64encode(b"2026-01-01T00:00:00+00:00|12").decode()
+        response = self.client.get("/api/rides/requests/", {"cursor": cursor})
+        self.assertEqual(response.status_code, 404)
+
+    @skipUnless(connection.vendor == "sqlite", "reads SQLite's EXPLAIN QUERY PLAN")
+    def test_later_pages_walk_the_keyset_index(self):
+        pages = (
+            (make_user("admin@example.com", "admin"), "/api/admin/rides/?page_size=2", "ride_req_created_idx"),
+            (make_user("driver@example.com", "driver"), "/api/rides/requests/?page_size=2", "ride_req_open_created_idx"),
+            (self.rider, "/api/rides/requests/?page_size=2", "ride_req_rider_created_idx"),
+        )
+
+        def capture(execute, sql, params, many, context):
+            if sql.startswith("SELECT") and 'FROM "ride_requests"' in sql:
+                selects.append((sql, params))
+            return execute(sql, params, many, context)
+
+        for user, url, index in pages:
+            self.client.force_authenticate(user)
+            url = self.client.get(url).data["next"]
+            selects = []
+            with connection.execute_wrapper(capture):
+                self.client.get(url)
+            # Explain with the bound parameters, as the planner sees the page query
+            sql, params = selects[0]
+            with connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+                plan = " / ".join(row[-1] for row in cursor.fetchall())
+            # An index range scan in page order: no full scan and no sort of the table
+            self.assertIn(f"USING INDEX {index} (", plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+
+class DriverCardTests(TestCase):
+    def setUp(self):
+        driver_card_cache.clear()
+        self.addCleanup(driver_card_cache.clear)
+        self.rider = make_user("rider@example.com", "rider")
+        self.drivers = [make_user(f"driver{i}@example.com", "driver") for i in range(2)]
+        self.rides = [make_ride(self.rider, status="offered") for _ in range(3)]
+        for ride in self.rides:
+            for driver in self.drivers:
+                RideOffer.objects.create(ride_request=ride, driver=driver, price="5.00")
+        self.client = APIClient()
+        self.client.force_authenticate(self.rider)
+
+    def offers(self, ride):
+        return self.client.get("/api/rides/offers/", {"ride_request": str(ride.id)}).data
+
+    def test_card_is_built_once_per_driver(self):
+        offers = [offer for ride in self.rides for offer in self.offers(ride)]
+
+        self.assertEqual(len(offers), 6)
+        self.assertEqual(driver_card_cache.stats()["misses"], 2)
+        self.assertEqual(offers[0]["driver"], UserSerializer(User.objects.get(pk=offers[0]["driver"]["id"])).data)
+        self.assertEqual(offers[0]["driver_vehicle"], "2020 Honda Civic")
+
+    def test_profile_save_drops_the_card(self):
+        self.assertEqual(self.offers(self.rides[0])[0]["driver_vehicle"], "2020 Honda Civic")
+
+        for profile in DriverProfile.objects.all():
+            profile.vehicle_color = "Blue"
+            profile.save()
+
+        self.assertEqual(self.offers(self.rides[0])[0]["driver_vehicle"], "Blue 2020 Honda Civic")
+
+    def test_online_status_is_live_while_the_card_is_cached(self):
+        self.assertEqual({o["driver"]["is_online"] for o in self.offers(self.rides[0])}, {False})
+
+        # Written by another worker's presence flush: no signal reaches this worker's cache
+        User.objects.filter(pk=self.drivers[0].pk).update(is_online=True)
+        offers = {o["driver"]["id"]: o for o in self.offers(self.rides[0])}
+        self.assertTrue(offers[str(self.drivers[0].pk)]["driver"]["is_online"])
+        self.assertFalse(offers[str(self.drivers[1].pk)]["driver"]["is_online"])
+        offer = RideOffer.objects.for_listing().get(ride_request=self.rides[0], driver=self.drivers[0])
+        self.assertTrue(RideOfferSerializer(offer).data["driver"]["is_online"])
+        self.assertEqual(driver_card_cache.stats()["misses"], 2)
+
+
+class FastSerializerParityTests(TestCase):
+    """The .values() fast path must render the same bytes as the DRF serializers."""
+
+    def setUp(self):
+        driver_card_cache.clear()
+        self.addCleanup(driver_card_cache.clear)
+        self.rider = make_user("rider@example.com", "rider")
+        self.driver = make_user("driver@example.com", "driver")
+        # A driver without a profile, with an odd rating on the other one
+        self.bare_driver = User.objects.create_user("bare@example.com", "Bare", "", "driver", is_online=True)
+        DriverProfile.objects.filter(user=self.driver).update(rating="4.67", vehicle_color="Red", total_rides=3)
+        self.rides = [
+            make_ride(self.rider, status="offered", time_type="specific", requested_time=timezone.now()),
+            make_ride(self.rider, status="completed", distance_miles="12.35", suggested_price="5.09"),
+            make_ride(self.rider, status="completed"),
+        ]
+        for ride in self.rides:
+            RideOffer.objects.create(ride_request=ride, driver=self.driver, price="5.00", message="On my way")
+            RideOffer.objects.create(ride_request=ride, driver=self.bare_driver, price="7.25", estimated_arrival_minutes=12)
+        CompletedRide.objects.create(
+            ride_request=self.rides[1], driver=self.driver, rider=self.rider, final_price="5.09",
+            distance_miles="12.35", pickup_time=timezone.now(), dropoff_time=timezone.now(), driver_rating=4,
+        )
+        CompletedRide.objects.create(
+            ride_request=self.rides[2], driver=self.bare_driver, rider=self.rider, final_price="4.00", distance_miles="8.00",
+        )
+
+    def assertSameBytes(self, fast, serializer_class, queryset):
+        driver_card_cache.clear()
+        expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        driver_card_cache.clear()
+        self.assertEqual(JSONRenderer().render(fast.serialize(fast.values(queryset))), expected)
+
+    def test_ride_requests(self):
+        self.assertSameBytes(fast_ride_requests, RideRequestSerializer, RideRequest.objects.for_listing())
+
+    def test_ride_offers(self):
+        self.assertSameBytes(fast_ride_offers, RideOfferSerializer, RideOffer.objects.for_listing())
+
+    def test_completed_rides(self):
+        self.assertSameBytes(fast_completed_rides, CompletedRideSerializer, CompletedRide.objects.for_listing())
+
+    def test_endpoints_match_the_serializer_path(self):
+        client = APIClient()
+        urls = [
+            (self.rider, "/api/rides/requests/"),
+            (self.rider, f"/api/rides/offers/?ride_request={self.rides[0].id}"),
+            (self.rider, "/api/rides/history/"),
+            (self.bare_driver, "/api/rides/history/"),
+        ]
+        for user, url in urls:
+            client.force_authenticate(user)
+            with self.settings(API_FAST_SERIALIZERS=False):
+                expected = client.get(url).content
+            self.assertEqual(client.get(url).content, expected, url)
+
+    def test_cursor_pages_match(self):
+        client = APIClient()
+        client.force_authenticate(self.rider)
+        with self.settings(API_FAST_SERIALIZERS=False):
+            expected = client.get("/api/rides/requests/?page_size=2").data["next"]
+        self.assertEqual(client.get("/api/rides/requests/?page_size=2").data["next"], expected)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.rider = make_user("rider@example.com", "rider")
+        self.driver = make_user("driver@example.com", "driver")
+        self.ride = make_ride(self.rider)
+        self.client = APIClient()
+        self.client.force_authenticate(self.rider)
+
+    def poll(self, url, etag, expected_status, queries=1):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, expected_status)
+        return response
+
+    def test_unchanged_ride_is_not_modified(self):
+        for url in ("/api/rides/active/", f"/api/rides/request/{self.ride.id}/"):
+            response = self.client.get(url)
+            self.assertEqual(response["Cache-Control"], "private, no-cache")
+            not_modified = self.poll(url, response["ETag"], 304)
+            self.assertEqual(not_modified["ETag"], response["ETag"])
+            self.assertEqual(not_modified.content, b"")
+
+    def test_offers_status_and_rider_change_the_etag(self):
+        url = f"/api/rides/request/{self.ride.id}/"
+        etag = self.client.get(url)["ETag"]
+
+        RideOffer.objects.create(ride_request=self.ride, driver=self.driver, price="5.00")
+        response = self.poll(url, etag, 200, queries=2)
+        self.assertEqual(response.data["offers_count"], 1)
+
+        User.objects.filter(pk=self.rider.pk).update(is_online=True)
+        response = self.poll(url, response["ETag"], 200, queries=2)
+        self.assertTrue(response.data["rider"]["is_online"])
+
+        etag = self.client.get("/api/rides/active/")["ETag"]
+        RideRequest.objects.filter(pk=self.ride.pk).update(status="cancelled", updated_at=timezone.now())
+        self.assertIsNone(self.poll("/api/rides/active/", etag, 200, queries=2).data)
+
+    def test_deactivating_the_rider_changes_the_etag(self):
+        url = f"/api/rides/request/{self.ride.id}/"
+        etag = self.client.get(url)["ETag"]
+        admin = APIClient()
+        admin.force_authenticate(make_user("admin@example.com", "admin"))
+
+        # Saves only is_active, so rider__updated_at does not move
+        self.assertEqual(admin.delete(f"/api/admin/users/{self.rider.id}/").status_code, 200)
+
+        response = self.poll(url, etag, 200, queries=2)
+        self.assertFalse(response.data["rider"]["is_active"])
+
+    def test_missing_ride_has_no_etag(self):
+        response = self.client.get(f"/api/rides/request/{uuid.uuid4()}/")
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header("ETag"))
+
+
+class DeltaSyncTests(TestCase):
+    def setUp(self):
+        self.rider = make_user("rider@example.com", "rider")
+        self.drivers = [make_user(f"driver{i}@example.com", "driver") for i in range(2)]
+        self.rides = [make_ride(self.rider) for _ in range(3)]
+        self.rider_client = APIClient()
+        self.rider_client.force_authenticate(self.rider)
+        self.client = APIClient()
+        self.client.force_authenticate(self.drivers[0])
+
+    def sync(self, since):
+        response = self.client.get("/api/rides/requests/", {"since": since})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_catch_up_returns_only_changes_and_tombstones(self):
+        board = self.sync(0)
+        self.assertEqual([r["id"] for r in board["results"]], [str(r.id) for r in self.rides])
+        self.assertEqual(board["removed"], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_authenticate(self.drivers[1])
+            self.client.post("/api/rides/offer/", {"ride_request": str(self.rides[0].id), "price": "5.00"}, format="json")
+            self.rider_client.patch(f"/api/rides/request/{self.rides[1].id}/update/", {"status": "cancelled"}, format="json")
+            new_ride = self.rider_client.post("/api/rides/request/", RIDE_PAYLOAD, format="json").data
+        self.client.force_authenticate(self.drivers[0])
+
+        with self.assertNumQueries(4):
+            delta = self.sync(board["cursor"])
+        self.assertEqual([(r["id"], r["offers_count"]) for r in delta["results"]], [(str(self.rides[0].id), 1), (new_ride["id"], 0)])
+        self.assertEqual(delta["removed"], [str(self.rides[1].id)])
+        self.assertGreater(delta["cursor"], board["cursor"])
+        self.assertEqual(self.sync(delta["cursor"])["results"], [])
+
+    def test_widening_is_a_change(self):
+        cursor = self.sync(0)["cursor"]
+        self.rider_client.post(f"/api/rides/request/{self.rides[2].id}/widen/")
+        self.assertEqual([r["id"] for r in self.sync(cursor)["results"]], [str(self.rides[2].id)])
+
+    def test_cursor_waits_at_an_uncommitted_change(self):
+        cursor = self.sync(0)["cursor"]
+        self.rider_client.post(f"/api/rides/request/{self.rides[0].id}/widen/")
+        self.rider_client.post(f"/api/rides/request/{self.rides[2].id}/widen/")
+        # As if the first widen's transaction were still open
+        pending = RideRequest.objects.get(pk=self.rides[0].id).change_seq
+        RideChange.objects.filter(pk=pending).delete()
+
+        delta = self.sync(cursor)
+        self.assertEqual((delta["results"], delta["cursor"]), ([], cursor))
+
+        RideChange.objects.update(created_at=timezone.now() - timedelta(seconds=60))
+        delta = self.sync(cursor)
+        self.assertEqual({r["id"] for r in delta["results"]}, {str(self.rides[0].id), str(self.rides[2].id)})
+
+    def test_large_gaps_are_paged(self):
+        with self.settings(RIDE_SYNC_MAX_CHANGES=2):
+            first = self.sync(0)
+            second = self.sync(first["cursor"])
+        self.assertTrue(first["has_more"])
+        self.assertFalse(second["has_more"])
+        self.assertEqual(len(first["results"]) + len(second["results"]), 3)
+
+    def test_invalid_cursors(self):
+        for since in ("abc", -1, 10**6):
+            self.assertEqual(self.client.get("/api/rides/requests/", {"since": since}).status_code, 404)
+        self.assertEqual(self.rider_client.get("/api/rides/requests/", {"since": 0}).status_code, 400)
+
+
+class RideSchedulerTests(TestCase):
+    def setUp(self):
+        self.rider = make_user("rider@example.com", "rider")
+        self.driver = make_user("driver@example.com", "driver")
+        self.rider_client = APIClient()
+        self.rider_client.force_authenticate(self.rider)
+        self.client = APIClient()
+        self.client.force_authenticate(self.driver)
+        self.layer = get_channel_layer()
+        self.nearby = async_to_sync(self.layer.new_channel)()
+        async_to_sync(self.layer.group_add)(driver_cell_group(driver_cell_for(37.80, -122.40)), self.nearby)
+        async_to_sync(self.layer.group_add)(DRIVER_BOARD_GROUP, self.nearby)
+
+    def request_ride(self, **times):
+        payload = {**RIDE_PAYLOAD, **{k: v.isoformat() for k, v in times.items()}}
+        payload["time_type"] = "range" if "time_range_start" in times else "specific"
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.rider_client.post("/api/rides/request/", payload, format="json")
+        return response
+
+    def receive(self, channel):
+        message = async_to_sync(asyncio.wait_for)(self.layer.receive(channel), 1)
+        message.pop(REPLAY_KEY)
+        return message
+
+    def assertNothingReceived(self, channel):
+        with self.assertRaises(asyncio.TimeoutError):
+            async_to_sync(asyncio.wait_for)(self.layer.receive(channel), 0.05)
+
+    def board(self):
+        return [r["id"] for r in self.client.get("/api/rides/requests/").data["results"]]
+
+    def test_later_ride_is_held_until_the_lead_time(self):
+        start = timezone.now() + timedelta(hours=2)
+        response = self.request_ride(time_range_start=start, time_range_end=start + timedelta(hours=1))
+        ride = RideRequest.objects.get(pk=response.data["id"])
+        self.assertEqual(ride.release_at, start - timedelta(minutes=30))
+        self.assertEqual(ride.expires_at, start + timedelta(hours=1))
+        self.assertNothingReceived(self.nearby)
+        self.assertEqual(self.board(), [])
+        cursor = self.client.get("/api/rides/requests/", {"since": 0}).data["cursor"]
+        offer = self.client.post("/api/rides/offer/", {"ride_request": str(ride.id), "price": "5.00"}, format="json")
+        self.assertEqual(offer.status_code, 400)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            scheduler.run_due(ride.release_at - timedelta(seconds=1))
+        self.assertNothingReceived(self.nearby)
+        with self.captureOnCommitCallbacks(execute=True):
+            scheduler.run_due(ride.release_at)
+
+        message = self.receive(self.nearby)
+        self.assertEqual((message["type"], message["data"]["id"]), ("new_ride_request", str(ride.id)))
+        self.assertEqual(self.board(), [str(ride.id)])
+        delta = self.client.get("/api/rides/requests/", {"since": cursor}).data
+        self.assertEqual([r["id"] for r in delta["results"]], [str(ride.id)])
+
+    def test_ride_inside_the_lead_time_goes_out_now_and_expires_after_its_window(self):
+        at = timezone.now() + timedelta(minutes=10)
+        response = self.request_ride(requested_time=at)
+        ride = RideRequest.objects.get(pk=response.data["id"])
+        self.assertIsNone(ride.release_at)
+        self.assertEqual(ride.expires_at, at + timedelta(minutes=30))
+        self.assertEqual(self.receive(self.nearby)["type"], "new_ride_request")
+        rider_channel = async_to_sync(self.layer.new_channel)()
+        async_to_sync(self.layer.group_add)(f"ride_request_{ride.id}", rider_channel)
+        cursor = self.client.get("/api/rides/requests/", {"since": 0}).data["cursor"]
+
+        # Off the board as soon as the window closes, before the scheduler gets to it
+        self.assertEqual(RideRequest.objects.live(ride.expires_at).count(), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            scheduler.run_due(ride.expires_at)
+
+        ride.refresh_from_db()
+        self.assertEqual(ride.status, "expired")
+        self.assertEqual(self.receive(self.nearby), {"type": "ride_cancelled", "ride_request_id": str(ride.id)})
+        self.assertEqual(self.receive(rider_channel)["type"], "ride_expired")
+        self.assertEqual(self.client.get("/api/rides/requests/", {"since": cursor}).data["removed"], [str(ride.id)])
+
+    def test_upcoming_reads_only_events_before_the_next_poll_in_time_order(self):
+        now = timezone.now()
+        late = make_ride(self.rider, release_at=now + timedelta(minutes=5))
+        soon = make_ride(self.rider, release_at=now + timedelta(seconds=20))
+        closing = make_ride(self.rider, expires_at=now + timedelta(seconds=10))
+        make_ride(self.rider, status="cancelled", expires_at=now)
+
+        with self.settings(RIDE_SCHEDULER_POLL_SECONDS=30):
+            events = scheduler.upcoming(now)
+            self.assertEqual(
+                [heapq.heappop(events)[1:] for _ in range(len(events))],
+                [("expire", closing.id), ("release", soon.id)],
+            )
+            self.assertEqual(scheduler.run_due(now), 10)
+        late.refresh_from_db()
+        self.assertIsNotNone(late.release_at)
+
+    def test_rejects_a_window_that_has_passed(self):
+        response = self.request_ride(requested_time=timezone.now() - timedelta(hours=1))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("time_type", response.data)
+
+
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        self.driver = make_user("driver@example.com", "driver")
+        self.riders = [make_user(f"rider{i}@example.com", "rider") for i in range(3)]
+        self.rides = []
+        for rider in self.riders:
+            ride = make_ride(rider, status="completed")
+            self.rides.append(CompletedRide.objects.create(
+                ride_request=ride, driver=self.driver, rider=rider, final_price="5.00", distance_miles="8.00",
+            ))
+        self.client = APIClient()
+
+    def rate(self, user, url, ride, rating):
+        self.client.force_authenticate(user)
+        return self.client.post(url, {"ride_id": str(ride.id), "rating": rating})
+
+    def test_driver_average_is_kept_without_rescanning(self):
+        for ride, rating in zip(self.rides, [5, 4, 4]):
+            with self.assertNumQueries(6):
+                response = self.rate(ride.rider, "/api/rides/rate/", ride, rating)
+            self.assertEqual(response.status_code, 200)
+
+        profile = DriverProfile.objects.get(user=self.driver)
+        self.assertEqual((profile.rating_sum, profile.rating_count), (13, 3))
+        self.assertEqual(float(profile.rating), 4.33)
+        self.assertEqual(response.data["driver_profile_rating"], 4.33)
+
+    def test_rating_twice_is_rejected(self):
+        self.rate(self.riders[0], "/api/rides/rate/", self.rides[0], 5)
+        response = self.rate(self.riders[0], "/api/rides/rate/", self.rides[0], 1)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(DriverProfile.objects.get(user=self.driver).rating_count, 1)
+
+    def test_driver_rates_rider(self):
+        response = self.rate(self.driver, "/api/rides/rate-rider/", self.rides[0], 3)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["rider_rating"], 3)
+        profile = RiderProfile.objects.get(user=self.riders[0])
+        self.assertEqual((profile.rating_sum, profile.rating_count, float(profile.rating)), (3, 1, 3.0))
+
+    def test_reconcile_fixes_drift(self):
+        CompletedRide.objects.filter(pk=self.rides[0].pk).update(driver_rating=2)
+        CompletedRide.objects.filter(pk=self.rides[1].pk).update(driver_rating=5)
+
+        call_command("reconcile_ratings", stdout=StringIO())
+
+        profile = DriverProfile.objects.get(user=self.driver)
+        self.assertEqual((profile.rating_sum, profile.rating_count, float(profile.rating)), (7, 2, 3.5))
+
+    def test_reconcile_rounds_halves_like_the_running_average(self):
+        for _ in range(5):
+            ride = make_ride(self.riders[0], status="completed")
+            self.rides.append(CompletedRide.objects.create(
+                ride_request=ride, driver=self.driver, rider=self.riders[0], final_price="5.00", distance_miles="8.00",
+            ))
+        for ride, rating in zip(self.rides, [5, 5, 5, 5, 5, 5, 4, 3]):  # 37 / 8 = 4.625
+            CompletedRide.objects.filter(pk=ride.pk).update(driver_rating=rating)
+            DriverProfile.record_rating(self.driver.pk, rating)
+        self.assertEqual(DriverProfile.objects.get(user=self.driver).rating, Decimal("4.63"))
+
+        out = StringIO()
+        call_command("reconcile_ratings", "--dry-run", stdout=out)
+
+        self.assertIn("DriverProfile: would fix 0 profiles", out.getvalue())
+
+
+class AsyncLifecycleViewTests(TestCase):
+    def setUp(self):
+        self.rider = make_user("rider@example.com", "rider")
+        self.driver = make_user("driver@example.com", "driver")
+        self.client = APIClient()
+
+    def test_bearer_token_authenticates(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.rider)}")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/rides/request/", RIDE_PAYLOAD, format="json")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["rider"]["id"], str(self.rider.id))
+
+    def test_missing_token_is_401_with_challenge(self):
+        response = self.client.post("/api/rides/request/", RIDE_PAYLOAD, format="json")
+
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("Bearer", response["WWW-Authenticate"])
+
+    def test_wrong_role_is_403(self):
+        self.client.force_authenticate(self.driver)
+        response = self.client.post("/api/rides/request/", RIDE_PAYLOAD, format="json")
+        self.assertEqual(response.status_code, 403)
+
+    def test_validation_errors_match_drf(self):
+        self.client.force_authenticate(self.driver)
+        response = self.client.post("/api/rides/offer/", {"price": "5.00"}, format="json")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("ride_request", response.json())
+
+
+class RideCityValidationTests(TestCase):
+    def setUp(self):
+        call_command("load_us_cities", stdout=StringIO())
+        city_locator.invalidate()
+        self.addCleanup(city_locator.invalidate)
+        self.client = APIClient()
+        self.client.force_authenticate(make_user("rider@example.com", "rider"))
+
+    def create(self, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post("/api/rides/request/", {**RIDE_PAYLOAD, **fields}, format="json")
+
+    def test_known_city_is_stored_with_canonical_spelling(self):
+        response = self.create(pickup_city="san francisco", pickup_state="ca")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data["pickup_city"], response.data["pickup_state"]), ("San Francisco", "CA"))
+
+    def test_known_city_far_from_its_coordinates_is_rejected(self):
+        response = self.create(dropoff_city="Sacramento")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("dropoff_city", response.data)
+
+    def test_unlisted_city_is_accepted_as_typed(self):
+        self.assertEqual(self.create(pickup_city="Presidio Heights").status_code, 201)
+
+
+class ConcurrentAcceptTests(TransactionTestCase):
+    def test_exactly_one_transition_wins_per_ride(self):
+        out = StringIO()
+        call_command("stress_accept_offers", rides=4, offers=6, cancels=3, threads=8, stdout=out)
+        self.assertIn("exactly one transition won on every ride", out.getvalue())
+
+    def test_accept_after_cancel_is_rejected(self):
+        rider = make_user("rider@example.com", "rider")
+        driver = make_user("driver@example.com", "driver")
+        ride = make_ride(rider, status="offered")
+        offer = RideOffer.objects.create(ride_request=ride, driver=driver, price="5.00")
+        client = APIClient()
+        client.force_authenticate(rider)
+
+        client.patch(f"/api/rides/request/{ride.id}/update/", {"status": "cancelled"})
+        response = client.post("/api/rides/accept-offer/", {"offer_id": str(offer.id)})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(CompletedRide.objects.filter(ride_request=ride).exists())
+        offer.refresh_from_db()
+        self.assertEqual(offer.status, "pending")
@@ -6,12 +6,15 @@ urlpatterns = [
     path("requests/", views.ListRideRequestsView.as_view(), name="list_ride_requests"),
     path("request/<uuid:pk>/", views.RideRequestDetailView.as_view(), name="ride_request_detail"),
     path("request/<uuid:pk>/update/", views.UpdateRideRequestView.as_view(), name="update_ride_request"),
+    path("request/<uuid:pk>/widen/", views.WidenRideRequestView.as_view(), name="widen_ride_request"),
     path("offer/", views.CreateRideOfferView.as_view(), name="create_ride_offer"),
     path("offers/", views.ListRideOffersView.as_view(), name="list_ride_offers"),
     path("accept-offer/", views.AcceptOfferView.as_view(), name="accept_offer"),
     path("complete/<uuid:pk>/", views.CompleteRideView.as_view(), name="complete_ride"),
     path("history/", views.RideHistoryView.as_view(), name="ride_history"),
+    path("history/summary/", views.RideHistorySummaryView.as_view(), name="ride_history_summary"),
     path("active/", views.ActiveRideView.as_view(), name="active_ride"),
     path("rate/", views.RateRideView.as_view(), name="rate_ride"),
+    path("rate-rider/", views.RateRiderView.as_view(), name="rate_rider"),
     path("pending-ratings/", views.PendingRatingsView.as_view(), name="pending_ratings"),
 ]
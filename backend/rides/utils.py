@@ -1,9 +1,13 @@
 import math
 from decimal import Decimal
 
+import numpy as np
+
+EARTH_RADIUS_MILES = 3958.8
+
 
 def haversine_miles(lat1, lon1, lat2, lon2):
-    R = 3958.8  # Earth radius in miles
+    R = EARTH_RADIUS_MILES
     lat1, lon1, lat2, lon2 = map(math.radians, [float(lat1), float(lon1), float(lat2), float(lon2)])
     dlat = lat2 - lat1
     dlon = lon2 - lon1
@@ -15,3 +19,134 @@ def haversine_miles(lat1, lon1, lat2, lon2):
 def calculate_suggested_price(distance_miles, base_rate=0.50, minimum_fare=3.00):
     price = float(distance_miles) * base_rate
     return Decimal(str(max(price, minimum_fare))).quantize(Decimal("0.01"))
+
+
+def _round_cents(values, scalar, decimal_ties=False):
+    """Round an array to cents exactly as the scalar functions do; returns integer cents.
+
+    NumPy's trig can differ from math's in the last bit, and round() and
+    Decimal.quantize() settle halves differently from floor(x + 0.5), so values
+    within a hair of a half cent are recomputed with `scalar(i)`. With
+    `decimal_ties`, values whose shortest repr is an exact half cent (the
+    Decimal(str(x)).quantize() case) are rounded half-even in bulk first.
+    """
+    scaled = values * 100
+    cents = np.floor(scaled + 0.5).astype(np.int64)
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if decimal_ties:
+        half_cents = np.rint(scaled * 2)
+        exact = near_half & (half_cents / 200 == values)
+        lower = (half_cents[exact].astype(np.int64) - 1) // 2
+        cents[exact] = lower + lower % 2
+        near_half &= ~exact
+    for i in np.flatnonzero(near_half):
+        cents[i] = round(scalar(i) * 100)
+    return cents
+
+
+def haversine_miles_batch(lat1, lon1, lat2, lon2):
+    """Vectorised haversine_miles over equal-length (or broadcastable) arrays.
+
+    Returns distances in miles as float64, equal to haversine_miles for every pair.
+    """
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(
+        *(np.asarray(values, dtype=np.float64) for values in (lat1, lon1, lat2, lon2))
+    )
+    rlat1, rlon1, rlat2, rlon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((rlat2 - rlat1) / 2) ** 2 + np.cos(rlat1) * np.cos(rlat2) * np.sin((rlon2 - rlon1) / 2) ** 2
+    raw = EARTH_RADIUS_MILES * (2 * np.arcsin(np.sqrt(a)))
+
+    def scalar(i):
+        index = np.unravel_index(i, raw.shape)
+        return haversine_miles(lat1[index], lon1[index], lat2[index], lon2[index])
+
+    return _round_cents(raw.ravel(), scalar).reshape(raw.shape) / 100
+
+
+def calculate_suggested_price_batch(distances, base_rate=0.50, minimum_fare=3.00):
+    """Vectorised calculate_suggested_price; returns integer cents."""
+    distances = np.asarray(distances, dtype=np.float64)
+    prices = np.maximum(distances * base_rate, minimum_fare).ravel()
+
+    def scalar(i):
+        return float(calculate_suggested_price(distances.flat[i], base_rate, minimum_fare))
+
+    return _round_cents(prices, scalar, decimal_ties=True).reshape(distances.shape)
+
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def _geohash_cell_size(precision):
+    """Return (lat_degrees, lng_degrees) covered by one geohash cell."""
+    bits = precision * 5
+    lng_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def _geohash_from_indexes(lat_idx, lng_idx, precision):
+    bits = precision * 5
+    lng_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    code = 0
+    # Geohash interleaves bits starting with longitude, most significant first.
+    for i in range(bits):
+        if i % 2 == 0:
+            bit = (lng_idx >> (lng_bits - 1 - i // 2)) & 1
+        else:
+            bit = (lat_idx >> (lat_bits - 1 - i // 2)) & 1
+        code = (code << 1) | bit
+    chars = []
+    for _ in range(precision):
+        chars.append(GEOHASH_ALPHABET[code & 31])
+        code >>= 5
+    return "".join(reversed(chars))
+
+
+def _geohash_indexes(lat, lng, precision):
+    lat_size, lng_size = _geohash_cell_size(precision)
+    lat_cells = int(round(180.0 / lat_size))
+    lng_cells = int(round(360.0 / lng_size))
+    lat_idx = min(int((float(lat) + 90.0) / lat_size), lat_cells - 1)
+    lng_idx = min(int((float(lng) + 180.0) / lng_size), lng_cells - 1)
+    return lat_idx, lng_idx
+
+
+def geohash_encode(lat, lng, precision=5):
+    lat_idx, lng_idx = _geohash_indexes(lat, lng, precision)
+    return _geohash_from_indexes(lat_idx, lng_idx, precision)
+
+
+def geohash_cells_within(lat, lng, radius_miles, precision):
+    """Geohash cells at `precision` that intersect a circle around (lat, lng)."""
+    lat, lng = float(lat), float(lng)
+    lat_size, lng_size = _geohash_cell_size(precision)
+    lat_cells = int(round(180.0 / lat_size))
+    lng_cells = int(round(360.0 / lng_size))
+
+    # One degree of latitude is ~69 miles; longitude shrinks with cos(lat).
+    dlat = radius_miles / 69.0
+    cos_lat = max(math.cos(math.radians(min(abs(lat) + dlat, 89.9))), 0.01)
+    dlng = min(radius_miles / (69.0 * cos_lat), 180.0)
+
+    lat_lo = max(int((lat - dlat + 90.0) // lat_size), 0)
+    lat_hi = min(int((lat + dlat + 90.0) // lat_size), lat_cells - 1)
+    lng_lo = int((lng - dlng + 180.0) // lng_size)
+    lng_hi = int((lng + dlng + 180.0) // lng_size)
+
+    cells = []
+    for lat_idx in range(lat_lo, lat_hi + 1):
+        cell_south = lat_idx * lat_size - 90.0
+        cell_north = cell_south + lat_size
+        for raw_lng_idx in range(lng_lo, lng_hi + 1):
+            lng_idx = raw_lng_idx % lng_cells
+            cell_west = raw_lng_idx * lng_size - 180.0
+            cell_east = cell_west + lng_size
+            # Distance from the centre to the closest point of the cell.
+            near_lat = min(max(lat, cell_south), cell_north)
+            near_lng = min(max(lng, cell_west), cell_east)
+            if haversine_miles(lat, lng, near_lat, near_lng) > radius_miles:
+                continue
+            cells.append(_geohash_from_indexes(lat_idx, lng_idx, precision))
+    return sorted(set(cells))
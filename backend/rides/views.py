@@ -1,29 +1,52 @@
+import hashlib
+from decimal import Decimal
+
 from rest_framework import status
+from rest_framework.exceptions import NotFound
 from rest_framework.generics import ListAPIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
-from .models import RideRequest, RideOffer, CompletedRide
+from .models import RideRequest, RideOffer, CompletedRide, inlined, inlined_all
 from .serializers import (
     RideRequestCreateSerializer,
     RideRequestSerializer,
     RideOfferCreateSerializer,
     RideOfferSerializer,
     CompletedRideSerializer,
+    fast_ride_requests,
+    fast_ride_offers,
+    fast_completed_rides,
 )
 from .utils import haversine_miles, calculate_suggested_price
+from .broadcast import DRIVER_BOARD_GROUP, driver_groups_for_request, widened_radius
+from .scheduler import schedule_fields, scheduler
+from .sync import board_changes
+from accounts.models import DriverProfile, RiderProfile
+from accounts.cards import forget_driver_card
 from accounts.permissions import IsRider, IsDriver, IsAdmin
+from locations.index import city_locator
+from notifications.outbox import publish
+from ride_project.async_views import AsyncAPIView, JSONResponse
+from ride_project.fast_serializers import FastListMixin
+from ride_project.pagination import KeysetPagination
 
 
-class CreateRideRequestView(APIView):
+class CreateRideRequestView(AsyncAPIView):
     permission_classes = [IsRider]
 
-    def post(self, request):
-        serializer = RideRequestCreateSerializer(data=request.data)
+    async def post(self, request):
+        serializer = RideRequestCreateSerializer(data=request.data, context={"cities": await city_locator.aget()})
         serializer.is_valid(raise_exception=True)
         data = serializer.validated_data
 
@@ -33,160 +56,273 @@ class CreateRideRequestView(APIView):
         )
         suggested_price = calculate_suggested_price(distance)
 
+        ride_data = await sync_to_async(self.create)(request.user, data, distance, suggested_price)
+        return JSONResponse(ride_data, status=status.HTTP_201_CREATED)
+
+    @transaction.atomic
+    def create(self, rider, data, distance, suggested_price):
         ride_request = RideRequest.objects.create(
-            rider=request.user,
+            rider=rider,
             distance_miles=distance,
             suggested_price=suggested_price,
+            broadcast_radius_miles=settings.RIDE_BROADCAST_RADIUS_MILES,
             **data,
+            **schedule_fields(data),
         )
 
-        # Broadcast to all available drivers via WebSocket
-        channel_layer = get_channel_layer()
         ride_data = RideRequestSerializer(ride_request).data
-        async_to_sync(channel_layer.group_send)(
-            "drivers_available",
+        if ride_request.expires_at is not None:
+            transaction.on_commit(scheduler.wake)
+        if ride_request.release_at is not None:
+            # Held until RIDE_SCHEDULE_LEAD_MINUTES before its window (rides.scheduler)
+            return ride_data
+
+        # Broadcast to drivers in the cells around the pickup point via WebSocket
+        publish(
+            driver_groups_for_request(ride_request),
             {
                 "type": "new_ride_request",
                 "data": ride_data,
             },
         )
-
-        return Response(ride_data, status=status.HTTP_201_CREATED)
+        return ride_data
 
 
-class ListRideRequestsView(ListAPIView):
+class ListRideRequestsView(FastListMixin, ListAPIView):
     serializer_class = RideRequestSerializer
+    fast_serializer = fast_ride_requests
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         user = self.request.user
         if user.role == "rider":
-            return RideRequest.objects.filter(rider=user)
+            return RideRequest.objects.filter(rider=user).for_listing()
         elif user.role == "driver":
-            return RideRequest.objects.filter(status__in=["pending", "offered"])
+            return RideRequest.objects.live().for_listing()
         elif user.role == "admin":
-            return RideRequest.objects.all()
+            return RideRequest.objects.for_listing()
         return RideRequest.objects.none()
 
+    def list(self, request, *args, **kwargs):
+        if "since" in request.query_params:
+            return self.sync(request)
+        return super().list(request, *args, **kwargs)
+
+    def sync(self, request):
+        """Delta sync of the driver board (rides.sync)."""
+        if request.user.role != "driver":
+            return Response(
+                {"error": "since is only available on the driver board"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            since = int(request.query_params["since"])
+            if since < 0:
+                raise ValueError
+        except ValueError:
+            raise NotFound("Invalid cursor")
+        open_ids, removed_ids, cursor, has_more = board_changes(since, settings.RIDE_SYNC_MAX_CHANGES)
+        if since > cursor:
+            # From another database or a reset one: the client has to start over with since=0
+            raise NotFound("Invalid cursor")
+
+        results = self.serialize_queryset(self.get_queryset().filter(pk__in=open_ids).order_by("change_seq"))
+        return Response({
+            "cursor": cursor,
+            "has_more": has_more,
+            "results": results,
+            "removed": [str(pk) for pk in removed_ids],
+        })
+
+
+def ride_etag(version):
+    """ETag for a polled ride from RideRequestQuerySet.version(), so an unchanged ride
+    answers If-None-Match with a 304 before it is loaded or serialized."""
+    return f'"{hashlib.md5(repr(version).encode()).hexdigest()}"'
+
+
+def ride_detail_etag(request, pk):
+    version = RideRequest.objects.filter(pk=pk).version()
+    return ride_etag(version) if version else None  # no ETag on a 404
+
 
 class RideRequestDetailView(APIView):
+    # private: the body depends on the caller; no-cache: clients revalidate every poll
+    @method_decorator(cache_control(private=True, no_cache=True))
+    @method_decorator(condition(etag_func=ride_detail_etag))
     def get(self, request, pk):
         try:
-            ride_request = RideRequest.objects.get(pk=pk)
+            ride_request = RideRequest.objects.for_listing().get(pk=pk)
             return Response(RideRequestSerializer(ride_request).data)
         except RideRequest.DoesNotExist:
             return Response({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
 
 
-class UpdateRideRequestView(APIView):
+class UpdateRideRequestView(AsyncAPIView):
     permission_classes = [IsRider]
 
-    def patch(self, request, pk):
+    async def patch(self, request, pk):
         try:
-            ride_request = RideRequest.objects.get(pk=pk, rider=request.user)
+            ride_request = await RideRequest.objects.aget(pk=pk, rider=request.user)
         except RideRequest.DoesNotExist:
-            return Response({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+            return JSONResponse({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
 
         new_status = request.data.get("status")
-        if new_status == "cancelled" and ride_request.status in ["pending", "offered"]:
-            ride_request.status = "cancelled"
-            ride_request.save(update_fields=["status"])
-
-            channel_layer = get_channel_layer()
-            async_to_sync(channel_layer.group_send)(
-                "drivers_available",
-                {"type": "ride_cancelled", "ride_request_id": str(ride_request.id)},
-            )
+        if new_status == "cancelled":
+            await sync_to_async(self.cancel)(ride_request)
 
-        return Response(RideRequestSerializer(ride_request).data)
+        ride_request = await RideRequest.objects.for_listing().aget(pk=pk)
+        return JSONResponse(RideRequestSerializer(ride_request).data)
 
+    @transaction.atomic
+    def cancel(self, ride_request):
+        # Compare-and-set so a cancel racing an accept cannot both win
+        cancelled = RideRequest.objects.filter(
+            pk=ride_request.pk, status__in=["pending", "offered"]
+        ).update_tracked(status="cancelled")
+        if cancelled:
+            publish(DRIVER_BOARD_GROUP, {"type": "ride_cancelled", "ride_request_id": str(ride_request.id)})
 
-class CreateRideOfferView(APIView):
-    permission_classes = [IsDriver]
 
-    def post(self, request):
-        serializer = RideOfferCreateSerializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+class WidenRideRequestView(APIView):
+    permission_classes = [IsRider]
+
+    def post(self, request, pk):
+        try:
+            ride_request = RideRequest.objects.get(pk=pk, rider=request.user)
+        except RideRequest.DoesNotExist:
+            return Response({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        ride_request = serializer.validated_data["ride_request"]
         if ride_request.status not in ["pending", "offered"]:
             return Response(
                 {"error": "This ride is no longer accepting offers"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        offer = serializer.save(driver=request.user)
+        radius = widened_radius(ride_request)
+        if radius is None:
+            return Response(
+                {"error": "Broadcast radius is already at its maximum"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Only drivers in the newly covered cells have not seen this request yet
+        previous_groups = set(driver_groups_for_request(ride_request))
+        with transaction.atomic():
+            ride_request.broadcast_radius_miles = radius
+            ride_request.save(update_fields=["broadcast_radius_miles"])
+            ride_data = RideRequestSerializer(ride_request).data
+            if ride_request.release_at is not None:
+                # Not out yet; the scheduler releases it to the widened cells
+                return Response(ride_data)
+            new_groups = [g for g in driver_groups_for_request(ride_request) if g not in previous_groups]
+
+            publish(new_groups, {"type": "new_ride_request", "data": ride_data})
+
+        return Response(ride_data)
+
+
+class CreateRideOfferView(AsyncAPIView):
+    permission_classes = [IsDriver]
+
+    async def post(self, request):
+        offer_data = await sync_to_async(self.create)(request.data, request.user)
+        if offer_data is None:
+            return JSONResponse(
+                {"error": "This ride is no longer accepting offers"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return JSONResponse(offer_data, status=status.HTTP_201_CREATED)
+
+    @transaction.atomic
+    def create(self, data, driver):
+        serializer = RideOfferCreateSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
 
-        if ride_request.status == "pending":
-            ride_request.status = "offered"
-            ride_request.save(update_fields=["status"])
+        ride_request = serializer.validated_data["ride_request"]
+        # Moves pending -> offered, and fails if the ride was accepted, cancelled or expired
+        # meanwhile, or is still held by the scheduler
+        still_open = RideRequest.objects.live().filter(pk=ride_request.pk).update_tracked(status="offered")
+        if not still_open:
+            return None
+        offer = serializer.save(driver=driver)
 
         # Notify the rider via WebSocket
-        channel_layer = get_channel_layer()
         offer_data = RideOfferSerializer(offer).data
-        async_to_sync(channel_layer.group_send)(
-            f"ride_request_{ride_request.id}",
-            {"type": "new_offer", "data": offer_data},
-        )
+        publish(f"ride_request_{ride_request.id}", {"type": "new_offer", "data": offer_data})
+        return offer_data
 
-        return Response(offer_data, status=status.HTTP_201_CREATED)
 
-
-class ListRideOffersView(ListAPIView):
+class ListRideOffersView(FastListMixin, ListAPIView):
     serializer_class = RideOfferSerializer
+    fast_serializer = fast_ride_offers
 
     def get_queryset(self):
         ride_request_id = self.request.query_params.get("ride_request")
         if ride_request_id:
-            return RideOffer.objects.filter(ride_request_id=ride_request_id)
+            return RideOffer.objects.filter(ride_request_id=ride_request_id).for_listing()
         return RideOffer.objects.none()
 
 
-class AcceptOfferView(APIView):
+class AcceptOfferView(AsyncAPIView):
     permission_classes = [IsRider]
 
-    def post(self, request):
+    async def post(self, request):
         offer_id = request.data.get("offer_id")
         try:
-            offer = RideOffer.objects.select_related("ride_request", "driver").get(pk=offer_id)
+            offer = await RideOffer.objects.select_related("ride_request", "driver").aget(pk=offer_id)
         except RideOffer.DoesNotExist:
-            return Response({"error": "Offer not found"}, status=status.HTTP_404_NOT_FOUND)
+            return JSONResponse({"error": "Offer not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        ride_request = offer.ride_request
-        if ride_request.rider != request.user:
-            return Response({"error": "Not your ride"}, status=status.HTTP_403_FORBIDDEN)
+        if offer.ride_request.rider_id != request.user.id:
+            return JSONResponse({"error": "Not your ride"}, status=status.HTTP_403_FORBIDDEN)
 
-        if ride_request.status not in ["pending", "offered"]:
-            return Response({"error": "Ride already accepted"}, status=status.HTTP_400_BAD_REQUEST)
+        ride_data = await sync_to_async(self.accept)(offer, request.user)
+        if ride_data is None:
+            return JSONResponse({"error": "Ride already accepted"}, status=status.HTTP_400_BAD_REQUEST)
+        return JSONResponse(ride_data)
 
-        # Accept the offer
-        offer.status = "accepted"
-        offer.save(update_fields=["status"])
-
-        # Reject all other offers
-        RideOffer.objects.filter(ride_request=ride_request).exclude(pk=offer.pk).update(status="rejected")
+    @transaction.atomic
+    def accept(self, offer, rider):
+        ride_request = offer.ride_request
+        now = timezone.now()
+        # The conditional UPDATE is the only check that counts: of any number of
+        # concurrent accepts and cancels, exactly one sees an open ride.
+        accepted = RideRequest.objects.filter(
+            pk=ride_request.pk, status__in=["pending", "offered"]
+        ).update_tracked(status="accepted", accepted_offer=offer, updated_at=now)
+        if not accepted:
+            return None
+
+        RideOffer.objects.filter(pk=offer.pk).update(status="accepted", updated_at=now)
+        RideOffer.objects.filter(ride_request=ride_request).exclude(pk=offer.pk).update(
+            status="rejected", updated_at=now
+        )
 
-        # Update ride request
-        ride_request.status = "accepted"
-        ride_request.accepted_offer = offer
-        ride_request.save(update_fields=["status", "accepted_offer"])
+        # Auto-add to ride history so drivers can revisit who they helped
+        CompletedRide.objects.create(
+            ride_request=ride_request,
+            driver=offer.driver,
+            rider=rider,
+            final_price=offer.price,
+            distance_miles=ride_request.distance_miles,
+            pickup_time=now,
+        )
 
-        channel_layer = get_channel_layer()
+        ride_request = RideRequest.objects.for_listing().get(pk=ride_request.pk)
         ride_data = RideRequestSerializer(ride_request).data
+        self.notify(offer, ride_request, ride_data)
+        return ride_data
 
+    def notify(self, offer, ride_request, ride_data):
         # Notify the accepted driver
-        async_to_sync(channel_layer.group_send)(
-            f"driver_{offer.driver.id}",
-            {"type": "offer_accepted", "data": ride_data},
-        )
+        publish(f"driver_{offer.driver.id}", {"type": "offer_accepted", "data": ride_data})
 
-        # Tell all drivers to remove this request
-        async_to_sync(channel_layer.group_send)(
-            "drivers_available",
-            {"type": "ride_cancelled", "ride_request_id": str(ride_request.id)},
-        )
+        # Take it off every driver's board
+        publish(DRIVER_BOARD_GROUP, {"type": "ride_cancelled", "ride_request_id": str(ride_request.id)})
 
         # Notify rider's WS channel
-        async_to_sync(channel_layer.group_send)(
+        publish(
             f"ride_request_{ride_request.id}",
             {
                 "type": "ride_confirmed",
@@ -202,131 +338,172 @@ class AcceptOfferView(APIView):
             },
         )
 
-        # Auto-add to ride history so drivers can revisit who they helped
-        CompletedRide.objects.create(
-            ride_request=ride_request,
-            driver=offer.driver,
-            rider=request.user,
-            final_price=offer.price,
-            distance_miles=ride_request.distance_miles,
-            pickup_time=timezone.now(),
-        )
-
-        return Response(ride_data)
-
 
-class CompleteRideView(APIView):
+class CompleteRideView(AsyncAPIView):
     permission_classes = [IsDriver]
 
-    def post(self, request, pk):
+    async def post(self, request, pk):
         try:
-            ride_request = RideRequest.objects.get(pk=pk, status="accepted")
+            ride_request = await RideRequest.objects.select_related("accepted_offer").aget(pk=pk, status="accepted")
         except RideRequest.DoesNotExist:
-            return Response({"error": "Ride not found"}, status=status.HTTP_404_NOT_FOUND)
+            return JSONResponse({"error": "Ride not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        if ride_request.accepted_offer.driver != request.user:
-            return Response({"error": "Not your ride"}, status=status.HTTP_403_FORBIDDEN)
+        if ride_request.accepted_offer.driver_id != request.user.id:
+            return JSONResponse({"error": "Not your ride"}, status=status.HTTP_403_FORBIDDEN)
 
-        ride_request.status = "completed"
-        ride_request.save(update_fields=["status"])
+        ride_data = await sync_to_async(self.complete)(ride_request, request.user)
+        if ride_data is None:
+            return JSONResponse({"error": "Ride not found"}, status=status.HTTP_404_NOT_FOUND)
+        return JSONResponse(ride_data)
 
-        # Update the existing history entry (created at acceptance) with completion details
-        CompletedRide.objects.filter(ride_request=ride_request).update(
-            dropoff_time=timezone.now(),
+    @transaction.atomic
+    def complete(self, ride_request, driver):
+        now = timezone.now()
+        completed = RideRequest.objects.filter(pk=ride_request.pk, status="accepted").update_tracked(
+            status="completed", updated_at=now
         )
+        if not completed:
+            return None
+
+        # Update the existing history entry (created at acceptance) with completion details
+        CompletedRide.objects.filter(ride_request=ride_request).update(dropoff_time=now)
 
         # Update profiles
-        driver_profile = request.user.driver_profile
-        driver_profile.total_rides += 1
-        driver_profile.save(update_fields=["total_rides"])
+        DriverProfile.objects.filter(user=driver).update(total_rides=F("total_rides") + 1)
+        forget_driver_card(driver.pk)
+        RiderProfile.objects.filter(user_id=ride_request.rider_id).update(total_rides=F("total_rides") + 1)
 
-        rider_profile = ride_request.rider.rider_profile
-        rider_profile.total_rides += 1
-        rider_profile.save(update_fields=["total_rides"])
+        ride_request = RideRequest.objects.for_listing().get(pk=ride_request.pk)
+        ride_data = RideRequestSerializer(ride_request).data
 
         # Notify rider
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            f"rider_{ride_request.rider.id}",
-            {"type": "ride_completed", "data": RideRequestSerializer(ride_request).data},
-        )
-
-        return Response(RideRequestSerializer(ride_request).data)
+        publish(f"rider_{ride_request.rider_id}", {"type": "ride_completed", "data": ride_data})
+        return ride_data
 
 
-class RideHistoryView(ListAPIView):
+class RideHistoryView(FastListMixin, ListAPIView):
     serializer_class = CompletedRideSerializer
+    fast_serializer = fast_completed_rides
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         user = self.request.user
         if user.role == "rider":
-            return CompletedRide.objects.filter(rider=user)
+            return CompletedRide.objects.filter(rider=user).for_listing()
         elif user.role == "driver":
-            return CompletedRide.objects.filter(driver=user)
+            return CompletedRide.objects.filter(driver=user).for_listing()
         return CompletedRide.objects.none()
 
 
-class ActiveRideView(APIView):
+class RideHistorySummaryView(APIView):
+    """Totals over the whole ride history, which RideHistoryView serves a page at a time."""
+
     def get(self, request):
-        user = request.user
-        if user.role == "rider":
-            ride = RideRequest.objects.filter(
-                rider=user, status__in=["pending", "offered", "accepted", "in_progress"]
-            ).first()
-        elif user.role == "driver":
-            ride = RideRequest.objects.filter(
-                accepted_offer__driver=user, status__in=["accepted", "in_progress"]
-            ).first()
-        else:
-            ride = None
+        rides = RideHistoryView(request=request).get_queryset().order_by()
+        return Response(
+            rides.aggregate(
+                total_rides=Count("pk"),
+                completed_rides=Count("pk", filter=Q(dropoff_time__isnull=False)),
+                total_earnings=Coalesce(Sum("final_price"), Decimal("0")),
+            )
+        )
+
 
+def active_rides(user):
+    if user.role == "rider":
+        return RideRequest.objects.filter(rider=user, status__in=["pending", "offered", "accepted", "in_progress"])
+    elif user.role == "driver":
+        # Walks the driver's accepted offers newest first (offer_driver_accepted_idx)
+        return RideRequest.objects.filter(
+            accepted_offer__driver=user,
+            accepted_offer__status=inlined("accepted"),
+            status__in=inlined_all("accepted", "in_progress"),
+        ).order_by("-accepted_offer__created_at")
+    return RideRequest.objects.none()
+
+
+def active_ride_etag(request):
+    return ride_etag(active_rides(request.user).version())
+
+
+class ActiveRideView(APIView):
+    @method_decorator(cache_control(private=True, no_cache=True))
+    @method_decorator(condition(etag_func=active_ride_etag))
+    def get(self, request):
+        ride = active_rides(request.user).for_listing().first()
         if ride:
             return Response(RideRequestSerializer(ride).data)
         return Response(None)
 
 
+def parse_rating(request):
+    """Return (ride_id, rating, error_response) from a rating POST body."""
+    ride_id = request.data.get("ride_id")
+    rating = request.data.get("rating")
+
+    if not ride_id or not rating:
+        return None, None, Response({"error": "ride_id and rating required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        rating = int(rating)
+        if not (1 <= rating <= 5):
+            raise ValueError
+    except (ValueError, TypeError):
+        return None, None, Response({"error": "Rating must be 1–5"}, status=status.HTTP_400_BAD_REQUEST)
+
+    return ride_id, rating, None
+
+
 class RateRideView(APIView):
     permission_classes = [IsRider]
 
     def post(self, request):
-        ride_id = request.data.get("ride_id")
-        rating = request.data.get("rating")
+        ride_id, rating, error = parse_rating(request)
+        if error:
+            return error
         review_text = request.data.get("review_text", "").strip()
 
-        if not ride_id or not rating:
-            return Response({"error": "ride_id and rating required"}, status=status.HTTP_400_BAD_REQUEST)
-
-        try:
-            rating = int(rating)
-            if not (1 <= rating <= 5):
-                raise ValueError
-        except (ValueError, TypeError):
-            return Response({"error": "Rating must be 1–5"}, status=status.HTTP_400_BAD_REQUEST)
-
         try:
-            completed_ride = CompletedRide.objects.select_related("driver__driver_profile").get(
-                id=ride_id, rider=request.user
-            )
+            completed_ride = CompletedRide.objects.get(id=ride_id, rider=request.user)
         except CompletedRide.DoesNotExist:
             return Response({"error": "Ride not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        if completed_ride.driver_rating is not None:
-            return Response({"error": "Already rated"}, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            # Conditional update so a double submit cannot count the rating twice
+            rated = CompletedRide.objects.filter(pk=completed_ride.pk, driver_rating__isnull=True).update(
+                driver_rating=rating, review_text=review_text
+            )
+            if not rated:
+                return Response({"error": "Already rated"}, status=status.HTTP_400_BAD_REQUEST)
+            DriverProfile.record_rating(completed_ride.driver_id, rating)
+            forget_driver_card(completed_ride.driver_id)
 
-        completed_ride.driver_rating = rating
-        completed_ride.review_text = review_text
-        completed_ride.save(update_fields=["driver_rating", "review_text"])
+        completed_ride = CompletedRide.objects.for_listing().get(pk=completed_ride.pk)
+        return Response(CompletedRideSerializer(completed_ride).data)
 
-        # Recalculate driver's average rating
-        driver_profile = completed_ride.driver.driver_profile
-        all_ratings = list(
-            CompletedRide.objects.filter(
-                driver=completed_ride.driver, driver_rating__isnull=False
-            ).values_list("driver_rating", flat=True)
-        )
-        driver_profile.rating = round(sum(all_ratings) / len(all_ratings), 2) if all_ratings else 5.0
-        driver_profile.save(update_fields=["rating"])
 
+class RateRiderView(APIView):
+    permission_classes = [IsDriver]
+
+    def post(self, request):
+        ride_id, rating, error = parse_rating(request)
+        if error:
+            return error
+
+        try:
+            completed_ride = CompletedRide.objects.get(id=ride_id, driver=request.user)
+        except CompletedRide.DoesNotExist:
+            return Response({"error": "Ride not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        with transaction.atomic():
+            rated = CompletedRide.objects.filter(pk=completed_ride.pk, rider_rating__isnull=True).update(
+                rider_rating=rating
+            )
+            if not rated:
+                return Response({"error": "Already rated"}, status=status.HTTP_400_BAD_REQUEST)
+            RiderProfile.record_rating(completed_ride.rider_id, rating)
+
+        completed_ride = CompletedRide.objects.for_listing().get(pk=completed_ride.pk)
         return Response(CompletedRideSerializer(completed_ride).data)
 
 
@@ -339,10 +516,11 @@ class PendingRatingsView(ListAPIView):
             rider=self.request.user,
             driver_rating__isnull=True,
             dropoff_time__isnull=False,
-        ).select_related("driver__driver_profile", "ride_request")
+        ).for_listing()
 
 
 class AdminRidesView(ListAPIView):
     permission_classes = [IsAdmin]
     serializer_class = RideRequestSerializer
-    queryset = RideRequest.objects.all()
+    pagination_class = KeysetPagination
+    queryset = RideRequest.objects.for_listing()
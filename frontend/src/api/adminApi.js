@@ -1,8 +1,9 @@
 import api from "./axiosInstance";
+import { fetchPage } from "./pagination";
 
-export const getUsers = () => api.get("/admin/users/");
+export const getUsers = (cursor, pageSize) => fetchPage("/admin/users/", { cursor, pageSize });
 export const createUser = (data) => api.post("/admin/users/create/", data);
 export const deleteUser = (userId) => api.delete(`/admin/users/${userId}/`);
-export const getOnlineUsers = () => api.get("/admin/online-users/");
+export const getOnlineUsers = (cursor, pageSize) => fetchPage("/admin/online-users/", { cursor, pageSize });
 export const getStats = () => api.get("/admin/stats/");
-export const getAdminRides = () => api.get("/admin/rides/");
+export const getAdminRides = (cursor, pageSize) => fetchPage("/admin/rides/", { cursor, pageSize });
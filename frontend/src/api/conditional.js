@@ -0,0 +1,26 @@
+import api from "./axiosInstance";
+
+// Polled endpoints answer with an ETag; sending it back as If-None-Match gets a
+// bodiless 304 while nothing changed, and we reuse the last body we saw.
+const lastSeen = new Map(); // url -> { etag, data }
+
+export const getConditional = async (url) => {
+  const cached = lastSeen.get(url);
+  const response = await api.get(url, {
+    headers: cached ? { "If-None-Match": cached.etag } : {},
+    validateStatus: (status) => (status >= 200 && status < 300) || (status === 304 && cached),
+  });
+  if (response.status === 304) {
+    return { ...response, data: cached.data };
+  }
+  const etag = response.headers.etag;
+  if (etag) {
+    lastSeen.set(url, { etag, data: response.data });
+  } else {
+    lastSeen.delete(url);
+  }
+  return response;
+};
+
+// Drop remembered bodies (on logout, so the next user starts clean)
+export const clearConditional = () => lastSeen.clear();
@@ -11,3 +11,23 @@ export const getDistance = async (fromLat, fromLng, toLat, toLng) => {
   );
   return data;
 };
+
+// pairs: [[fromLat, fromLng, toLat, toLng], ...] -> { distance_miles: [...], suggested_price: [...] }
+export const getDistances = async (pairs) => {
+  const { data } = await api.post("/locations/distance/batch/", { pairs });
+  return data;
+};
+
+// Matrix indexed [origin][destination]; origins and destinations are [[lat, lng], ...]
+export const getDistanceMatrix = async (origins, destinations) => {
+  const { data } = await api.post("/locations/distance/batch/", { origins, destinations });
+  return data;
+};
+
+// Closest k cities to a point, or every city within radius miles when radius is given
+export const getNearestCities = async (lat, lng, { k = 1, radius } = {}) => {
+  const params = new URLSearchParams({ lat, lng, k });
+  if (radius !== undefined) params.set("radius", radius);
+  const { data } = await api.get(`/locations/nearest/?${params}`);
+  return data;
+};
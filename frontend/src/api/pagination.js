@@ -0,0 +1,8 @@
+import api from "./axiosInstance";
+
+// List endpoints return { next, results } pages ordered newest first.
+// `next` is null on the last page; otherwise its `cursor` param fetches the next one.
+export const cursorFromNext = (next) => (next ? new URL(next).searchParams.get("cursor") : null);
+
+export const fetchPage = (url, { cursor, pageSize } = {}) =>
+  api.get(url, { params: { cursor: cursor || undefined, page_size: pageSize } });
@@ -1,14 +1,22 @@
 import api from "./axiosInstance";
+import { getConditional } from "./conditional";
+import { fetchPage } from "./pagination";
 
 export const createRideRequest = (data) => api.post("/rides/request/", data);
-export const listRideRequests = () => api.get("/rides/requests/");
-export const getRideRequest = (id) => api.get(`/rides/request/${id}/`);
+export const listRideRequests = (cursor, pageSize) => fetchPage("/rides/requests/", { cursor, pageSize });
+// Driver board delta sync: changes after `since` (0 = whole board) -> { cursor, has_more, results, removed }
+export const syncRideBoard = (since) => api.get("/rides/requests/", { params: { since } });
+export const getRideRequest = (id) => getConditional(`/rides/request/${id}/`);
 export const cancelRideRequest = (id) => api.patch(`/rides/request/${id}/update/`, { status: "cancelled" });
+export const widenRideRequest = (id) => api.post(`/rides/request/${id}/widen/`);
 export const createRideOffer = (data) => api.post("/rides/offer/", data);
 export const listRideOffers = (rideRequestId) => api.get(`/rides/offers/?ride_request=${rideRequestId}`);
 export const acceptOffer = (offerId) => api.post("/rides/accept-offer/", { offer_id: offerId });
 export const completeRide = (id) => api.post(`/rides/complete/${id}/`);
-export const getRideHistory = () => api.get("/rides/history/");
-export const getActiveRide = () => api.get("/rides/active/");
+export const getRideHistory = (cursor, pageSize) => fetchPage("/rides/history/", { cursor, pageSize });
+// Totals over the whole history -> { total_rides, completed_rides, total_earnings }
+export const getRideHistorySummary = () => api.get("/rides/history/summary/");
+export const getActiveRide = () => getConditional("/rides/active/");
 export const rateRide = (data) => api.post("/rides/rate/", data);
+export const rateRider = (data) => api.post("/rides/rate-rider/", data);
 export const getPendingRatings = () => api.get("/rides/pending-ratings/");
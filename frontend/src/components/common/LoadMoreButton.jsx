@@ -0,0 +1,13 @@
+export default function LoadMoreButton({ onClick, loading }) {
+  return (
+    <div className="text-center mt-6">
+      <button
+        onClick={onClick}
+        disabled={loading}
+        className="px-6 py-2 rounded-xl text-sm font-medium bg-white/5 border border-white/10 text-slate-300 hover:text-white disabled:opacity-50"
+      >
+        {loading ? "Loading..." : "Load more"}
+      </button>
+    </div>
+  );
+}
@@ -7,6 +7,7 @@ const statusConfig = {
   in_progress: { bg: "bg-purple-500/20", text: "text-purple-300", dot: "bg-purple-400" },
   completed: { bg: "bg-emerald-500/20", text: "text-emerald-300", dot: "bg-emerald-400" },
   cancelled: { bg: "bg-red-500/20", text: "text-red-300", dot: "bg-red-400" },
+  expired: { bg: "bg-slate-500/20", text: "text-slate-300", dot: "bg-slate-400" },
   rejected: { bg: "bg-red-500/20", text: "text-red-300", dot: "bg-red-400" },
   online: { bg: "bg-green-500/20", text: "text-green-300", dot: "bg-green-400" },
   offline: { bg: "bg-slate-500/20", text: "text-slate-300", dot: "bg-slate-400" },
@@ -45,13 +45,14 @@ function StarPicker({ value, onChange }) {
 
 /**
  * Props:
- *  ride        – CompletedRide object (must have id, driver, ride_request, driver_vehicle)
- *  onSubmit    – async fn({ ride_id, rating, review_text }) → void
+ *  ride        – CompletedRide object (must have id, driver, rider, ride_request, driver_vehicle)
+ *  onSubmit    – async fn({ ride_id, rating, review_text }) → void; no review_text when rating a rider
  *  onSkip      – fn() → void
  *  total       – total pending ratings count (for "1 of N" display)
  *  current     – current index (1-based)
+ *  subject     – "driver" (a rider rating their driver) or "rider" (a driver rating their rider)
  */
-export default function RatingModal({ ride, onSubmit, onSkip, total = 1, current = 1 }) {
+export default function RatingModal({ ride, onSubmit, onSkip, total = 1, current = 1, subject = "driver" }) {
   const [rating, setRating] = useState(0);
   const [review, setReview] = useState("");
   const [loading, setLoading] = useState(false);
@@ -65,7 +66,9 @@ export default function RatingModal({ ride, onSubmit, onSkip, total = 1, current
     setLoading(true);
     setError("");
     try {
-      await onSubmit({ ride_id: ride.id, rating, review_text: review });
+      await onSubmit(
+        ratesDriver ? { ride_id: ride.id, rating, review_text: review } : { ride_id: ride.id, rating }
+      );
     } catch {
       setError("Failed to submit. Please try again.");
     } finally {
@@ -73,7 +76,8 @@ export default function RatingModal({ ride, onSubmit, onSkip, total = 1, current
     }
   };
 
-  const driver = ride?.driver;
+  const ratesDriver = subject === "driver";
+  const person = ratesDriver ? ride?.driver : ride?.rider;
   const from = ride?.ride_request?.pickup_city || "Pickup";
   const to = ride?.ride_request?.dropoff_city || "Dropoff";
 
@@ -95,7 +99,7 @@ export default function RatingModal({ ride, onSubmit, onSkip, total = 1, current
         {/* Header */}
         <div className="flex items-start justify-between mb-5">
           <div>
-            <h2 className="text-xl font-bold text-white">Rate your driver</h2>
+            <h2 className="text-xl font-bold text-white">Rate your {subject}</h2>
             {total > 1 && (
               <p className="text-xs text-slate-500 mt-0.5">{current} of {total} pending</p>
             )}
@@ -108,14 +112,14 @@ export default function RatingModal({ ride, onSubmit, onSkip, total = 1, current
           </button>
         </div>
 
-        {/* Driver card */}
+        {/* Driver or rider card */}
         <div className="flex items-center gap-3 p-4 bg-white/5 border border-white/10 rounded-2xl mb-6">
           <div className="w-12 h-12 bg-gradient-to-br from-primary-400 to-accent-500 rounded-full flex items-center justify-center text-white font-bold text-lg shrink-0">
-            {driver?.full_name?.[0] || "D"}
+            {person?.full_name?.[0] || (ratesDriver ? "D" : "R")}
           </div>
           <div className="min-w-0">
-            <p className="font-semibold text-white">{driver?.full_name}</p>
-            {ride.driver_vehicle && (
+            <p className="font-semibold text-white">{person?.full_name}</p>
+            {ratesDriver && ride.driver_vehicle && (
               <p className="text-xs text-slate-400 truncate">{ride.driver_vehicle}</p>
             )}
             <p className="text-xs text-slate-500 mt-0.5">
@@ -130,21 +134,23 @@ export default function RatingModal({ ride, onSubmit, onSkip, total = 1, current
           <StarPicker value={rating} onChange={setRating} />
         </div>
 
-        {/* Review text */}
-        <div className="mb-5">
-          <label className="block text-xs text-slate-400 mb-1.5">
-            Leave a short review <span className="text-slate-600">(optional)</span>
-          </label>
-          <textarea
-            value={review}
-            onChange={(e) => setReview(e.target.value)}
-            maxLength={300}
-            rows={3}
-            placeholder="Great ride! Very punctual and friendly driver..."
-            className="w-full px-4 py-3 bg-white/5 border border-white/10 rounded-xl text-white placeholder-slate-600 focus:outline-none focus:ring-2 focus:ring-primary-500/50 resize-none text-sm transition-all"
-          />
-          <p className="text-right text-xs text-slate-600 mt-1">{review.length}/300</p>
-        </div>
+        {/* Review text (rider ratings have none) */}
+        {ratesDriver && (
+          <div className="mb-5">
+            <label className="block text-xs text-slate-400 mb-1.5">
+              Leave a short review <span className="text-slate-600">(optional)</span>
+            </label>
+            <textarea
+              value={review}
+              onChange={(e) => setReview(e.target.value)}
+              maxLength={300}
+              rows={3}
+              placeholder="Great ride! Very punctual and friendly driver..."
+              className="w-full px-4 py-3 bg-white/5 border border-white/10 rounded-xl text-white placeholder-slate-600 focus:outline-none focus:ring-2 focus:ring-primary-500/50 resize-none text-sm transition-all"
+            />
+            <p className="text-right text-xs text-slate-600 mt-1">{review.length}/300</p>
+          </div>
+        )}
 
         {error && (
           <p className="text-red-400 text-sm mb-3 text-center">{error}</p>
@@ -1,5 +1,6 @@
 import { createContext, useContext, useState, useEffect, useCallback } from "react";
 import { loginUser, registerUser, logoutUser, getProfile } from "../api/authApi";
+import { clearConditional } from "../api/conditional";
 
 const AuthContext = createContext(null);
 
@@ -65,6 +66,7 @@ export function AuthProvider({ children }) {
     localStorage.removeItem("access_token");
     localStorage.removeItem("refresh_token");
     localStorage.removeItem("user");
+    clearConditional();
     setUser(null);
   }, []);
 
@@ -0,0 +1,36 @@
+import { useState, useEffect, useCallback } from "react";
+import { cursorFromNext } from "../api/pagination";
+
+// A cursor-paginated list loaded on demand: the first page on mount, one more per loadMore().
+// `fetchPage(cursor)` must be stable (a module-level api function).
+export function useCursorList(fetchPage) {
+  const [items, setItems] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+
+  const reload = useCallback(
+    () =>
+      fetchPage()
+        .then((r) => {
+          setItems(r.data.results);
+          setNextCursor(cursorFromNext(r.data.next));
+        })
+        .finally(() => setLoading(false)),
+    [fetchPage]
+  );
+
+  useEffect(() => { reload(); }, [reload]);
+
+  const loadMore = () => {
+    setLoadingMore(true);
+    fetchPage(nextCursor)
+      .then((r) => {
+        setItems((prev) => [...prev, ...r.data.results]);
+        setNextCursor(cursorFromNext(r.data.next));
+      })
+      .finally(() => setLoadingMore(false));
+  };
+
+  return { items, setItems, loading, loadingMore, hasMore: nextCursor !== null, loadMore, reload };
+}
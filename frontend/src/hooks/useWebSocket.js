@@ -4,8 +4,11 @@ export function useWebSocket(url, { onMessage, enabled = true } = {}) {
   const [isConnected, setIsConnected] = useState(false);
   const wsRef = useRef(null);
   const reconnectTimer = useRef(null);
+  const pingTimer = useRef(null);
   const onMessageRef = useRef(onMessage);
   onMessageRef.current = onMessage;
+  // Last sequence number seen per group; sent on reconnect so the server replays what we missed
+  const lastSeq = useRef({});
 
   const connect = useCallback(() => {
     if (!enabled || !url) return;
@@ -13,36 +16,51 @@ export function useWebSocket(url, { onMessage, enabled = true } = {}) {
     if (!token) return;
 
     const separator = url.includes("?") ? "&" : "?";
+    const since = Object.entries(lastSeq.current).map(([group, seq]) => `${group}:${seq}`).join(",");
+    const query = `${separator}token=${token}${since ? `&since=${since}` : ""}`;
     let wsUrl;
     if (import.meta.env.VITE_WS_URL) {
-      wsUrl = `${import.meta.env.VITE_WS_URL}${url}${separator}token=${token}`;
+      wsUrl = `${import.meta.env.VITE_WS_URL}${url}${query}`;
     } else {
       const protocol = window.location.protocol === "https:" ? "wss" : "ws";
-      wsUrl = `${protocol}://${window.location.host}${url}${separator}token=${token}`;
+      wsUrl = `${protocol}://${window.location.host}${url}${query}`;
     }
     const ws = new WebSocket(wsUrl);
     wsRef.current = ws;
 
-    ws.onopen = () => setIsConnected(true);
+    ws.onopen = () => {
+      setIsConnected(true);
+      // Keeps this socket counted as present by the server (accounts/presence.py)
+      pingTimer.current = setInterval(() => ws.send(JSON.stringify({ type: "ping" })), 30000);
+    };
     ws.onmessage = (event) => {
       try {
         const data = JSON.parse(event.data);
+        if (data.group && data.seq) lastSeq.current[data.group] = data.seq;
+        // "resync_required": the server no longer has what we missed on data.group; refetch over REST
+        if (data.type === "resync_required") delete lastSeq.current[data.group];
         onMessageRef.current?.(data);
       } catch {
         // ignore
       }
     };
     ws.onclose = () => {
+      clearInterval(pingTimer.current);
       setIsConnected(false);
       reconnectTimer.current = setTimeout(connect, 3000);
     };
     ws.onerror = () => ws.close();
   }, [url, enabled]);
 
+  useEffect(() => {
+    lastSeq.current = {};
+  }, [url]);
+
   useEffect(() => {
     connect();
     return () => {
       clearTimeout(reconnectTimer.current);
+      clearInterval(pingTimer.current);
       if (wsRef.current) {
         wsRef.current.onclose = null;
         wsRef.current.close();
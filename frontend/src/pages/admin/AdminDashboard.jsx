@@ -5,22 +5,23 @@ import Navbar from "../../components/common/Navbar";
 import AnimatedPage from "../../components/common/AnimatedPage";
 import StatusBadge from "../../components/common/StatusBadge";
 import LoadingSpinner from "../../components/common/LoadingSpinner";
+import LoadMoreButton from "../../components/common/LoadMoreButton";
 import { getStats, getOnlineUsers } from "../../api/adminApi";
+import { useCursorList } from "../../hooks/useCursorList";
 import { fadeInUp, staggerContainer } from "../../styles/animations";
 
 export default function AdminDashboard() {
   const [stats, setStats] = useState(null);
-  const [onlineUsers, setOnlineUsers] = useState([]);
-  const [loading, setLoading] = useState(true);
+  const [statsLoading, setStatsLoading] = useState(true);
+  const { items: onlineUsers, loading: usersLoading, loadingMore, hasMore, loadMore } = useCursorList(getOnlineUsers);
 
   useEffect(() => {
-    Promise.all([
-      getStats().then((r) => setStats(r.data)),
-      getOnlineUsers().then((r) => setOnlineUsers(r.data)),
-    ]).finally(() => setLoading(false));
+    getStats()
+      .then((r) => setStats(r.data))
+      .finally(() => setStatsLoading(false));
   }, []);
 
-  if (loading) return <><Navbar /><LoadingSpinner text="Loading admin dashboard..." /></>;
+  if (statsLoading || usersLoading) return <><Navbar /><LoadingSpinner text="Loading admin dashboard..." /></>;
 
   return (
     <>
@@ -76,7 +77,7 @@ export default function AdminDashboard() {
         {onlineUsers.length > 0 && (
           <div>
             <h2 className="text-xl font-semibold text-white mb-4">
-              Currently Online ({onlineUsers.length})
+              Currently Online ({stats?.online_users ?? onlineUsers.length})
             </h2>
             <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-3">
               {onlineUsers.map((user) => (
@@ -102,6 +103,7 @@ export default function AdminDashboard() {
                 </motion.div>
               ))}
             </div>
+            {hasMore && <LoadMoreButton onClick={loadMore} loading={loadingMore} />}
           </div>
         )}
       </AnimatedPage>
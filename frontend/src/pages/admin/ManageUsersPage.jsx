@@ -1,24 +1,17 @@
-import { useState, useEffect } from "react";
+import { useState } from "react";
 import Navbar from "../../components/common/Navbar";
 import AnimatedPage from "../../components/common/AnimatedPage";
 import UserTable from "../../components/admin/UserTable";
 import AddMemberForm from "../../components/admin/AddMemberForm";
 import LoadingSpinner from "../../components/common/LoadingSpinner";
+import LoadMoreButton from "../../components/common/LoadMoreButton";
 import { getUsers, createUser, deleteUser } from "../../api/adminApi";
+import { useCursorList } from "../../hooks/useCursorList";
 
 export default function ManageUsersPage() {
-  const [users, setUsers] = useState([]);
-  const [loading, setLoading] = useState(true);
+  const { items: users, setItems: setUsers, loading, loadingMore, hasMore, loadMore, reload } = useCursorList(getUsers);
   const [showAdd, setShowAdd] = useState(false);
 
-  const fetchUsers = () => {
-    getUsers()
-      .then((r) => setUsers(r.data))
-      .finally(() => setLoading(false));
-  };
-
-  useEffect(() => { fetchUsers(); }, []);
-
   const handleDelete = async (userId) => {
     try {
       await deleteUser(userId);
@@ -31,7 +24,7 @@ export default function ManageUsersPage() {
   const handleAdd = async (formData) => {
     await createUser(formData);
     setShowAdd(false);
-    fetchUsers();
+    reload();
   };
 
   if (loading) return <><Navbar /><LoadingSpinner text="Loading users..." /></>;
@@ -43,7 +36,7 @@ export default function ManageUsersPage() {
         <div className="flex items-center justify-between mb-8">
           <div>
             <h1 className="text-3xl font-bold text-white">Manage Users</h1>
-            <p className="text-slate-400 mt-1">{users.length} total members</p>
+            <p className="text-slate-400 mt-1">{users.length}{hasMore ? "+" : ""} members</p>
           </div>
           <button
             onClick={() => setShowAdd(!showAdd)}
@@ -60,6 +53,7 @@ export default function ManageUsersPage() {
         )}
 
         <UserTable users={users} onDelete={handleDelete} />
+        {hasMore && <LoadMoreButton onClick={loadMore} loading={loadingMore} />}
       </AnimatedPage>
     </>
   );
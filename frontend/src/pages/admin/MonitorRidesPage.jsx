@@ -1,24 +1,19 @@
-import { useState, useEffect } from "react";
+import { useState } from "react";
 import { motion } from "framer-motion";
 import Navbar from "../../components/common/Navbar";
 import AnimatedPage from "../../components/common/AnimatedPage";
 import StatusBadge from "../../components/common/StatusBadge";
 import LoadingSpinner from "../../components/common/LoadingSpinner";
+import LoadMoreButton from "../../components/common/LoadMoreButton";
 import { getAdminRides } from "../../api/adminApi";
+import { useCursorList } from "../../hooks/useCursorList";
 import { formatPrice, formatDistance, formatDateTime } from "../../utils/formatters";
 import { listItem, staggerContainer } from "../../styles/animations";
 
 export default function MonitorRidesPage() {
-  const [rides, setRides] = useState([]);
-  const [loading, setLoading] = useState(true);
+  const { items: rides, loading, loadingMore, hasMore, loadMore } = useCursorList(getAdminRides);
   const [filter, setFilter] = useState("all");
 
-  useEffect(() => {
-    getAdminRides()
-      .then((r) => setRides(r.data))
-      .finally(() => setLoading(false));
-  }, []);
-
   const filtered = filter === "all" ? rides : rides.filter((r) => r.status === filter);
 
   if (loading) return <><Navbar /><LoadingSpinner text="Loading rides..." /></>;
@@ -75,6 +70,8 @@ export default function MonitorRidesPage() {
             </motion.div>
           ))}
         </motion.div>
+
+        {hasMore && <LoadMoreButton onClick={loadMore} loading={loadingMore} />}
       </AnimatedPage>
     </>
   );
@@ -6,7 +6,7 @@ import AnimatedPage from "../../components/common/AnimatedPage";
 import StatusBadge from "../../components/common/StatusBadge";
 import LoadingSpinner from "../../components/common/LoadingSpinner";
 import { useAuth } from "../../context/AuthContext";
-import { getActiveRide, getRideHistory } from "../../api/ridesApi";
+import { getActiveRide, getRideHistorySummary } from "../../api/ridesApi";
 import { getDriverProfile, updateDriverProfile } from "../../api/authApi";
 import { formatPrice, formatDistance, getGreeting } from "../../utils/formatters";
 import { fadeInUp, staggerContainer } from "../../styles/animations";
@@ -23,13 +23,9 @@ export default function DriverDashboard() {
     Promise.all([
       getDriverProfile().then((r) => setDriverProfile(r.data)),
       getActiveRide().then((r) => setActiveRide(r.data)),
-      getRideHistory().then((r) => {
-        const rides = r.data || [];
-        setStats({
-          totalRides: rides.length,
-          totalEarnings: rides.reduce((sum, ride) => sum + Number(ride.final_price || 0), 0),
-        });
-      }),
+      getRideHistorySummary().then((r) =>
+        setStats({ totalRides: r.data.total_rides, totalEarnings: Number(r.data.total_earnings) })
+      ),
     ]).finally(() => setLoading(false));
   }, []);
 
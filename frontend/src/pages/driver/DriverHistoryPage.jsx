@@ -1,41 +1,61 @@
 import { useState, useEffect } from "react";
-import { motion } from "framer-motion";
+import { motion, AnimatePresence } from "framer-motion";
 import Navbar from "../../components/common/Navbar";
 import AnimatedPage from "../../components/common/AnimatedPage";
 import LoadingSpinner from "../../components/common/LoadingSpinner";
-import { getRideHistory } from "../../api/ridesApi";
+import LoadMoreButton from "../../components/common/LoadMoreButton";
+import RatingModal from "../../components/rider/RatingModal";
+import { getRideHistory, getRideHistorySummary, rateRider } from "../../api/ridesApi";
+import { useCursorList } from "../../hooks/useCursorList";
 import { formatPrice, formatDistance, formatDateTime } from "../../utils/formatters";
 import { listItem, staggerContainer } from "../../styles/animations";
 
 export default function DriverHistoryPage() {
-  const [rides, setRides] = useState([]);
-  const [loading, setLoading] = useState(true);
+  const { items: rides, setItems: setRides, loading, loadingMore, hasMore, loadMore } = useCursorList(getRideHistory);
+  const [summary, setSummary] = useState(null);
+  const [ratingRide, setRatingRide] = useState(null);
 
   useEffect(() => {
-    getRideHistory()
-      .then((r) => setRides(r.data))
-      .finally(() => setLoading(false));
+    getRideHistorySummary().then((r) => setSummary(r.data));
   }, []);
 
-  const totalEarnings = rides.reduce((sum, r) => sum + Number(r.final_price || 0), 0);
-  const completedCount = rides.filter((r) => r.is_completed).length;
+  const handleRatingSubmit = async (payload) => {
+    await rateRider(payload);
+    setRides((prev) => prev.map((r) => (r.id === payload.ride_id ? { ...r, rider_rating: payload.rating } : r)));
+    setRatingRide(null);
+  };
 
   if (loading) return <><Navbar /><LoadingSpinner text="Loading history..." /></>;
 
   return (
     <>
       <Navbar />
+
+      <AnimatePresence>
+        {ratingRide && (
+          <RatingModal
+            key={ratingRide.id}
+            ride={ratingRide}
+            subject="rider"
+            onSubmit={handleRatingSubmit}
+            onSkip={() => setRatingRide(null)}
+          />
+        )}
+      </AnimatePresence>
+
       <AnimatedPage className="max-w-4xl mx-auto px-4 py-8">
         <div className="flex items-center justify-between mb-8">
           <div>
             <h1 className="text-3xl font-bold text-white">Ride History</h1>
             <p className="text-slate-400 mt-1">People you helped get around campus</p>
           </div>
-          {rides.length > 0 && (
+          {summary?.total_rides > 0 && (
             <div className="text-right">
               <p className="text-sm text-slate-400">Total Earnings</p>
-              <p className="text-2xl font-bold text-green-400">{formatPrice(totalEarnings)}</p>
-              <p className="text-xs text-slate-500 mt-1">{completedCount} completed | {rides.length - completedCount} in progress</p>
+              <p className="text-2xl font-bold text-green-400">{formatPrice(summary.total_earnings)}</p>
+              <p className="text-xs text-slate-500 mt-1">
+                {summary.completed_rides} completed | {summary.total_rides - summary.completed_rides} in progress
+              </p>
             </div>
           )}
         </div>
@@ -87,11 +107,25 @@ export default function DriverHistoryPage() {
                   }`}>
                     {ride.is_completed ? "Completed" : "In Progress"}
                   </span>
+                  {ride.is_completed && ride.rider_rating != null && (
+                    <p className="text-xs text-yellow-400 mt-2">You rated: {ride.rider_rating}★</p>
+                  )}
+                  {ride.is_completed && ride.rider_rating == null && (
+                    <motion.button
+                      whileHover={{ scale: 1.03 }}
+                      whileTap={{ scale: 0.97 }}
+                      onClick={() => setRatingRide(ride)}
+                      className="block ml-auto mt-2 px-3 py-1 bg-primary-500/10 border border-primary-500/30 text-primary-300 rounded-full text-xs font-medium hover:bg-primary-500/20 transition-all"
+                    >
+                      ★ Rate rider
+                    </motion.button>
+                  )}
                 </div>
               </motion.div>
             ))}
           </motion.div>
         )}
+        {hasMore && <LoadMoreButton onClick={loadMore} loading={loadingMore} />}
       </AnimatedPage>
     </>
   );
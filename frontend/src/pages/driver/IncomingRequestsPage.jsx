@@ -1,24 +1,71 @@
-import { useState, useEffect, useCallback } from "react";
+import { useState, useEffect, useCallback, useRef } from "react";
 import { motion, AnimatePresence } from "framer-motion";
 import Navbar from "../../components/common/Navbar";
 import AnimatedPage from "../../components/common/AnimatedPage";
 import RideRequestCard from "../../components/driver/RideRequestCard";
 import LoadingSpinner from "../../components/common/LoadingSpinner";
+import LocationInput from "../../components/common/LocationInput";
 import { useWebSocket } from "../../hooks/useWebSocket";
-import { listRideRequests, createRideOffer } from "../../api/ridesApi";
+import { syncRideBoard, createRideOffer, getActiveRide } from "../../api/ridesApi";
 import { staggerContainer } from "../../styles/animations";
 
+// Last position reported to the server, used when geolocation is denied or unavailable
+const DRIVER_POSITION_KEY = "driver_position";
+
+function savedPosition() {
+  try {
+    return JSON.parse(localStorage.getItem(DRIVER_POSITION_KEY));
+  } catch {
+    return null;
+  }
+}
+
 export default function IncomingRequestsPage() {
   const [requests, setRequests] = useState([]);
   const [loading, setLoading] = useState(true);
   const [acceptedRide, setAcceptedRide] = useState(null);
+  // { reason, fallback } when the browser gives no position; fallback names where requests come from
+  const [locationError, setLocationError] = useState(null);
+  const [fallbackCity, setFallbackCity] = useState(null);
 
-  useEffect(() => {
-    listRideRequests()
-      .then((r) => setRequests(r.data || []))
-      .finally(() => setLoading(false));
+  // Board position for delta sync; null until the first full load
+  const cursor = useRef(null);
+  const syncing = useRef(false);
+
+  const syncBoard = useCallback(async () => {
+    if (syncing.current) return;
+    syncing.current = true;
+    try {
+      let more = true;
+      while (more) {
+        let data;
+        try {
+          ({ data } = await syncRideBoard(cursor.current ?? 0));
+        } catch (err) {
+          // Unknown cursor (e.g. the database was reset): reload the whole board
+          if (err.response?.status !== 404 || cursor.current === null) throw err;
+          cursor.current = null;
+          setRequests([]);
+          continue;
+        }
+        const stale = new Set([...data.removed, ...data.results.map((r) => r.id)]);
+        setRequests((prev) =>
+          [...data.results, ...prev.filter((r) => !stale.has(r.id))].sort((a, b) =>
+            b.created_at.localeCompare(a.created_at)
+          )
+        );
+        cursor.current = data.cursor;
+        more = data.has_more;
+      }
+    } finally {
+      syncing.current = false;
+    }
   }, []);
 
+  useEffect(() => {
+    syncBoard().finally(() => setLoading(false));
+  }, [syncBoard]);
+
   const handleWsMessage = useCallback((msg) => {
     if (msg.type === "new_ride_request") {
       setRequests((prev) => {
@@ -30,10 +77,60 @@ export default function IncomingRequestsPage() {
       setRequests((prev) => prev.filter((r) => r.id !== msg.ride_request_id));
     } else if (msg.type === "offer_accepted") {
       setAcceptedRide(msg.ride_request);
+    } else if (msg.type === "resync_required") {
+      // Missed events could not be replayed: catch up on the board and check for an accepted offer
+      syncBoard();
+      getActiveRide().then((r) => r.data && setAcceptedRide(r.data));
     }
-  }, []);
+  }, [syncBoard]);
 
-  useWebSocket("/ws/rides/driver/", { onMessage: handleWsMessage });
+  const { isConnected, sendMessage } = useWebSocket("/ws/rides/driver/", { onMessage: handleWsMessage });
+
+  // Catch up on whatever was missed while the socket was down
+  useEffect(() => {
+    if (isConnected && cursor.current !== null) syncBoard();
+  }, [isConnected, syncBoard]);
+
+  const reportPosition = useCallback(
+    (lat, lng, label) => {
+      sendMessage({ type: "update_location", lat, lng });
+      localStorage.setItem(DRIVER_POSITION_KEY, JSON.stringify({ lat, lng, label }));
+    },
+    [sendMessage]
+  );
+
+  // Requests are only broadcast to drivers near the pickup, so report where we are.
+  // Without a position the server never places us in a cell, so fall back to the
+  // last one we reported and ask for a city.
+  useEffect(() => {
+    if (!isConnected) return;
+    const fallBack = (reason) => {
+      const saved = savedPosition();
+      if (saved) sendMessage({ type: "update_location", lat: saved.lat, lng: saved.lng });
+      setLocationError({ reason, fallback: saved?.label ?? null });
+    };
+    if (!navigator.geolocation) {
+      fallBack("This device cannot share its location.");
+      return;
+    }
+    const watchId = navigator.geolocation.watchPosition(
+      (pos) => {
+        setLocationError(null);
+        reportPosition(pos.coords.latitude, pos.coords.longitude, "your last known location");
+      },
+      (err) =>
+        fallBack(err.code === err.PERMISSION_DENIED ? "Location access is turned off." : "Your location is unavailable."),
+      { maximumAge: 60000 }
+    );
+    return () => navigator.geolocation.clearWatch(watchId);
+  }, [isConnected, sendMessage, reportPosition]);
+
+  const handleFallbackCity = (city) => {
+    setFallbackCity(city);
+    if (!city) return;
+    reportPosition(Number(city.lat), Number(city.lng), city.display);
+    setLocationError((prev) => prev && { ...prev, fallback: city.display });
+  };
 
   const handleSubmitOffer = async (offerData) => {
     await createRideOffer(offerData);
@@ -87,6 +184,28 @@ export default function IncomingRequestsPage() {
           </div>
         </div>
 
+        {locationError && (
+          <div className="mb-6 p-4 rounded-2xl bg-yellow-500/10 border border-yellow-500/30">
+            <p className="text-yellow-300 font-medium">
+              {locationError.reason} Requests are only sent to drivers near the pickup.
+            </p>
+            <p className="text-sm text-slate-400 mt-1">
+              {locationError.fallback
+                ? `Showing requests near ${locationError.fallback}. Pick a city to change it.`
+                : "Pick the city you are driving in to receive requests."}
+            </p>
+            <div className="mt-3 max-w-sm">
+              <LocationInput
+                label="Driving in"
+                value={fallbackCity}
+                onChange={handleFallbackCity}
+                icon={"\uD83D\uDCCD"}
+                placeholder="Search for a city..."
+              />
+            </div>
+          </div>
+        )}
+
         {requests.length === 0 ? (
           <div className="text-center py-20">
             <motion.div
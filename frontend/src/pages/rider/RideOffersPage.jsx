@@ -8,7 +8,7 @@ import MapView from "../../components/common/MapView";
 import StatusBadge from "../../components/common/StatusBadge";
 import LoadingSpinner from "../../components/common/LoadingSpinner";
 import { useWebSocket } from "../../hooks/useWebSocket";
-import { getRideRequest, listRideOffers, acceptOffer } from "../../api/ridesApi";
+import { getRideRequest, listRideOffers, acceptOffer, widenRideRequest } from "../../api/ridesApi";
 import { formatPrice, formatDistance } from "../../utils/formatters";
 
 export default function RideOffersPage() {
@@ -19,13 +19,21 @@ export default function RideOffersPage() {
   const [loading, setLoading] = useState(true);
   const [accepting, setAccepting] = useState(false);
   const [confirmed, setConfirmed] = useState(null);
+  const [widening, setWidening] = useState(false);
+  const [widenError, setWidenError] = useState("");
+
+  const load = useCallback(
+    () =>
+      Promise.all([
+        getRideRequest(requestId).then((r) => setRideRequest(r.data)),
+        listRideOffers(requestId).then((r) => setOffers(r.data || [])),
+      ]),
+    [requestId]
+  );
 
   useEffect(() => {
-    Promise.all([
-      getRideRequest(requestId).then((r) => setRideRequest(r.data)),
-      listRideOffers(requestId).then((r) => setOffers(r.data || [])),
-    ]).finally(() => setLoading(false));
-  }, [requestId]);
+    load().finally(() => setLoading(false));
+  }, [load]);
 
   const handleWsMessage = useCallback((msg) => {
     if (msg.type === "new_offer") {
@@ -40,8 +48,10 @@ export default function RideOffersPage() {
       setOffers((prev) => prev.filter((o) => o.id !== msg.offer_id));
     } else if (msg.type === "ride_confirmed") {
       setConfirmed(msg.data);
+    } else if (msg.type === "ride_expired" || msg.type === "resync_required") {
+      load();
     }
-  }, []);
+  }, [load]);
 
   useWebSocket(`/ws/rides/rider/${requestId}/`, {
     onMessage: handleWsMessage,
@@ -64,6 +74,19 @@ export default function RideOffersPage() {
     }
   };
 
+  const handleWiden = async () => {
+    setWidening(true);
+    setWidenError("");
+    try {
+      const res = await widenRideRequest(requestId);
+      setRideRequest(res.data);
+    } catch (err) {
+      setWidenError(err.response?.data?.error || "Could not widen the search");
+    } finally {
+      setWidening(false);
+    }
+  };
+
   if (loading) return <><Navbar /><LoadingSpinner text="Loading ride details..." /></>;
 
   if (confirmed) {
@@ -120,8 +143,21 @@ export default function RideOffersPage() {
               {formatDistance(rideRequest?.distance_miles)} | Suggested {formatPrice(rideRequest?.suggested_price)}
             </p>
           </div>
-          <StatusBadge status={rideRequest?.status} />
+          <div className="flex items-center gap-3">
+            {["pending", "offered"].includes(rideRequest?.status) && (
+              <motion.button
+                whileHover={{ scale: 1.05 }}
+                onClick={handleWiden}
+                disabled={widening}
+                className="px-4 py-2 bg-white/5 border border-white/10 text-slate-300 rounded-xl text-sm font-medium hover:text-white disabled:opacity-50"
+              >
+                {widening ? "Widening..." : "Widen search"}
+              </motion.button>
+            )}
+            <StatusBadge status={rideRequest?.status} />
+          </div>
         </div>
+        {widenError && <p className="text-sm text-red-400 mb-4">{widenError}</p>}
 
         <div className="grid grid-cols-1 lg:grid-cols-2 gap-8">
           <div>
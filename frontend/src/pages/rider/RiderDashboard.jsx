@@ -23,7 +23,7 @@ export default function RiderDashboard() {
   useEffect(() => {
     Promise.all([
       getActiveRide().then((r) => setActiveRide(r.data)),
-      listRideRequests().then((r) => setRecentRides(r.data.slice(0, 5))),
+      listRideRequests(null, 5).then((r) => setRecentRides(r.data.results)),
       getPendingRatings().then((r) => setPendingRatings(r.data)).catch(() => {}),
     ]).finally(() => setLoading(false));
   }, []);
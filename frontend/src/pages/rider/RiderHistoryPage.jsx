@@ -3,10 +3,12 @@ import { motion, AnimatePresence } from "framer-motion";
 import Navbar from "../../components/common/Navbar";
 import AnimatedPage from "../../components/common/AnimatedPage";
 import LoadingSpinner from "../../components/common/LoadingSpinner";
+import LoadMoreButton from "../../components/common/LoadMoreButton";
 import StarRating from "../../components/common/StarRating";
 import RatingModal from "../../components/rider/RatingModal";
 import { getRideHistory, rateRide } from "../../api/ridesApi";
 import { getFavourites, toggleFavourite } from "../../api/authApi";
+import { useCursorList } from "../../hooks/useCursorList";
 import { formatPrice, formatDistance, formatDateTime } from "../../utils/formatters";
 import { listItem, staggerContainer } from "../../styles/animations";
 
@@ -114,17 +116,13 @@ function RideCard({ ride, isFav, onToggleFav, onRate, favLoading }) {
 }
 
 export default function RiderHistoryPage() {
-  const [rides, setRides] = useState([]);
+  const { items: rides, setItems: setRides, loading, loadingMore, hasMore, loadMore } = useCursorList(getRideHistory);
   const [favourites, setFavourites] = useState(new Set());
-  const [loading, setLoading] = useState(true);
   const [favLoading, setFavLoading] = useState(null);
   const [ratingRide, setRatingRide] = useState(null);
 
   useEffect(() => {
-    Promise.all([
-      getRideHistory().then((r) => setRides(r.data)),
-      getFavourites().then((r) => setFavourites(new Set(r.data))).catch(() => {}),
-    ]).finally(() => setLoading(false));
+    getFavourites().then((r) => setFavourites(new Set(r.data))).catch(() => {});
   }, []);
 
   const handleToggleFav = useCallback(async (driverId) => {
@@ -228,6 +226,7 @@ export default function RiderHistoryPage() {
             ))}
           </motion.div>
         )}
+        {hasMore && <LoadMoreButton onClick={loadMore} loading={loadingMore} />}
       </AnimatedPage>
     </>
   );
@@ -14,6 +14,7 @@ export const RIDE_STATUS = {
   IN_PROGRESS: "in_progress",
   COMPLETED: "completed",
   CANCELLED: "cancelled",
+  EXPIRED: "expired",
 };
 
 export const TIME_TYPES = {